@@ -0,0 +1,107 @@
+"""Packed binary storage for route coordinates.
+
+``saved_routes.coordinates`` used to hold ``json.dumps`` text (~40 bytes per
+point). Routes are now stored as a BLOB:
+
+    byte 0     format version (FORMAT_VERSION)
+    byte 1     flags (FLAG_DELTA, FLAG_ZLIB)
+    bytes 2-5  number of points, uint32 little-endian
+    rest       int32 little-endian [lat, lon] pairs quantized to 1e-7 degrees
+               (~1 cm), delta-encoded against the previous point and
+               zlib-compressed when that is smaller
+
+Legacy JSON text rows are still readable, see :func:`decode_stored`.
+"""
+import json
+import struct
+import zlib
+from typing import List, Union
+
+import numpy as np
+
+FORMAT_VERSION = 1
+FLAG_DELTA = 0x01
+FLAG_ZLIB = 0x02
+
+SCALE = 10_000_000  # 1e-7 degree resolution
+HEADER = struct.Struct("<BBI")
+
+_INT32_MIN = np.iinfo(np.int32).min
+_INT32_MAX = np.iinfo(np.int32).max
+
+
+def pack_coordinates(route_coordinates) -> bytes:
+    """
+    Pack [lat, lon] pairs into the versioned binary format.
+
+    Raises:
+        ValueError: If the input is not a sequence of [lat, lon] pairs, or a
+            value does not fit the int32 quantization (beyond ±214.7 degrees).
+    """
+    coords = np.asarray(route_coordinates, dtype=np.float64)
+    if coords.size == 0:
+        coords = coords.reshape(0, 2)
+    if coords.ndim != 2 or coords.shape[1] != 2:
+        raise ValueError("Only [lat, lon] pairs can be packed")
+    if not np.all(np.isfinite(coords)):
+        raise ValueError("Coordinates must be finite")
+
+    quantized = np.rint(coords * SCALE)
+    if len(quantized) and (quantized.min() < _INT32_MIN or quantized.max() > _INT32_MAX):
+        raise ValueError("Coordinates are out of range")
+    quantized = quantized.astype(np.int64)
+    flags = 0
+    values = quantized
+    if len(quantized) > 1:
+        deltas = np.diff(quantized, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+        # Jumps across the antimeridian can overflow int32 deltas
+        if deltas.min() >= _INT32_MIN and deltas.max() <= _INT32_MAX:
+            values = deltas
+            flags |= FLAG_DELTA
+
+    payload = values.astype("<i4").tobytes()
+    compressed = zlib.compress(payload, 6)
+    if len(compressed) < len(payload):
+        payload = compressed
+        flags |= FLAG_ZLIB
+
+    return HEADER.pack(FORMAT_VERSION, flags, len(coords)) + payload
+
+
+def unpack_coordinates(blob: bytes) -> np.ndarray:
+    """Decode a packed BLOB into an (n, 2) float64 array."""
+    version, flags, n_points = HEADER.unpack_from(blob)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported coordinate format version {version}")
+
+    payload = memoryview(blob)[HEADER.size:]
+    if flags & FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+    values = np.frombuffer(payload, dtype="<i4").reshape(n_points, 2)
+
+    if flags & FLAG_DELTA:
+        values = np.cumsum(values, axis=0, dtype=np.int64)
+    return values / SCALE
+
+
+def decode_stored(value: Union[bytes, str]) -> np.ndarray:
+    """Decode a saved_routes.coordinates value, packed or legacy JSON text."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return unpack_coordinates(bytes(value))
+    coords = np.asarray(json.loads(value), dtype=np.float64)
+    return coords.reshape(0, 2) if coords.size == 0 else coords
+
+
+def load_coordinates(value: Union[bytes, str]) -> List[List[float]]:
+    """Decode a saved_routes.coordinates value into the API's list of pairs."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return unpack_coordinates(bytes(value)).tolist()
+    return json.loads(value)
+
+
+def encode_for_storage(route_coordinates: List[List[float]]) -> Union[bytes, str]:
+    """Pack coordinates when possible, otherwise fall back to JSON text."""
+    try:
+        return pack_coordinates(route_coordinates)
+    except ValueError:
+        return json.dumps(route_coordinates)
@@ -0,0 +1,150 @@
+"""Pooled SQLite connections.
+
+Connections are opened lazily up to ``size`` and reused, so every request
+no longer pays for ``sqlite3.connect`` and each connection keeps its own
+prepared-statement cache warm (``cached_statements``). Every connection is
+configured for WAL journaling so readers are not blocked by a writer.
+"""
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Union
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeoutError(RuntimeError):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    A bounded pool of SQLite connections.
+
+    Args:
+        db_path: Database file.
+        size: Maximum number of open connections.
+        timeout: Seconds to wait for a free connection before giving up.
+        mmap_size: Bytes of the database to memory-map (PRAGMA mmap_size).
+        cache_size: Page cache size; negative values are KiB (PRAGMA cache_size).
+        cached_statements: Prepared statements kept per connection.
+        busy_timeout_ms: How long a writer waits on a locked database.
+    """
+
+    def __init__(self, db_path: Union[str, Path], size: int = 8, timeout: float = 30.0,
+                 mmap_size: int = 256 * 1024 * 1024, cache_size: int = -16000,
+                 cached_statements: int = 256, busy_timeout_ms: int = 5000):
+        self.db_path = str(db_path)
+        self.size = size
+        self.timeout = timeout
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.cached_statements = cached_statements
+        self.busy_timeout_ms = busy_timeout_ms
+
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._in_use = 0
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.row_factory = sqlite3.Row  # This enables column access by name
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size={int(self.cache_size)}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Check out a connection; pair with :meth:`release` (or use :meth:`connection`)."""
+        start = time.perf_counter()
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise PoolTimeoutError(
+                        f"No database connection available after {self.timeout}s")
+
+        waited = time.perf_counter() - start
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """Return a connection, rolling back anything left uncommitted."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            # A broken connection is dropped instead of being handed out again
+            logger.warning("Discarding broken database connection")
+            conn.close()
+            with self._lock:
+                self._opened -= 1
+                self._in_use -= 1
+            return
+        with self._lock:
+            self._in_use -= 1
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Context manager yielding a pooled connection."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self) -> dict:
+        """Pool size and checkout latency counters."""
+        with self._lock:
+            checkouts = self._checkouts
+            return {
+                "size": self.size,
+                "open": self._opened,
+                "in_use": self._in_use,
+                "checkouts": checkouts,
+                "avg_checkout_ms": (self._wait_total / checkouts * 1000) if checkouts else 0.0,
+                "max_checkout_ms": self._wait_max * 1000,
+            }
+
+    def close_all(self) -> None:
+        """Close every idle connection (used on shutdown)."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
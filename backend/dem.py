@@ -0,0 +1,133 @@
+"""Elevation lookups from local SRTM ``.hgt`` tiles.
+
+A tile covers one degree square and is named after its south-west corner
+(``N44E020.hgt``). It holds ``size x size`` big-endian int16 samples, row 0
+being the northern edge, with ``size`` 1201 (3") or 3601 (1"); the last
+row/column overlap the neighbouring tiles. Voids are -32768.
+
+Tiles are memory-mapped, so only the pages a route touches are read, and
+kept in a small LRU. Missing tiles are not remembered, a tile copied into the
+directory later is picked up by the next lookup. Lookups are grouped per tile and interpolated
+bilinearly with array operations.
+"""
+import math
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+VOID = -32768
+
+
+def tile_name(lat_floor: int, lon_floor: int) -> str:
+    """File name of the tile whose south-west corner is (lat_floor, lon_floor)."""
+    ns = "N" if lat_floor >= 0 else "S"
+    ew = "E" if lon_floor >= 0 else "W"
+    return f"{ns}{abs(lat_floor):02d}{ew}{abs(lon_floor):03d}.hgt"
+
+
+def open_tile(path: Union[str, Path]) -> np.memmap:
+    """Memory-map a .hgt file as a (size, size) big-endian int16 array."""
+    samples = os.path.getsize(path) // 2
+    size = math.isqrt(samples)
+    if size * size != samples or size < 2:
+        raise ValueError(f"{path} is not a square .hgt tile")
+    return np.memmap(path, dtype=">i2", mode="r", shape=(size, size))
+
+
+def interpolate(tile: np.ndarray, lat_floor: int, lon_floor: int,
+                lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Bilinear elevation at points inside one tile, NaN where a corner is void."""
+    last = tile.shape[0] - 1
+    row = (lat_floor + 1 - lats) * last
+    col = (lons - lon_floor) * last
+    r0 = np.clip(np.floor(row).astype(np.int64), 0, last - 1)
+    c0 = np.clip(np.floor(col).astype(np.int64), 0, last - 1)
+    fr = row - r0
+    fc = col - c0
+
+    corners = np.stack([tile[r0, c0], tile[r0, c0 + 1], tile[r0 + 1, c0], tile[r0 + 1, c0 + 1]])
+    values = corners.astype(np.float64)
+    values[corners == VOID] = np.nan
+    top = values[0] * (1 - fc) + values[1] * fc
+    bottom = values[2] * (1 - fc) + values[3] * fc
+    return top * (1 - fr) + bottom * fr
+
+
+class DemTiles:
+    """
+    Tile directory with an LRU of memory-mapped tiles.
+
+    Args:
+        directory: Folder holding the .hgt files.
+        max_open: Number of tiles kept mapped.
+    """
+
+    def __init__(self, directory: Union[str, Path], max_open: int = 16):
+        self.directory = Path(directory)
+        self.max_open = max_open
+        self._tiles: "OrderedDict[Tuple[int, int], np.memmap]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def tile(self, lat_floor: int, lon_floor: int) -> Optional[np.memmap]:
+        """Return the mapped tile, or None when it is not on disk (not cached)."""
+        key = (lat_floor, lon_floor)
+        with self._lock:
+            if key in self._tiles:
+                self._tiles.move_to_end(key)
+                self.hits += 1
+                return self._tiles[key]
+            self.misses += 1
+            path = self.directory / tile_name(lat_floor, lon_floor)
+            if not path.is_file():
+                return None
+            tile = open_tile(path)
+            self._tiles[key] = tile
+            while len(self._tiles) > self.max_open:
+                self._tiles.popitem(last=False)
+                self.evictions += 1
+            return tile
+
+    def lookup(self, route_coordinates) -> np.ndarray:
+        """
+        Elevation in metres for every [lat, lon], NaN where no tile covers it.
+        """
+        coords = np.asarray(route_coordinates, dtype=np.float64).reshape(-1, 2)
+        lats, lons = coords[:, 0], coords[:, 1]
+        out = np.full(len(coords), np.nan)
+        if len(coords) == 0:
+            return out
+
+        keys = np.floor(coords).astype(np.int64)
+        tiles, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        for i, (lat_floor, lon_floor) in enumerate(tiles.tolist()):
+            tile = self.tile(lat_floor, lon_floor)
+            if tile is None:
+                continue
+            mask = inverse == i
+            out[mask] = interpolate(tile, lat_floor, lon_floor, lats[mask], lons[mask])
+        return out
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tiles.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "directory": str(self.directory),
+                "open_tiles": len(self._tiles),
+                "max_open": self.max_open,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,24 @@
+"""Strong ETags for conditional GETs."""
+import hashlib
+from typing import Optional
+
+# Bump when the JSON shape of route responses changes so cached copies are refetched
+REPRESENTATION_VERSION = "1"
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag derived from the values that determine a representation."""
+    digest = hashlib.sha256()
+    digest.update(REPRESENTATION_VERSION.encode("utf-8"))
+    for part in parts:
+        digest.update(b"\x1f")
+        digest.update(str(part).encode("utf-8"))
+    return '"' + digest.hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header against a strong ETag."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
@@ -0,0 +1,81 @@
+"""Execution layer for blocking work.
+
+Route handlers are ``async def`` and must not block the event loop, so:
+
+* SQLite calls run on a bounded thread pool (``run_db``); the pool is sized
+  like the connection pool so threads never queue on connection checkout.
+* bcrypt hashing and verification run on a process pool (``run_cpu``),
+  which keeps CPU-bound work off both the event loop and the GIL.
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Callable, Optional, TypeVar
+
+from metrics import record_db_call
+from profiling import profiled
+
+T = TypeVar("T")
+
+DB_THREADS = int(os.getenv("DB_THREADS", os.getenv("DB_POOL_SIZE", "8")))
+CPU_PROCESSES = int(os.getenv("CPU_PROCESSES", str(os.cpu_count() or 1)))
+
+_db_executor: Optional[ThreadPoolExecutor] = None
+_cpu_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    global _db_executor
+    if _db_executor is None:
+        _db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix="db")
+    return _db_executor
+
+
+def get_cpu_executor() -> ProcessPoolExecutor:
+    global _cpu_executor
+    if _cpu_executor is None:
+        # spawn: forking a process that already runs threads is not safe
+        _cpu_executor = ProcessPoolExecutor(max_workers=CPU_PROCESSES,
+                                            mp_context=multiprocessing.get_context("spawn"))
+    return _cpu_executor
+
+
+async def run_db(fn: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run a blocking database function on the DB thread pool, timed for the
+    request metrics and profiled along with a profiled request.
+    """
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    try:
+        return await loop.run_in_executor(get_db_executor(), profiled(partial(fn, *args, **kwargs)))
+    finally:
+        record_db_call(time.perf_counter() - start)
+
+
+async def run_cpu(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Run a picklable CPU-bound function on the process pool."""
+    global _cpu_executor
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_cpu_executor(), partial(fn, *args, **kwargs))
+    except BrokenProcessPool:
+        # A crashed worker poisons the whole pool; start a fresh one and retry once
+        if _cpu_executor is not None:
+            _cpu_executor.shutdown(wait=False)
+        _cpu_executor = None
+        return await loop.run_in_executor(get_cpu_executor(), partial(fn, *args, **kwargs))
+
+
+def shutdown_executors() -> None:
+    global _db_executor, _cpu_executor
+    if _db_executor is not None:
+        _db_executor.shutdown(wait=True)
+        _db_executor = None
+    if _cpu_executor is not None:
+        _cpu_executor.shutdown(wait=True)
+        _cpu_executor = None
@@ -0,0 +1,37 @@
+"""Full-text search over route names and descriptions.
+
+``route_search`` is an FTS5 table with one row per saved route (sharing its
+rowid) that triggers on ``saved_routes`` keep in sync, see init_database.
+Text is folded with ``unicode61 remove_diacritics 2`` so "cubura" also
+finds "Čubura".
+"""
+import re
+
+# bm25 column weights: only name and description count, a name hit 10x a description hit
+RANK_EXPRESSION = "bm25(route_search, 0.0, 0.0, 10.0, 1.0)"
+MAX_QUERY_TERMS = 16
+
+_TERM = re.compile(r"\w+", re.UNICODE)
+
+
+def quote(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def match_query(text: str, user_id: str) -> str:
+    """
+    FTS5 MATCH expression for free text typed by a user, limited to their routes.
+
+    Every word becomes a quoted prefix term on name or description, so input
+    never reaches the FTS5 query syntax and partially typed words already
+    match; terms are ANDed. The owner is matched through the indexed user_id
+    column, which is much cheaper than filtering every match afterwards.
+
+    Raises:
+        ValueError: If the text holds no searchable word.
+    """
+    terms = _TERM.findall(text)[:MAX_QUERY_TERMS]
+    if not terms:
+        raise ValueError("Search query has no words")
+    words = " ".join(f"{quote(term)}*" for term in terms)
+    return f"user_id: {quote(user_id)} AND {{name description}}: ({words})"
@@ -0,0 +1,83 @@
+"""Vectorized geometry helpers shared by the backend modules."""
+from typing import Optional
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+
+# Length of one split for each supported distance unit, in metres
+SPLIT_LENGTH_M = {
+    "km": 1000.0,
+    "mi": 1609.344,
+}
+
+# Spellings of RunDetails.distance_unit, the frontend sends "km" or "miles"
+DISTANCE_UNITS = {
+    "km": "km",
+    "kilometers": "km",
+    "kilometres": "km",
+    "mi": "mi",
+    "mile": "mi",
+    "miles": "mi",
+}
+
+
+def as_coord_array(route_coordinates) -> np.ndarray:
+    """Return an (n, 2) float64 array of [lat, lon] from a list of pairs or an array."""
+    coords = np.asarray(route_coordinates, dtype=np.float64)
+    if coords.size == 0:
+        return np.empty((0, 2), dtype=np.float64)
+    if coords.ndim != 2 or coords.shape[1] < 2:
+        raise ValueError("Coordinates must be a sequence of [lat, lon] pairs")
+    return coords[:, :2]
+
+
+def segment_lengths(coords: np.ndarray) -> np.ndarray:
+    """Haversine length in metres of each of the n-1 segments of a polyline."""
+    if len(coords) < 2:
+        return np.empty(0, dtype=np.float64)
+    lat = np.radians(coords[:, 0])
+    lon = np.radians(coords[:, 1])
+    dlat = np.diff(lat)
+    dlon = np.diff(lon)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def cumulative_distance(coords: np.ndarray) -> np.ndarray:
+    """Distance in metres from the first point to every point (first entry is 0)."""
+    out = np.zeros(len(coords), dtype=np.float64)
+    if len(coords) > 1:
+        np.cumsum(segment_lengths(coords), out=out[1:])
+    return out
+
+
+def split_index(cum_distance: np.ndarray, split_length: float, n_splits: int = 0) -> np.ndarray:
+    """
+    Map every point to the index of the split (km or mile) it falls in.
+
+    When ``n_splits`` is given the result is clipped to ``n_splits - 1`` so
+    that points past the last configured split reuse its values.
+    """
+    idx = np.floor(cum_distance / split_length).astype(np.int64)
+    if n_splits > 0:
+        np.minimum(idx, n_splits - 1, out=idx)
+    return idx
+
+
+def normalize_distance_unit(distance_unit: Optional[str]) -> str:
+    """
+    Key of SPLIT_LENGTH_M for a RunDetails.distance_unit value, None meaning km.
+
+    Raises:
+        ValueError: If the unit is not one of DISTANCE_UNITS.
+    """
+    unit = DISTANCE_UNITS.get((distance_unit or "km").strip().lower())
+    if unit is None:
+        raise ValueError(f"Unknown distance unit {distance_unit!r}, expected one of {sorted(DISTANCE_UNITS)}")
+    return unit
+
+
+def split_length_for_unit(distance_unit: Optional[str]) -> float:
+    """Split length in metres for a RunDetails.distance_unit value (see normalize_distance_unit)."""
+    return SPLIT_LENGTH_M[normalize_distance_unit(distance_unit)]
@@ -0,0 +1,190 @@
+"""Persistent cache of per-location lookups (elevation, geocoding).
+
+Results are stored in the ``geo_cache`` table keyed by ``kind`` and a grid
+cell of ``cell`` degrees (1e-4°, about 11 m, by default), so every user
+looking at the same area shares them and they survive restarts.
+
+Batches are read with a single statement looking up a JSON array of cells,
+hits refresh ``last_used`` and the least recently used rows are evicted
+once the table grows past ``max_entries``. ``last_used`` is only rewritten
+when it is older than ``touch_interval``, so repeated hits stay read-only.
+
+Lookups that are not about a location (geocoding searches) are kept per
+``kind`` and text key in ``geo_cache_keys``, bounded by :meth:`GeoCache.expire`.
+"""
+import json
+import threading
+import time
+from typing import Callable, ContextManager, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+CELL_DEGREES = 1e-4
+
+Cell = Tuple[int, int]
+
+_CELLS_QUERY = (
+    "SELECT cell_lat, cell_lon, value, last_used FROM geo_cache WHERE kind = ? AND updated_at >= ? "
+    "AND (cell_lat, cell_lon) IN (SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?))"
+)
+_TOUCH_QUERY = (
+    "UPDATE geo_cache SET last_used = ? WHERE kind = ? AND (cell_lat, cell_lon) IN "
+    "(SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?))"
+)
+
+
+class GeoCache:
+    """
+    SQLite-backed cache of JSON values per (kind, grid cell).
+
+    Args:
+        connection: Callable returning a connection context manager
+            (``get_db_connection``).
+        max_entries: Row count above which the least recently used rows are evicted.
+        cell: Grid cell size in degrees.
+        clock: Time source in seconds, replaceable in tests.
+        touch_interval: Seconds a hit leaves ``last_used`` alone after it was set.
+    """
+
+    def __init__(self, connection: Callable[[], ContextManager], max_entries: int = 500_000,
+                 cell: float = CELL_DEGREES, clock: Callable[[], float] = time.time,
+                 touch_interval: float = 3600.0):
+        self.connection = connection
+        self.max_entries = max_entries
+        self.cell = cell
+        self.touch_interval = touch_interval
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+        self._kinds: Dict[str, Dict[str, int]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+
+    def quantize(self, route_coordinates) -> np.ndarray:
+        """Grid cell of every [lat, lon], as an (n, 2) int64 array."""
+        coords = np.asarray(route_coordinates, dtype=np.float64).reshape(-1, 2)
+        return np.rint(coords / self.cell).astype(np.int64)
+
+    def centres(self, cells) -> np.ndarray:
+        """[lat, lon] of the centre of each cell."""
+        return np.asarray(cells, dtype=np.float64).reshape(-1, 2) * self.cell
+
+    def _count(self, kind: str, hits: int, misses: int) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            counters = self._kinds.setdefault(kind, {"hits": 0, "misses": 0})
+            counters["hits"] += hits
+            counters["misses"] += misses
+
+    def get_many(self, kind: str, cells: Iterable[Cell], max_age: Optional[float] = None) -> Dict[Cell, object]:
+        """
+        Return {cell: value} for the cached cells, entries older than
+        ``max_age`` seconds are ignored.
+        """
+        keys = list({(int(lat), int(lon)) for lat, lon in cells})
+        if not keys:
+            return {}
+        now = self.clock()
+        oldest = now - max_age if max_age is not None else float("-inf")
+        with self.connection() as conn:
+            rows = conn.execute(_CELLS_QUERY, (kind, oldest, json.dumps(keys))).fetchall()
+            found = {(row[0], row[1]): json.loads(row[2]) for row in rows}
+            stale = [(row[0], row[1]) for row in rows if row[3] < now - self.touch_interval]
+            if stale:
+                conn.execute(_TOUCH_QUERY, (now, kind, json.dumps(stale)))
+                conn.commit()
+        self._count(kind, len(found), len(keys) - len(found))
+        return found
+
+    def set_many(self, kind: str, values: Dict[Cell, object]) -> None:
+        """Store {cell: JSON-serializable value}, evicting old rows when full."""
+        if not values:
+            return
+        now = self.clock()
+        rows = [(kind, int(lat), int(lon), json.dumps(value), now, now) for (lat, lon), value in values.items()]
+        with self.connection() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO geo_cache (kind, cell_lat, cell_lon, value, updated_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            with self._lock:
+                self.sets += len(rows)
+                if self._size is not None:
+                    self._size += len(rows)
+                check = self._size is None or self._size > self.max_entries
+            if check:
+                self._evict(conn)
+            conn.commit()
+
+    def get_key(self, kind: str, key: str, max_age: Optional[float] = None):
+        """Value stored for a text key, or None; entries older than ``max_age`` seconds are ignored."""
+        oldest = self.clock() - max_age if max_age is not None else float("-inf")
+        with self.connection() as conn:
+            row = conn.execute(
+                "SELECT value FROM geo_cache_keys WHERE kind = ? AND key = ? AND updated_at >= ?",
+                (kind, key, oldest)
+            ).fetchone()
+        self._count(kind, int(row is not None), int(row is None))
+        return json.loads(row[0]) if row is not None else None
+
+    def set_key(self, kind: str, key: str, value) -> None:
+        """Store a JSON-serializable value for a text key."""
+        with self.connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO geo_cache_keys (kind, key, value, updated_at) VALUES (?, ?, ?, ?)",
+                (kind, key, json.dumps(value), self.clock())
+            )
+            conn.commit()
+        with self._lock:
+            self.sets += 1
+
+    def expire(self, max_age: float, kind_prefix: str = "") -> int:
+        """Delete entries older than ``max_age`` seconds whose kind starts with kind_prefix."""
+        params = (self.clock() - max_age, len(kind_prefix), kind_prefix)
+        with self.connection() as conn:
+            deleted = conn.execute(
+                "DELETE FROM geo_cache WHERE updated_at < ? AND substr(kind, 1, ?) = ?", params
+            ).rowcount
+            deleted_keys = conn.execute(
+                "DELETE FROM geo_cache_keys WHERE updated_at < ? AND substr(kind, 1, ?) = ?", params
+            ).rowcount
+            conn.commit()
+        with self._lock:
+            if self._size is not None:
+                self._size -= deleted
+            self.evictions += deleted + deleted_keys
+        return deleted + deleted_keys
+
+    def _evict(self, conn) -> None:
+        size = conn.execute("SELECT COUNT(*) FROM geo_cache").fetchone()[0]
+        evicted = 0
+        if size > self.max_entries:
+            # Trim to 90% so eviction does not run on every insert
+            evicted = size - int(self.max_entries * 0.9)
+            conn.execute(
+                "DELETE FROM geo_cache WHERE (kind, cell_lat, cell_lon) IN "
+                "(SELECT kind, cell_lat, cell_lon FROM geo_cache ORDER BY last_used LIMIT ?)",
+                (evicted,)
+            )
+        with self._lock:
+            self._size = size - evicted
+            self.evictions += evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": self._size,
+                "max_entries": self.max_entries,
+                "cell_degrees": self.cell,
+                "hits": self.hits,
+                "misses": self.misses,
+                "sets": self.sets,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "kinds": {kind: dict(counters) for kind, counters in self._kinds.items()},
+            }
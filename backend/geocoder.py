@@ -0,0 +1,226 @@
+"""Caching proxy for Nominatim search and reverse geocoding.
+
+Every lookup goes through three layers:
+
+* identical lookups already in flight share one result instead of each
+  going upstream (``Coalescer``);
+* results are kept in the persistent ``GeoCache`` for ``ttl`` seconds,
+  reverse lookups per grid cell and searches per normalized query, and
+  expired rows are purged hourly;
+* upstream calls reserve a token from a ``TokenBucket`` so we stay within
+  Nominatim's usage policy (one request per second by default).
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+import httpx
+
+from executors import run_db
+from geo_cache import GeoCache
+
+DEFAULT_USER_AGENT = "fakerun-backend/1.0"
+KIND_PREFIX = "geocode:"
+EXPIRE_INTERVAL_S = 3600.0
+
+
+class GeocoderError(Exception):
+    """Raised when the upstream service fails or answers with an error status."""
+
+
+class RateLimitedError(GeocoderError):
+    """Raised when no upstream token becomes available within the allowed wait."""
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at ``rate`` tokens per second, holding at most ``capacity``.
+
+    Args:
+        rate: Tokens added per second.
+        capacity: Burst size.
+        clock: Monotonic time source in seconds, replaceable in tests.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self._tokens = capacity
+        self._updated = clock()
+        self.waited = 0.0
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, max_wait: float = float("inf")) -> float:
+        """
+        Take the next token, which may not exist yet, and return the seconds
+        until it is due. Tokens go negative while reservations are pending,
+        so callers are served in arrival order.
+
+        Raises:
+            RateLimitedError: If the token would be due later than max_wait.
+        """
+        self._refill()
+        delay = max(0.0, (1 - self._tokens) / self.rate)
+        if delay > max_wait:
+            raise RateLimitedError(f"Upstream rate limit reached, retry in {delay:.1f} s")
+        self._tokens -= 1
+        return delay
+
+    async def acquire(self, max_wait: float = float("inf")) -> None:
+        """Reserve a token and wait until it is due; raise RateLimitedError past max_wait."""
+        delay = self.reserve(max_wait)
+        if delay > 0:
+            self.waited += delay
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                self._tokens += 1
+                raise
+
+
+class Coalescer:
+    """Share the result of identical concurrent calls, keyed by a hashable key."""
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable]):
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # shield: a cancelled waiter must not cancel the shared call
+            return await asyncio.shield(future)
+        future = asyncio.ensure_future(fn())
+        self._inflight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                self._inflight.pop(key, None)
+            else:
+                future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class Geocoder:
+    """
+    Nominatim client behind coalescing, a persistent cache and a rate limit.
+
+    Args:
+        base_url: Nominatim root, e.g. ``https://nominatim.openstreetmap.org``.
+        cache: Persistent result cache.
+        ttl: Seconds a cached result stays valid.
+        rate: Upstream requests per second.
+        burst: Upstream requests allowed back to back.
+        max_wait: Longest wait for an upstream token before giving up.
+        timeout: Upstream request timeout in seconds.
+        user_agent: Sent upstream, Nominatim requires an identifying one.
+    """
+
+    def __init__(self, base_url: str, cache: GeoCache, ttl: float = 7 * 24 * 3600, rate: float = 1.0,
+                 burst: float = 1.0, max_wait: float = 10.0, timeout: float = 10.0,
+                 user_agent: str = DEFAULT_USER_AGENT):
+        self.base_url = base_url.rstrip("/")
+        self.cache = cache
+        self.ttl = ttl
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.bucket = TokenBucket(rate, burst)
+        self.coalescer = Coalescer()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._next_expiry = 0.0
+        self.upstream_calls = 0
+        self.upstream_errors = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout, headers={"User-Agent": self.user_agent})
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _fetch(self, path: str, params: dict):
+        await self.bucket.acquire(self.max_wait)
+        self.upstream_calls += 1
+        try:
+            response = await self._get_client().get(f"{self.base_url}/{path}", params=params)
+            response.raise_for_status()
+            return response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            self.upstream_errors += 1
+            raise GeocoderError(f"Geocoding service error: {e}") from e
+
+    async def _cached(self, get: Callable[[], Any], put: Callable[[Any], None], fetch: Callable[[], Awaitable]):
+        """Cached entry from the blocking ``get``, else fetch it and store it with ``put``."""
+        entry = await run_db(get)
+        if entry is not None:
+            return entry
+        entry = await fetch()
+        await run_db(put, entry)
+        if time.monotonic() >= self._next_expiry:
+            # Drop expired rows now and then rather than waiting for LRU eviction
+            self._next_expiry = time.monotonic() + EXPIRE_INTERVAL_S
+            await run_db(self.cache.expire, self.ttl, KIND_PREFIX)
+        return entry
+
+    async def search(self, query: str, limit: int = 5) -> list:
+        """Nominatim /search results (``format=json``) for a free-text query."""
+        text = normalize_query(query)
+        key = f"{limit}:{text}"
+        kind = f"{KIND_PREFIX}search"
+
+        async def fetch():
+            return await self._fetch("search", {"q": text, "format": "json", "limit": limit})
+
+        return await self.coalescer.run((kind, key), lambda: self._cached(
+            lambda: self.cache.get_key(kind, key, self.ttl),
+            lambda results: self.cache.set_key(kind, key, results),
+            fetch
+        ))
+
+    async def reverse(self, lat: float, lon: float, zoom: int = 14) -> dict:
+        """
+        Nominatim /reverse result (``format=json`` with address details).
+
+        Points are snapped to the cache grid, so all points within one cell
+        share the upstream answer for the cell centre.
+        """
+        cell = tuple(int(v) for v in self.cache.quantize([[lat, lon]])[0])
+        centre_lat, centre_lon = self.cache.centres([cell])[0].tolist()
+        kind = f"{KIND_PREFIX}reverse:{zoom}"
+
+        async def fetch():
+            return await self._fetch("reverse", {
+                "lat": f"{centre_lat:.6f}", "lon": f"{centre_lon:.6f}",
+                "zoom": zoom, "addressdetails": 1, "format": "json",
+            })
+
+        return await self.coalescer.run((kind, cell), lambda: self._cached(
+            lambda: self.cache.get_many(kind, [cell], self.ttl).get(cell),
+            lambda result: self.cache.set_many(kind, {cell: result}),
+            fetch
+        ))
+
+    def stats(self) -> dict:
+        return {
+            "upstream": self.base_url,
+            "upstream_calls": self.upstream_calls,
+            "upstream_errors": self.upstream_errors,
+            "coalesced": self.coalescer.coalesced,
+            "in_flight": len(self.coalescer._inflight),
+            "rate_limit_wait_seconds": round(self.bucket.waited, 3),
+            "ttl": self.ttl,
+        }
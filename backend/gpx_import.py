@@ -0,0 +1,179 @@
+"""Bulk GPX import.
+
+Uploads are expanded (ZIP archives contribute their ``.gpx`` members) and
+parsed in batches on the CPU process pool with :func:`gpx_reader.parse_gpx_file`.
+Workers send back packed coordinates (see coord_codec) rather than lists of
+pairs, which keeps the pickling between processes cheap.
+
+Expansion counts files and uncompressed bytes as it goes and stops with
+``ImportLimitError`` as soon as an import is over either limit, before the
+next member is decompressed.
+"""
+import io
+import os
+import zipfile
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from coord_codec import pack_coordinates
+from geo import segment_lengths
+from gpx_reader import parse_gpx_file
+from wire_formats import validate_coordinates
+
+MAX_IMPORT_FILES = int(os.getenv("MAX_IMPORT_FILES", "1000"))
+MAX_IMPORT_FILE_BYTES = int(os.getenv("MAX_IMPORT_FILE_BYTES", str(50 * 1024 * 1024)))
+MAX_IMPORT_TOTAL_BYTES = int(os.getenv("MAX_IMPORT_TOTAL_BYTES", str(500 * 1024 * 1024)))
+# Files handed to one process pool task
+IMPORT_BATCH_FILES = int(os.getenv("IMPORT_BATCH_FILES", "16"))
+
+# Defaults matching the frontend when a route is saved without run details
+DEFAULT_PACE = "6:00"
+DEFAULT_PACE_MINUTES = 6
+CALORIES_PER_KM = 70
+
+ImportFile = Tuple[str, bytes]
+
+
+class ImportLimitError(ValueError):
+    """Raised when an import has too many files or too many uncompressed bytes."""
+
+
+class ImportLimits:
+    """Running file count and uncompressed size of one import."""
+
+    def __init__(self, max_files: int = MAX_IMPORT_FILES, max_bytes: int = MAX_IMPORT_TOTAL_BYTES):
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self.files = 0
+        self.bytes = 0
+
+    def add_file(self) -> None:
+        self.files += 1
+        if self.files > self.max_files:
+            raise ImportLimitError(f"Too many files, at most {self.max_files} per import")
+
+    def add_bytes(self, size: int) -> None:
+        self.bytes += size
+        if self.bytes > self.max_bytes:
+            raise ImportLimitError(f"Import is too large, at most {self.max_bytes} bytes uncompressed")
+
+    def read_limit(self) -> int:
+        """Most bytes worth reading from the next member, one more than either limit allows."""
+        return min(MAX_IMPORT_FILE_BYTES, max(0, self.max_bytes - self.bytes)) + 1
+
+
+def is_zip(filename: str, content: bytes) -> bool:
+    return filename.lower().endswith(".zip") or content[:4] == b"PK\x03\x04"
+
+
+def expand_upload(filename: str, content: bytes,
+                  limits: Optional[ImportLimits] = None) -> Iterator[Tuple[str, object]]:
+    """
+    Yield (filename, content) for a GPX upload, or for every .gpx member of a ZIP.
+
+    Members that are too large (or an unreadable archive) are yielded with an
+    error message instead of bytes.
+
+    Raises:
+        ImportLimitError: Once `limits` (defaults for a single upload) are exceeded.
+    """
+    if limits is None:
+        limits = ImportLimits()
+    if not is_zip(filename, content):
+        limits.add_file()
+        limits.add_bytes(len(content))
+        yield filename, content
+        return
+    try:
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            for info in archive.infolist():
+                name = info.filename
+                if info.is_dir() or not name.lower().endswith(".gpx") or name.startswith("__MACOSX/"):
+                    continue
+                member_name = f"{filename}/{name}"
+                limits.add_file()
+                if info.file_size > MAX_IMPORT_FILE_BYTES:
+                    yield member_name, ValueError("File is too large")
+                    continue
+                with archive.open(info) as member:
+                    # Do not trust the declared size
+                    data = member.read(limits.read_limit())
+                if len(data) > MAX_IMPORT_FILE_BYTES:
+                    yield member_name, ValueError("File is too large")
+                    continue
+                limits.add_bytes(len(data))
+                yield member_name, data
+    except (zipfile.BadZipFile, zipfile.LargeZipFile, NotImplementedError, RuntimeError) as e:
+        yield filename, ValueError(f"Unreadable ZIP archive: {e}")
+
+
+def expand_uploads(raw_uploads: List[ImportFile], limits: Optional[ImportLimits] = None) -> List[Tuple[str, object]]:
+    """
+    (filename, bytes or ValueError) per GPX file, ZIP uploads contribute every .gpx they contain.
+
+    Blocking, run it on an executor.
+
+    Raises:
+        ImportLimitError: As soon as the import has too many files or bytes.
+    """
+    if limits is None:
+        limits = ImportLimits()
+    uploads = []
+    for filename, content in raw_uploads:
+        uploads.extend(expand_upload(filename, content, limits))
+    return uploads
+
+
+def import_run_details(route_name: str, coordinates: np.ndarray) -> dict:
+    """Run details for an imported route, derived from its geometry like the frontend does."""
+    distance = float(segment_lengths(coordinates).sum()) / 1000 if len(coordinates) else 0.0
+    return {
+        "route_name": route_name,
+        "distance": round(distance, 3),
+        "duration": int(round(distance * DEFAULT_PACE_MINUTES)),
+        "pace": DEFAULT_PACE,
+        "calories": int(round(distance * CALORIES_PER_KM)),
+    }
+
+
+def default_route_name(filename: str) -> str:
+    base = filename.replace("\\", "/").rsplit("/", 1)[-1]
+    return base[:-4] if base.lower().endswith(".gpx") else base
+
+
+def parse_import_batch(files: List[ImportFile]) -> List[dict]:
+    """
+    Parse a batch of GPX files, runs in a process pool worker.
+
+    Returns one dict per file with ``filename`` and either ``error`` or
+    ``name``, ``points``, ``coordinates`` (packed BLOB) and ``run_details``.
+    A file that fails only gets its own error entry.
+    """
+    results = []
+    for filename, content in files:
+        try:
+            results.append(parse_import_file(filename, content))
+        except Exception as e:
+            results.append({"filename": filename, "error": str(e)})
+    return results
+
+
+def parse_import_file(filename: str, content: bytes) -> dict:
+    parsed = parse_gpx_file(content)
+    coordinates = np.asarray(parsed["coordinates"], dtype=np.float64).reshape(-1, 2)
+    if len(coordinates) == 0:
+        return {"filename": filename, "error": "Could not parse GPX file or no track points found."}
+    coordinates = validate_coordinates(coordinates)
+    name = parsed["name"] or default_route_name(filename)
+    return {
+        "filename": filename,
+        "name": name,
+        "points": len(coordinates),
+        "coordinates": pack_coordinates(coordinates),
+        "run_details": import_run_details(name, coordinates),
+    }
+
+
+def batched(files: List[ImportFile], batch_files: int = IMPORT_BATCH_FILES) -> List[List[ImportFile]]:
+    return [files[i:i + batch_files] for i in range(0, len(files), batch_files)]
@@ -0,0 +1,137 @@
+"""Incremental GPX parsing.
+
+The file is fed to expat in fixed-size chunks and only ``trkpt`` lat/lon
+attributes and the route name are kept; no element tree is built. Points that
+are not finite or lie outside lat ±90 / lon ±180 are skipped. Points
+accumulate in a flat ``array('d')`` (16 bytes per point), so peak memory is
+bounded by the number of points rather than by the size of the document.
+"""
+import io
+import logging
+from array import array
+from typing import IO, Optional, Tuple, Union
+from xml.parsers import expat
+
+import numpy as np
+
+READ_CHUNK_BYTES = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+class _TrackHandler:
+    """Expat callbacks collecting track points and names."""
+
+    def __init__(self):
+        self.coords = array("d")
+        self.gpx_name: Optional[str] = None
+        self.track_name: Optional[str] = None
+        self._path = []
+        self._text = None
+
+    def start(self, name, attrs):
+        local = name.rsplit(" ", 1)[-1]
+        self._path.append(local)
+        if local == "trkpt":
+            try:
+                lat = float(attrs["lat"])
+                lon = float(attrs["lon"])
+            except (KeyError, ValueError):
+                return
+            # Comparisons with NaN are false, so this also drops non-finite points
+            if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+                return
+            self.coords.append(lat)
+            self.coords.append(lon)
+        elif local == "name":
+            self._text = []
+
+    def end(self, name):
+        local = self._path.pop()
+        if local != "name" or self._text is None:
+            return
+        text = "".join(self._text).strip() or None
+        self._text = None
+        parent = self._path[-1] if self._path else None
+        # GPX 1.1 keeps the document name in <metadata>, GPX 1.0 directly under <gpx>
+        if parent in ("metadata", "gpx") and self.gpx_name is None:
+            self.gpx_name = text
+        elif parent == "trk" and self.track_name is None:
+            self.track_name = text
+
+    def characters(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+
+def read_gpx_track(stream: IO, chunk_size: int = READ_CHUNK_BYTES) -> Tuple[np.ndarray, Optional[str]]:
+    """
+    Stream a GPX document and collect its track points.
+
+    Args:
+        stream: Binary (or text) file-like object positioned at the start.
+        chunk_size: Number of bytes read per call.
+
+    Returns:
+        An (n, 2) float64 array of [lat, lon] and the route name (document
+        name, else the first named track), or None.
+
+    Raises:
+        xml.parsers.expat.ExpatError: If the document is not well-formed.
+    """
+    handler = _TrackHandler()
+    parser = expat.ParserCreate(namespace_separator=" ")
+    parser.buffer_text = True
+    parser.StartElementHandler = handler.start
+    parser.EndElementHandler = handler.end
+    parser.CharacterDataHandler = handler.characters
+
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        parser.Parse(chunk, False)
+    parser.Parse(b"", True)
+
+    coords = np.frombuffer(handler.coords, dtype=np.float64).reshape(-1, 2)
+    return coords, handler.gpx_name or handler.track_name
+
+
+def read_gpx_bytes(content: Union[str, bytes]) -> Tuple[np.ndarray, Optional[str]]:
+    """Parse an in-memory GPX document (see :func:`read_gpx_track`)."""
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return read_gpx_track(io.BytesIO(content))
+
+
+def parse_gpx_file(gpx_file_content) -> dict:
+    """
+    Parses GPX file content and extracts latitude and longitude from each track point,
+    as well as basic metadata (route name).
+
+    Args:
+        gpx_file_content: GPX file content as a string or bytes.
+
+    Returns:
+        A dictionary containing "coordinates" (list of [lat, lon] pairs)
+        and "name" (string, optional route name).
+        Returns {"coordinates": [], "name": None} if parsing fails or no points are found.
+    """
+    try:
+        coordinates, route_name = read_gpx_bytes(gpx_file_content)
+    except Exception as e:
+        logger.error(f"Error parsing GPX file: {e}")
+        return {"coordinates": [], "name": None}
+
+    return {"coordinates": coordinates.tolist(), "name": route_name}
+
+
+def parse_gpx_stream(stream) -> dict:
+    """Same contract as :func:`parse_gpx_file`, reading incrementally from a binary file object."""
+    try:
+        coordinates, route_name = read_gpx_track(stream)
+    except Exception as e:
+        logger.error(f"Error parsing GPX file: {e}")
+        return {"coordinates": [], "name": None}
+
+    return {"coordinates": coordinates.tolist(), "name": route_name}
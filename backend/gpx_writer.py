@@ -0,0 +1,119 @@
+"""Incremental GPX serialization.
+
+The document is produced as a sequence of string chunks so it can be handed
+straight to a ``StreamingResponse`` (or joined once for callers that still
+need the whole document in memory). Track points are rendered in batches,
+which keeps the cost linear in the number of points.
+
+When a :class:`timeline.Timeline` is supplied every point also carries its
+<ele>, <time> and (if present) a Garmin TrackPointExtension heart rate.
+"""
+from typing import Iterable, Iterator, Sequence
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+# Number of <trkpt> elements rendered into a single yielded chunk
+DEFAULT_CHUNK_POINTS = 2000
+
+GPX_HEADER = '''<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="FakeRun" xmlns="http://www.topografix.com/GPX/1/1" xmlns:gpxtpx="http://www.garmin.com/xmlschemas/TrackPointExtension/v1">
+  <metadata>
+    <name>{name}</name>
+    <desc>Generated route with distance: {distance}km, duration: {duration}min</desc>
+  </metadata>
+  <trk>
+    <name>{name}</name>
+    <trkseg>
+'''
+
+GPX_FOOTER = '''    </trkseg>
+  </trk>
+</gpx>'''
+
+TRKPT_TEMPLATE = '      <trkpt lat="{0}" lon="{1}"></trkpt>\n'
+TIMED_TRKPT_TEMPLATE = '      <trkpt lat="{0}" lon="{1}"><ele>{2:.1f}</ele><time>{3}Z</time></trkpt>\n'
+HR_TRKPT_TEMPLATE = (
+    '      <trkpt lat="{0}" lon="{1}"><ele>{2:.1f}</ele><time>{3}Z</time>'
+    '<extensions><gpxtpx:TrackPointExtension><gpxtpx:hr>{4}</gpxtpx:hr>'
+    '</gpxtpx:TrackPointExtension></extensions></trkpt>\n'
+)
+
+
+def render_header(run_details) -> str:
+    """Render everything up to and including the opening <trkseg>."""
+    return GPX_HEADER.format(
+        name=escape(str(run_details.route_name)),
+        distance=run_details.distance,
+        duration=run_details.duration,
+    )
+
+
+def iter_trkpts(route_coordinates: Iterable[Sequence[float]],
+                chunk_points: int = DEFAULT_CHUNK_POINTS) -> Iterator[str]:
+    """Yield <trkpt> elements joined into chunks of ``chunk_points`` points."""
+    batch = []
+    append = batch.append
+    template = TRKPT_TEMPLATE.format
+    for coord in route_coordinates:
+        append(template(coord[0], coord[1]))
+        if len(batch) >= chunk_points:
+            yield "".join(batch)
+            batch.clear()
+    if batch:
+        yield "".join(batch)
+
+
+def iter_timed_trkpts(route_coordinates: Sequence[Sequence[float]], timeline,
+                      chunk_points: int = DEFAULT_CHUNK_POINTS) -> Iterator[str]:
+    """Yield <trkpt> elements with elevation, time and heart rate from a Timeline."""
+    n = len(timeline.times)
+    for start in range(0, n, chunk_points):
+        stop = min(start + chunk_points, n)
+        coords = route_coordinates[start:stop]
+        times = np.datetime_as_string(timeline.times[start:stop], unit="s").tolist()
+        elevation = timeline.elevation[start:stop].tolist()
+        if timeline.heart_rate is None:
+            template = TIMED_TRKPT_TEMPLATE.format
+            yield "".join(
+                template(c[0], c[1], e, t) for c, e, t in zip(coords, elevation, times)
+            )
+        else:
+            template = HR_TRKPT_TEMPLATE.format
+            hr = timeline.heart_rate[start:stop].tolist()
+            yield "".join(
+                template(c[0], c[1], e, t, h) for c, e, t, h in zip(coords, elevation, times, hr)
+            )
+
+
+def iter_gpx(route_coordinates: Sequence[Sequence[float]], run_details, timeline=None,
+             chunk_points: int = DEFAULT_CHUNK_POINTS) -> Iterator[str]:
+    """
+    Yield a complete GPX 1.1 document in chunks.
+
+    Args:
+        route_coordinates: Sequence of [lat, lon] pairs.
+        run_details: Object exposing ``route_name``, ``distance`` and ``duration``.
+        timeline: Optional Timeline aligned with ``route_coordinates``; when
+            given, points carry <ele>, <time> and heart rate.
+        chunk_points: Number of track points per yielded chunk.
+    """
+    yield render_header(run_details)
+    if timeline is None:
+        yield from iter_trkpts(route_coordinates, chunk_points)
+    else:
+        yield from iter_timed_trkpts(route_coordinates, timeline, chunk_points)
+    yield GPX_FOOTER
+
+
+def iter_gpx_bytes(route_coordinates: Sequence[Sequence[float]], run_details, timeline=None,
+                   chunk_points: int = DEFAULT_CHUNK_POINTS) -> Iterator[bytes]:
+    """Same as :func:`iter_gpx` but UTF-8 encoded, ready for a response body."""
+    for chunk in iter_gpx(route_coordinates, run_details, timeline, chunk_points):
+        yield chunk.encode("utf-8")
+
+
+def gpx_filename(route_name: str) -> str:
+    """Build a safe attachment filename from a route name."""
+    safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in (route_name or "").strip())
+    return f"{safe or 'route'}.gpx"
@@ -0,0 +1,384 @@
+"""In-process background jobs persisted in SQLite.
+
+Jobs are rows of the ``jobs`` table (input files in ``job_files``), so they
+survive restarts: rows still marked running when the process starts are
+queued again. ``JobQueue`` runs a fixed number of asyncio worker tasks that
+claim the queued job with the highest priority, oldest first, with a single
+``UPDATE ... RETURNING``.
+
+Handlers are async functions registered per kind, taking a ``JobContext``
+and returning a ``JobResult`` (stored as a downloadable BLOB) or a JSON
+serializable value. Large results are streamed to a file in ``results_dir``
+with ``JobContext.write_result`` instead and returned as ``JobResult(path=...)``.
+They should hand heavy work to ``run_db``/``run_cpu`` or a thread so the
+workers never block the event loop. An exception queues the job again after
+an exponential backoff until ``max_attempts`` is reached; ``JobFailed``
+fails it at once.
+"""
+import asyncio
+import json
+import logging
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, ContextManager, Dict, Iterable, List, Optional, Tuple, Union
+
+from executors import run_db
+
+logger = logging.getLogger(__name__)
+
+JOB_COLUMNS = (
+    "id, user_id, kind, status, priority, progress, message, attempts, max_attempts, error, "
+    "result_media_type, result_filename, length(result) AS result_size, created_at, started_at, finished_at"
+)
+
+_CLAIM_QUERY = (
+    "UPDATE jobs SET status = 'running', attempts = attempts + 1, progress = 0, message = NULL, started_at = ? "
+    "WHERE id = (SELECT id FROM jobs WHERE status = 'queued' AND run_after <= ? "
+    "ORDER BY priority DESC, created_at, id LIMIT 1) "
+    "RETURNING id, user_id, kind, params, attempts, max_attempts"
+)
+
+
+class JobFailed(Exception):
+    """Raised by a handler for errors that retrying cannot fix."""
+
+
+class QueueFullError(Exception):
+    """Raised when a user already has the maximum number of pending jobs."""
+
+
+@dataclass
+class JobResult:
+    content: bytes = b""
+    media_type: str = "application/octet-stream"
+    filename: Optional[str] = None
+    # Set instead of content for results written by JobContext.write_result
+    path: Optional[str] = None
+
+
+class JobContext:
+    """What a handler gets to see of its job, plus progress reporting."""
+
+    def __init__(self, queue: "JobQueue", row):
+        self.queue = queue
+        self.id = row['id']
+        self.user_id = row['user_id']
+        self.kind = row['kind']
+        self.params = json.loads(row['params'])
+        self.attempt = row['attempts']
+        self._last_report = 0.0
+
+    def report(self, progress: float, message: Optional[str] = None, force: bool = False) -> None:
+        """
+        Store progress in [0, 1], at most every ``progress_interval`` seconds
+        unless forced. Blocking, call from a worker thread or via ``progress``.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_report < self.queue.progress_interval:
+            return
+        self._last_report = now
+        with self.queue.connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET progress = ?, message = COALESCE(?, message) WHERE id = ?",
+                (min(1.0, max(0.0, progress)), message, self.id)
+            )
+            conn.commit()
+
+    async def progress(self, progress: float, message: Optional[str] = None, force: bool = False) -> None:
+        await run_db(self.report, progress, message, force)
+
+    async def files(self) -> List[Tuple[str, bytes]]:
+        """Input files stored with the job, in upload order."""
+        return await run_db(self.queue.read_files, self.id)
+
+    def write_result(self, chunks: Iterable[bytes]) -> str:
+        """
+        Write result chunks to this job's file in ``results_dir`` as they come
+        and return its path. Blocking, call from a worker thread.
+        """
+        path = self.queue.result_path(self.id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as file:
+            for chunk in chunks:
+                file.write(chunk)
+        return str(path)
+
+
+Handler = Callable[[JobContext], Awaitable[Any]]
+
+
+class JobQueue:
+    """
+    Persistent job queue with a bounded pool of asyncio workers.
+
+    Args:
+        connection: Callable returning a connection context manager
+            (``get_db_connection``).
+        workers: Number of jobs run at the same time.
+        max_attempts: Default attempts per job, retries included.
+        retry_backoff: Seconds before the first retry, doubled for each further one.
+        poll_interval: Longest sleep of an idle worker, picks up delayed retries.
+        max_pending_per_user: Queued plus running jobs allowed per user.
+        retention: Seconds finished jobs and their results are kept.
+        results_dir: Folder for results written with ``JobContext.write_result``.
+    """
+
+    def __init__(self, connection: Callable[[], ContextManager], workers: int = 2, max_attempts: int = 3,
+                 retry_backoff: float = 2.0, poll_interval: float = 5.0, max_pending_per_user: int = 20,
+                 retention: float = 24 * 3600, progress_interval: float = 0.5,
+                 results_dir: Union[str, Path, None] = None):
+        self.connection = connection
+        self.results_dir = Path(results_dir) if results_dir is not None else Path(tempfile.gettempdir()) / "job_results"
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.poll_interval = poll_interval
+        self.max_pending_per_user = max_pending_per_user
+        self.retention = retention
+        self.progress_interval = progress_interval
+        self.handlers: Dict[str, Handler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._last_cleanup = 0.0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+
+    def register(self, kind: str, handler: Handler) -> None:
+        self.handlers[kind] = handler
+
+    # Blocking database helpers, run via run_db
+
+    def insert(self, user_id: str, kind: str, params: dict, priority: int = 0,
+               files: Optional[List[Tuple[str, bytes]]] = None, max_attempts: Optional[int] = None) -> str:
+        job_id = str(uuid.uuid4())
+        with self.connection() as conn:
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE user_id = ? AND status IN ('queued', 'running')",
+                (user_id,)
+            ).fetchone()[0]
+            if pending >= self.max_pending_per_user:
+                raise QueueFullError(f"At most {self.max_pending_per_user} pending jobs per user")
+            conn.execute(
+                "INSERT INTO jobs (id, user_id, kind, params, status, priority, progress, attempts, max_attempts, "
+                "run_after, created_at) VALUES (?, ?, ?, ?, 'queued', ?, 0, 0, ?, 0, ?)",
+                (job_id, user_id, kind, json.dumps(params), priority, max_attempts or self.max_attempts,
+                 datetime.utcnow().isoformat())
+            )
+            if files:
+                conn.executemany(
+                    "INSERT INTO job_files (job_id, position, filename, content) VALUES (?, ?, ?, ?)",
+                    [(job_id, position, name, content) for position, (name, content) in enumerate(files)]
+                )
+            conn.commit()
+        return job_id
+
+    def read_files(self, job_id: str) -> List[Tuple[str, bytes]]:
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT filename, content FROM job_files WHERE job_id = ? ORDER BY position", (job_id,)
+            ).fetchall()
+        return [(row['filename'], bytes(row['content'])) for row in rows]
+
+    def get(self, job_id: str, user_id: str):
+        with self.connection() as conn:
+            return conn.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ? AND user_id = ?", (job_id, user_id)
+            ).fetchone()
+
+    def get_result(self, job_id: str, user_id: str):
+        with self.connection() as conn:
+            return conn.execute(
+                "SELECT status, result, result_path, result_media_type, result_filename FROM jobs "
+                "WHERE id = ? AND user_id = ?",
+                (job_id, user_id)
+            ).fetchone()
+
+    def result_path(self, job_id: str) -> Path:
+        return self.results_dir / job_id
+
+    def _remove_result_file(self, job_id: str) -> None:
+        self.result_path(job_id).unlink(missing_ok=True)
+
+    def _claim(self):
+        now = datetime.utcnow().isoformat()
+        with self.connection() as conn:
+            row = conn.execute(_CLAIM_QUERY, (now, time.time())).fetchone()
+            conn.commit()
+        return row
+
+    def _finish(self, job_id: str, result: Any) -> None:
+        path = None
+        if isinstance(result, JobResult):
+            content, media_type, filename = result.content, result.media_type, result.filename
+            if result.path is not None:
+                content, path = None, result.path
+        else:
+            content, media_type, filename = json.dumps(result).encode("utf-8"), "application/json", None
+        with self.connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'succeeded', progress = 1, result = ?, result_path = ?, "
+                "result_media_type = ?, result_filename = ?, error = NULL, finished_at = ? WHERE id = ?",
+                (content, path, media_type, filename, datetime.utcnow().isoformat(), job_id)
+            )
+            conn.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+            conn.commit()
+
+    def _fail(self, job_id: str, error: str, retry_in: Optional[float]) -> None:
+        with self.connection() as conn:
+            if retry_in is None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                    (error, datetime.utcnow().isoformat(), job_id)
+                )
+                conn.execute("DELETE FROM job_files WHERE job_id = ?", (job_id,))
+            else:
+                conn.execute(
+                    "UPDATE jobs SET status = 'queued', error = ?, run_after = ? WHERE id = ?",
+                    (error, time.time() + retry_in, job_id)
+                )
+            conn.commit()
+        # Whatever an attempt had written is never served
+        self._remove_result_file(job_id)
+
+    def recover(self) -> int:
+        """Queue jobs interrupted by a shutdown or crash again."""
+        with self.connection() as conn:
+            recovered = conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'").rowcount
+            conn.commit()
+        return recovered
+
+    def cleanup(self) -> int:
+        """Delete finished jobs older than ``retention``."""
+        cutoff = datetime.utcfromtimestamp(time.time() - self.retention).isoformat()
+        with self.connection() as conn:
+            expired = conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ? "
+                "AND result_path IS NOT NULL",
+                (cutoff,)
+            ).fetchall()
+            conn.execute(
+                "DELETE FROM job_files WHERE job_id IN "
+                "(SELECT id FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?)",
+                (cutoff,)
+            )
+            deleted = conn.execute(
+                "DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?", (cutoff,)
+            ).rowcount
+            conn.commit()
+        for row in expired:
+            self._remove_result_file(row['id'])
+        return deleted
+
+    def counts(self) -> Dict[str, int]:
+        with self.connection() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row['status']: row['n'] for row in rows}
+
+    # Workers
+
+    async def submit(self, user_id: str, kind: str, params: Optional[dict] = None, priority: int = 0,
+                     files: Optional[List[Tuple[str, bytes]]] = None) -> str:
+        """Persist a job and wake a worker, returns the job id."""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = await run_db(self.insert, user_id, kind, params or {}, priority, files)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def start(self) -> None:
+        recovered = await run_db(self.recover)
+        if recovered:
+            logger.info(f"Requeued {recovered} interrupted jobs")
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self) -> None:
+        while True:
+            # Cleared before claiming, so a submit during the claim is not missed
+            self._wakeup.clear()
+            try:
+                row = await run_db(self._claim)
+            except Exception as e:
+                logger.error(f"Error claiming job: {str(e)}")
+                row = None
+            if row is None:
+                await self._idle()
+                continue
+            # Another queued job may be waiting for a free worker
+            self._wakeup.set()
+            await self._run(row)
+
+    async def _idle(self) -> None:
+        if time.monotonic() - self._last_cleanup > 3600:
+            self._last_cleanup = time.monotonic()
+            try:
+                await run_db(self.cleanup)
+            except Exception as e:
+                logger.error(f"Error cleaning up jobs: {str(e)}")
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self, row) -> None:
+        context = JobContext(self, row)
+        handler = self.handlers.get(context.kind)
+        self.running += 1
+        try:
+            if handler is None:
+                raise JobFailed(f"Unknown job kind: {context.kind}")
+            result = await handler(context)
+        except asyncio.CancelledError:
+            # Shutdown: the job stays running in the table and is requeued by recover()
+            raise
+        except Exception as e:
+            permanent = isinstance(e, JobFailed) or row['attempts'] >= row['max_attempts']
+            retry_in = None if permanent else self.retry_backoff * 2 ** (row['attempts'] - 1)
+            logger.error(f"Job {context.id} ({context.kind}) attempt {row['attempts']} failed: {str(e)}")
+            await self._record_failure(context.id, str(e), retry_in)
+            if permanent:
+                self.failed += 1
+            else:
+                self.retried += 1
+        else:
+            try:
+                await run_db(self._finish, context.id, result)
+            except Exception as e:
+                # e.g. a result that is not JSON serializable, retrying would not help
+                logger.error(f"Error storing result of job {context.id} ({context.kind}): {str(e)}")
+                await self._record_failure(context.id, f"Could not store result: {e}", None)
+                self.failed += 1
+            else:
+                self.completed += 1
+        finally:
+            self.running -= 1
+
+    async def _record_failure(self, job_id: str, error: str, retry_in: Optional[float]) -> None:
+        """Mark a job failed or queued for a retry; on a database error it stays running for recover()."""
+        try:
+            await run_db(self._fail, job_id, error, retry_in)
+        except Exception as e:
+            logger.error(f"Error recording failure of job {job_id}: {str(e)}")
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "kinds": sorted(self.handlers),
+        }
@@ -0,0 +1,271 @@
+"""Prometheus metrics kept in process.
+
+A small registry of counters and histograms rendered in the Prometheus text
+exposition format (version 0.0.4) by ``GET /metrics``. Recording a value is
+a dict lookup, a ``bisect`` and a few additions under a per-series lock, so
+collection stays on in production. Numbers other components already count
+(cache hits, pool checkouts) are read at scrape time by collectors rather
+than counted twice.
+
+``RequestMetricsMiddleware`` times every request and labels it with the
+route template (``/api/routes/{route_id}``), never the raw path, so the
+number of series stays bounded. The ``RequestStats`` of the request being
+served is kept in a context variable; ``run_db`` adds the time and count of
+its database calls to it.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = tuple(float(4 ** k) for k in range(4, 13))  # 256 B .. 16 MiB
+COUNT_BUCKETS = (0.0, 1.0, 2.0, 5.0, 10.0, 25.0, 50.0, 100.0)
+POINT_BUCKETS = (10.0, 100.0, 1000.0, 10_000.0, 100_000.0, 1_000_000.0)
+
+
+class Family(NamedTuple):
+    """One metric as returned by a collector: samples are (labels, value)."""
+    name: str
+    type: str
+    documentation: str
+    samples: List[Tuple[Dict[str, str], float]]
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == float("-inf"):
+        return "-Inf"
+    return repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def samples(self, name: str, labels: Dict[str, str]):
+        yield name, labels, self.value
+
+
+class _HistogramChild:
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._lock = threading.Lock()
+        self.bounds = bounds
+        # Per-bucket counts, made cumulative when rendered; the last one is +Inf
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def samples(self, name: str, labels: Dict[str, str]):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), counts):
+            cumulative += count
+            yield f"{name}_bucket", dict(labels, le=_format_value(bound)), cumulative
+        yield f"{name}_sum", labels, total
+        yield f"{name}_count", labels, cumulative
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[tuple, object] = {}
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """The series for these label values, in ``labelnames`` order."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.type}"
+        for values, child in list(self._children.items()):
+            for name, labels, value in child.samples(self.name, dict(zip(self.labelnames, values))):
+                yield f"{name}{_format_labels(labels)} {_format_value(value)}"
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.bounds = tuple(sorted(float(b) for b in buckets if b != float("inf")))
+
+    def _new_child(self):
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+
+class Registry:
+    """Metrics and scrape-time collectors rendered together by ``render``."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+
+    def _add(self, metric: _Metric) -> _Metric:
+        if any(existing.name == metric.name for existing in self._metrics):
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        """Register a callable returning ``Family`` values, called on every scrape."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for family in collector():
+                lines.append(f"# HELP {family.name} {family.documentation}")
+                lines.append(f"# TYPE {family.name} {family.type}")
+                lines.extend(f"{family.name}{_format_labels(labels)} {_format_value(value)}"
+                             for labels, value in family.samples)
+        return "\n".join(lines) + "\n"
+
+
+class RequestStats:
+    """Database work done while serving one request."""
+    __slots__ = ("db_seconds", "db_calls")
+
+    def __init__(self):
+        self.db_seconds = 0.0
+        self.db_calls = 0
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def record_db_call(seconds: float) -> None:
+    """Add one database call to the request being served, if any."""
+    stats = current_request.get()
+    if stats is not None:
+        stats.db_seconds += seconds
+        stats.db_calls += 1
+
+
+class RequestMetrics:
+    """The per-route HTTP metrics recorded by ``RequestMetricsMiddleware``."""
+
+    def __init__(self, registry: Registry, prefix: str = "fakerun"):
+        self.duration = registry.histogram(
+            f"{prefix}_http_request_duration_seconds", "Request latency by route template and status",
+            ("method", "route", "status"), LATENCY_BUCKETS)
+        self.request_size = registry.histogram(
+            f"{prefix}_http_request_size_bytes", "Request body size", ("method", "route"), SIZE_BUCKETS)
+        self.response_size = registry.histogram(
+            f"{prefix}_http_response_size_bytes", "Response body size", ("method", "route"), SIZE_BUCKETS)
+        self.db_seconds = registry.histogram(
+            f"{prefix}_http_request_db_seconds", "Time spent in database calls per request",
+            ("method", "route"), LATENCY_BUCKETS)
+        self.db_calls = registry.histogram(
+            f"{prefix}_http_request_db_calls", "Database calls per request", ("method", "route"), COUNT_BUCKETS)
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware timing each HTTP request, see ``RequestMetrics``."""
+
+    def __init__(self, app, metrics: RequestMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = 500
+        received = 0
+        sent = 0
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            current_request.reset(token)
+            # The router stores the matched route in the scope
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope["method"]
+            metrics = self.metrics
+            metrics.duration.labels(method, route, str(status)).observe(time.perf_counter() - start)
+            metrics.request_size.labels(method, route).observe(received)
+            metrics.response_size.labels(method, route).observe(sent)
+            metrics.db_seconds.labels(method, route).observe(stats.db_seconds)
+            metrics.db_calls.labels(method, route).observe(stats.db_calls)
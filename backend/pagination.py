@@ -0,0 +1,43 @@
+"""Keyset pagination cursors and field projections for list endpoints."""
+import base64
+import json
+from typing import Iterable, List, Optional, Sequence, Set
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a client sends a cursor that was not issued by the API."""
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Opaque, URL-safe cursor for the sort key of the last returned row."""
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, length: int) -> List:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise InvalidCursorError("Malformed cursor") from e
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidCursorError("Malformed cursor")
+    return values
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[Set[str]]:
+    """
+    Parse a comma separated ``fields=`` projection.
+
+    Returns None when no projection was requested.
+
+    Raises:
+        ValueError: If an unknown field is requested.
+    """
+    if not fields:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return requested
@@ -0,0 +1,16 @@
+"""Password hashing.
+
+Kept in its own small module so hashing can run in worker processes
+without importing the FastAPI application.
+"""
+from passlib.context import CryptContext
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+def verify_password(plain_password, hashed_password):
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def get_password_hash(password):
+    return pwd_context.hash(password)
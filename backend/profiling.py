@@ -0,0 +1,271 @@
+"""Opt-in profiling of single requests.
+
+A request is profiled when it carries ``X-Profile-Token`` with the admin
+token, or at random with probability ``sample_rate`` (only paths under one
+of ``sample_paths``). The handler runs under ``cProfile`` on the event loop
+thread. Up to Python 3.11 a profiler only sees its own thread, so every
+``run_db`` call the request makes is profiled in its DB thread and the
+profiles are merged into one pstats table. From 3.12 cProfile is built on
+``sys.monitoring``, which allows a single active profiler per interpreter
+and sees every thread, so the event loop profiler covers the DB calls by
+itself. Work on the CPU process pool is not included, it shows up as time
+waiting for the executor.
+
+Only one request is profiled at a time; requests arriving meanwhile are not
+profiled. Coroutines of other requests that run on the event loop while the
+profiled one awaits (and from 3.12 their DB calls too) are attributed to
+it, so under heavy traffic read the numbers per function, not as the
+request's own total.
+
+Profiles are stored in the ``request_profiles`` table in the marshal format
+of ``pstats.Stats.dump_stats`` (open with ``pstats`` or snakeviz), the most
+recent ``max_stored`` are kept. ``hot_functions`` sums them per function.
+"""
+import cProfile
+import hmac
+import logging
+import marshal
+import pstats
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Callable, ContextManager, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+HEADER = "x-profile-token"
+SORT_KEYS = {"tottime": "total_time", "cumtime": "cumulative_time", "calls": "calls"}
+
+# From 3.12 a second active profiler raises "Another profiling tool is already active"
+PER_THREAD_PROFILERS = sys.version_info < (3, 12)
+
+
+class RequestProfile:
+    """The profilers of one request: the event loop one plus, before 3.12, one per DB call."""
+
+    def __init__(self):
+        self.id = str(uuid.uuid4())
+        self.main = cProfile.Profile()
+        self.extra: List[cProfile.Profile] = []
+
+    def stats(self) -> pstats.Stats:
+        stats = pstats.Stats(self.main)
+        # list() copies first: a DB call abandoned by a cancelled request may still append
+        for profile in list(self.extra):
+            stats.add(profile)
+        return stats
+
+
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar("current_profile", default=None)
+
+
+def profiled(fn: Callable) -> Callable:
+    """
+    Wrap fn to run under its own profiler when the current request is
+    profiled, on Python versions where the request's profiler cannot see it.
+    """
+    session = current_profile.get()
+    if session is None or not PER_THREAD_PROFILERS:
+        return fn
+
+    def run(*args, **kwargs):
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(fn, *args, **kwargs)
+        finally:
+            session.extra.append(profile)
+
+    return run
+
+
+class Profiler:
+    """
+    Decides which requests to profile and stores their profiles.
+
+    Args:
+        connection: Callable returning a connection context manager
+            (``get_db_connection``).
+        admin_token: Value of ``X-Profile-Token`` that profiles a request and
+            grants access to the stored profiles; None disables both.
+        sample_rate: Share of requests profiled without the header.
+        sample_paths: Path prefixes eligible for sampling.
+        exclude_paths: Path prefixes never profiled, e.g. the profile endpoints.
+        min_duration_ms: Sampled profiles of faster requests are dropped.
+        max_stored: Stored profiles kept, oldest are deleted first.
+        rng: Random source in [0, 1), replaceable in tests.
+    """
+
+    def __init__(self, connection: Callable[[], ContextManager], admin_token: Optional[str] = None,
+                 sample_rate: float = 0.0, sample_paths: Sequence[str] = ("/api/",),
+                 exclude_paths: Sequence[str] = (), min_duration_ms: float = 0.0, max_stored: int = 500,
+                 rng: Callable[[], float] = random.random):
+        self.connection = connection
+        self.admin_token = admin_token or None
+        self.sample_rate = sample_rate
+        self.sample_paths = tuple(sample_paths)
+        self.exclude_paths = tuple(exclude_paths)
+        self.min_duration_ms = min_duration_ms
+        self.max_stored = max_stored
+        self.rng = rng
+        self.busy = False
+        self.profiled = 0
+        self.stored = 0
+        self.skipped_busy = 0
+
+    def is_admin(self, token: Optional[str]) -> bool:
+        return bool(self.admin_token and token) and hmac.compare_digest(token, self.admin_token)
+
+    def trigger(self, path: str, token: Optional[str]) -> Optional[str]:
+        """Why a request should be profiled ("header" or "sample"), None if it should not."""
+        if self.exclude_paths and path.startswith(self.exclude_paths):
+            return None
+        if token is not None and self.is_admin(token):
+            return "header"
+        if self.sample_rate > 0 and path.startswith(self.sample_paths) and self.rng() < self.sample_rate:
+            return "sample"
+        return None
+
+    # Blocking database helpers, run via run_db
+
+    def store(self, profile: RequestProfile, method: str, route: str, path: str, status: int,
+              duration_ms: float, trigger: str) -> None:
+        stats = marshal.dumps(profile.stats().stats)
+        with self.connection() as conn:
+            conn.execute(
+                "INSERT INTO request_profiles (id, method, route, path, status, duration_ms, trigger, "
+                "created_at, stats) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (profile.id, method, route, path, status, duration_ms, trigger, datetime.utcnow().isoformat(), stats)
+            )
+            conn.execute(
+                "DELETE FROM request_profiles WHERE id NOT IN "
+                "(SELECT id FROM request_profiles ORDER BY created_at DESC LIMIT ?)",
+                (self.max_stored,)
+            )
+            conn.commit()
+        self.stored += 1
+
+    def list(self, route: Optional[str] = None, limit: int = 50) -> list:
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT id, method, route, path, status, duration_ms, trigger, created_at, "
+                "length(stats) AS size FROM request_profiles WHERE (? IS NULL OR route = ?) "
+                "ORDER BY created_at DESC LIMIT ?",
+                (route, route, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get(self, profile_id: str) -> Optional[bytes]:
+        with self.connection() as conn:
+            row = conn.execute("SELECT stats FROM request_profiles WHERE id = ?", (profile_id,)).fetchone()
+        return None if row is None else bytes(row['stats'])
+
+    def hot_functions(self, route: Optional[str] = None, limit: int = 30, sort: str = "tottime",
+                      profiles: int = 200) -> dict:
+        """
+        Functions summed over the ``profiles`` most recent stored profiles,
+        optionally of one route template, ordered by ``sort`` (see SORT_KEYS).
+        """
+        with self.connection() as conn:
+            rows = conn.execute(
+                "SELECT stats FROM request_profiles WHERE (? IS NULL OR route = ?) "
+                "ORDER BY created_at DESC LIMIT ?",
+                (route, route, profiles)
+            ).fetchall()
+        totals = {}
+        for row in rows:
+            for func, (primitive, calls, tottime, cumtime, _callers) in marshal.loads(row['stats']).items():
+                entry = totals.setdefault(func, [0, 0, 0.0, 0.0, 0])
+                entry[0] += primitive
+                entry[1] += calls
+                entry[2] += tottime
+                entry[3] += cumtime
+                entry[4] += 1
+        functions = [
+            {
+                "function": pstats.func_std_string(func),
+                "calls": calls,
+                "primitive_calls": primitive,
+                "total_time": tottime,
+                "cumulative_time": cumtime,
+                "per_call": tottime / calls if calls else 0.0,
+                "profiles": seen,
+            }
+            for func, (primitive, calls, tottime, cumtime, seen) in totals.items()
+        ]
+        functions.sort(key=lambda item: item[SORT_KEYS[sort]], reverse=True)
+        return {"profiles": len(rows), "route": route, "sort": sort, "functions": functions[:limit]}
+
+    def stats(self) -> dict:
+        return {
+            "header_enabled": self.admin_token is not None,
+            "sample_rate": self.sample_rate,
+            "sample_paths": list(self.sample_paths),
+            "min_duration_ms": self.min_duration_ms,
+            "profiled": self.profiled,
+            "stored": self.stored,
+            "skipped_busy": self.skipped_busy,
+        }
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling the requests ``Profiler.trigger`` selects."""
+
+    def __init__(self, app, profiler: Profiler, store: Callable):
+        self.app = app
+        self.profiler = profiler
+        # Async callable persisting a profile, e.g. run_db(profiler.store, ...)
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = None
+        for name, value in scope["headers"]:
+            if name == HEADER.encode():
+                token = value.decode("latin-1")
+                break
+        profiler = self.profiler
+        trigger = profiler.trigger(scope["path"], token)
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+        if profiler.busy:
+            profiler.skipped_busy += 1
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trigger == "header":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"x-profile-id", profile.id.encode()))
+                    message = dict(message, headers=headers)
+            await send(message)
+
+        profiler.busy = True
+        profiler.profiled += 1
+        context_token = current_profile.set(profile)
+        start = time.perf_counter()
+        profile.main.enable()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.main.disable()
+            duration_ms = (time.perf_counter() - start) * 1000
+            current_profile.reset(context_token)
+            profiler.busy = False
+            if trigger == "header" or duration_ms >= profiler.min_duration_ms:
+                route = getattr(scope.get("route"), "path", None) or "unmatched"
+                try:
+                    await self.store(profile, scope["method"], route, scope["path"], status, duration_ms, trigger)
+                except Exception as e:
+                    logger.error(f"Error storing request profile: {str(e)}")
@@ -0,0 +1,133 @@
+"""Per-route metrics computed once on save.
+
+Distance, split boundaries, bounding box and elevation gain used to be
+recomputed by the frontend every time a route was opened. They are now
+computed here with NumPy when a route's geometry (or elevation input)
+changes and stored in ``route_metrics``; :func:`metrics_digest` tells
+whether a stored row is still current.
+
+Saved routes carry no per-point elevation, the profile comes from
+``RunDetails.km_elevation_changes`` through :func:`timeline.synthesize_timeline`.
+Without it the elevation fields are None.
+"""
+import hashlib
+import json
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from geo import SPLIT_LENGTH_M, as_coord_array, cumulative_distance, split_index
+
+
+class RouteMetrics(NamedTuple):
+    distance: float                             # metres
+    point_count: int
+    bbox: Optional[Tuple[float, float, float, float]]   # min_lat, min_lon, max_lat, max_lon
+    split_length: float                         # metres
+    split_indices: np.ndarray                   # int64, first point of every split
+    cumulative_distance: np.ndarray             # metres from the start, per point
+    elevation_gain: Optional[float]
+    elevation_loss: Optional[float]
+    split_elevation_changes: Optional[np.ndarray]
+
+
+def compute_metrics(route_coordinates, split_length: float = SPLIT_LENGTH_M["km"],
+                    elevation: Optional[np.ndarray] = None) -> RouteMetrics:
+    """
+    Compute the metrics of a route in a handful of array operations.
+
+    Args:
+        route_coordinates: [lat, lon] pairs (list or (n, 2) array).
+        split_length: Split length in metres (1000 for km splits).
+        elevation: Optional elevation in metres aligned with the points.
+    """
+    coords = as_coord_array(route_coordinates)
+    cum = cumulative_distance(coords)
+    n = len(coords)
+    if n == 0:
+        return RouteMetrics(0.0, 0, None, split_length,
+                            np.zeros(0, dtype=np.int64), cum, None, None, None)
+
+    splits = split_index(cum, split_length)
+    # A split starts at the first point past each boundary
+    split_indices = np.concatenate(([0], np.flatnonzero(np.diff(splits)) + 1)).astype(np.int64)
+    mins = coords.min(axis=0)
+    maxs = coords.max(axis=0)
+
+    gain = loss = split_changes = None
+    if elevation is not None and len(elevation) == n:
+        elevation = np.asarray(elevation, dtype=np.float64)
+        deltas = np.diff(elevation)
+        gain = float(deltas[deltas > 0].sum())
+        loss = float(-deltas[deltas < 0].sum())
+        # Change over each split, from its first point to the first point of the next one
+        ends = np.append(split_indices[1:], n - 1)
+        split_changes = elevation[ends] - elevation[split_indices]
+
+    return RouteMetrics(
+        distance=float(cum[-1]),
+        point_count=n,
+        bbox=(float(mins[0]), float(mins[1]), float(maxs[0]), float(maxs[1])),
+        split_length=float(split_length),
+        split_indices=split_indices,
+        cumulative_distance=cum,
+        elevation_gain=gain,
+        elevation_loss=loss,
+        split_elevation_changes=split_changes,
+    )
+
+
+def metrics_digest(route_coordinates, split_length: float,
+                   elevation_changes: Optional[Sequence[float]]) -> str:
+    """Fingerprint of everything the metrics depend on."""
+    h = hashlib.sha256(np.ascontiguousarray(as_coord_array(route_coordinates)).tobytes())
+    h.update(json.dumps([split_length, list(elevation_changes or [])]).encode("utf-8"))
+    return h.hexdigest()[:32]
+
+
+def metrics_to_row(metrics: RouteMetrics) -> dict:
+    """Column values for the route_metrics table (arrays as little-endian BLOBs)."""
+    min_lat, min_lon, max_lat, max_lon = metrics.bbox or (None, None, None, None)
+    changes = metrics.split_elevation_changes
+    return {
+        "distance": metrics.distance,
+        "point_count": metrics.point_count,
+        "min_lat": min_lat,
+        "min_lon": min_lon,
+        "max_lat": max_lat,
+        "max_lon": max_lon,
+        "split_length": metrics.split_length,
+        "split_indices": metrics.split_indices.astype("<i4").tobytes(),
+        "cumulative_distance": metrics.cumulative_distance.astype("<f4").tobytes(),
+        "elevation_gain": metrics.elevation_gain,
+        "elevation_loss": metrics.elevation_loss,
+        "split_elevation_changes": None if changes is None else changes.astype("<f4").tobytes(),
+    }
+
+
+def metrics_payload(row, include_cumulative: bool = False) -> dict:
+    """API representation of a route_metrics row."""
+    changes = row["split_elevation_changes"]
+    payload = {
+        "distance": row["distance"],
+        "distance_km": row["distance"] / 1000,
+        "point_count": row["point_count"],
+        "bbox": None if row["min_lat"] is None else {
+            "min_lat": row["min_lat"],
+            "min_lon": row["min_lon"],
+            "max_lat": row["max_lat"],
+            "max_lon": row["max_lon"],
+        },
+        "split_length": row["split_length"],
+        "split_indices": np.frombuffer(row["split_indices"], dtype="<i4").tolist(),
+        "elevation_gain": row["elevation_gain"],
+        "elevation_loss": row["elevation_loss"],
+        "split_elevation_changes": (
+            None if changes is None
+            else np.round(np.frombuffer(changes, dtype="<f4").astype(np.float64), 2).tolist()
+        ),
+    }
+    if include_cumulative:
+        payload["cumulative_distance"] = np.round(
+            np.frombuffer(row["cumulative_distance"], dtype="<f4").astype(np.float64), 2).tolist()
+    return payload
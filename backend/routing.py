@@ -0,0 +1,377 @@
+"""Offline foot routing on a local OpenStreetMap extract.
+
+The ``.osm`` XML extract is streamed through expat (like gpx_reader) and
+every way a pedestrian may use becomes a pair of directed edges. The graph
+is kept in compressed sparse row form:
+
+    lat, lon    float64 per node
+    indptr      int64, edges of node i are indptr[i]:indptr[i + 1]
+    indices     int32 target node of each edge
+    weights     float32 edge length in metres
+
+and cached on disk as ``.npy`` files that are memory-mapped on the next
+start, so only the first start pays for parsing. Queries snap both ends
+to the nearest node and run a bidirectional A* with the symmetric
+(average) potential, which keeps the reduced edge costs non-negative in
+both directions.
+"""
+import hashlib
+import heapq
+import json
+import math
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import IO, List, Optional, Tuple, Union
+from xml.parsers import expat
+
+import numpy as np
+
+from geo import EARTH_RADIUS_M, segment_lengths
+
+GRAPH_FORMAT_VERSION = 1
+READ_CHUNK_BYTES = 1024 * 1024
+
+# highway=* values open to pedestrians unless tagged otherwise
+FOOT_HIGHWAYS = frozenset({
+    "footway", "path", "pedestrian", "steps", "track", "living_street", "residential",
+    "service", "unclassified", "road", "tertiary", "tertiary_link", "secondary",
+    "secondary_link", "primary", "primary_link", "cycleway", "bridleway", "corridor",
+})
+FOOT_ALLOWED = frozenset({"yes", "designated", "permissive"})
+ACCESS_DENIED = frozenset({"no", "private"})
+
+_ARRAYS = ("lat", "lon", "indptr", "indices", "weights")
+
+
+class NoRouteError(LookupError):
+    """Raised when the two points are not connected in the graph."""
+
+
+class _OsmHandler:
+    """Expat callbacks collecting nodes and the node lists of walkable ways."""
+
+    def __init__(self):
+        self.node_ids = array("q")
+        self.node_lat = array("d")
+        self.node_lon = array("d")
+        self.way_refs = array("q")
+        self.way_starts = array("q")
+        self._refs: Optional[List[int]] = None
+        self._tags: dict = {}
+
+    def start(self, name, attrs):
+        if name == "node":
+            try:
+                lat, lon = float(attrs["lat"]), float(attrs["lon"])
+                node_id = int(attrs["id"])
+            except (KeyError, ValueError):
+                return
+            self.node_ids.append(node_id)
+            self.node_lat.append(lat)
+            self.node_lon.append(lon)
+        elif name == "way":
+            self._refs = []
+            self._tags = {}
+        elif self._refs is not None:
+            if name == "nd" and "ref" in attrs:
+                self._refs.append(int(attrs["ref"]))
+            elif name == "tag" and "k" in attrs:
+                self._tags[attrs["k"]] = attrs.get("v", "")
+
+    def end(self, name):
+        if name != "way" or self._refs is None:
+            return
+        if len(self._refs) > 1 and is_walkable(self._tags):
+            self.way_starts.append(len(self.way_refs))
+            self.way_refs.extend(self._refs)
+        self._refs = None
+
+
+def is_walkable(tags: dict) -> bool:
+    """Whether a way with these tags can be used on foot."""
+    foot = tags.get("foot")
+    if foot in FOOT_ALLOWED:
+        return True
+    if foot == "no" or tags.get("access") in ACCESS_DENIED:
+        return False
+    return tags.get("highway") in FOOT_HIGHWAYS
+
+
+class FootGraph:
+    """Walkable street graph in CSR form (see module docstring)."""
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, indptr: np.ndarray,
+                 indices: np.ndarray, weights: np.ndarray):
+        self.lat = lat
+        self.lon = lon
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        # Scalar copies for the search loop, element access on arrays is slow
+        self._lat_rad = np.radians(lat).tolist()
+        self._lon_rad = np.radians(lon).tolist()
+        self._cos_lat = np.cos(np.radians(lat)).tolist()
+
+    @property
+    def node_count(self) -> int:
+        return len(self.lat)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.indices)
+
+    def nearest(self, lat: float, lon: float) -> Tuple[int, float]:
+        """Index of the node closest to (lat, lon) and its distance in metres."""
+        if self.node_count == 0:
+            raise NoRouteError("The routing graph is empty")
+        dx = (self.lon - lon) * math.cos(math.radians(lat))
+        dy = self.lat - lat
+        node = int(np.argmin(dx * dx + dy * dy))
+        return node, self._distance(node, math.radians(lat), math.radians(lon), math.cos(math.radians(lat)))
+
+    def _distance(self, node: int, lat_rad: float, lon_rad: float, cos_lat: float) -> float:
+        """Haversine distance from a node to a point, the A* heuristic."""
+        dlat = self._lat_rad[node] - lat_rad
+        dlon = self._lon_rad[node] - lon_rad
+        a = math.sin(dlat / 2) ** 2 + self._cos_lat[node] * cos_lat * math.sin(dlon / 2) ** 2
+        return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+    def _neighbours(self, node: int):
+        start, stop = self.indptr[node], self.indptr[node + 1]
+        return zip(self.indices[start:stop].tolist(), self.weights[start:stop].tolist())
+
+    def shortest_path(self, source: int, target: int) -> Tuple[List[int], float]:
+        """
+        Bidirectional A* between two nodes.
+
+        Returns:
+            The node indices of the path and its length in metres.
+
+        Raises:
+            NoRouteError: If target cannot be reached from source.
+        """
+        if source == target:
+            return [source], 0.0
+
+        s_args = (self._lat_rad[source], self._lon_rad[source], self._cos_lat[source])
+        t_args = (self._lat_rad[target], self._lon_rad[target], self._cos_lat[target])
+        potentials = {}
+
+        def potential(node):
+            # p(v) = (h_t(v) - h_s(v)) / 2, forward search uses +p, backward -p
+            value = potentials.get(node)
+            if value is None:
+                value = (self._distance(node, *t_args) - self._distance(node, *s_args)) / 2
+                potentials[node] = value
+            return value
+
+        dist = ({source: 0.0}, {target: 0.0})
+        parent = ({source: -1}, {target: -1})
+        settled = (set(), set())
+        heaps = ([(potential(source), source)], [(-potential(target), target)])
+        sign = (1.0, -1.0)
+        best = math.inf
+        meeting = -1
+
+        while heaps[0] and heaps[1]:
+            # Keys are the reduced distances, so this is the usual bidirectional stop rule
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            _, node = heapq.heappop(heaps[side])
+            if node in settled[side]:
+                continue
+            settled[side].add(node)
+            g_node = dist[side][node]
+            this_dist, other_dist = dist[side], dist[1 - side]
+            for neighbour, weight in self._neighbours(node):
+                g = g_node + weight
+                if g < this_dist.get(neighbour, math.inf):
+                    this_dist[neighbour] = g
+                    parent[side][neighbour] = node
+                    heapq.heappush(heaps[side], (g + sign[side] * potential(neighbour), neighbour))
+                    other = other_dist.get(neighbour)
+                    if other is not None and g + other < best:
+                        best = g + other
+                        meeting = neighbour
+
+        if meeting < 0:
+            raise NoRouteError("No walkable route between these points")
+
+        path = []
+        node = meeting
+        while node != -1:
+            path.append(node)
+            node = parent[0][node]
+        path.reverse()
+        node = parent[1][meeting]
+        while node != -1:
+            path.append(node)
+            node = parent[1][node]
+        return path, best
+
+    def coordinates(self, path: List[int]) -> np.ndarray:
+        return np.column_stack([self.lat[path], self.lon[path]])
+
+
+def parse_osm(stream: IO, chunk_size: int = READ_CHUNK_BYTES) -> _OsmHandler:
+    """Stream an OSM XML document, keeping nodes and walkable ways."""
+    handler = _OsmHandler()
+    parser = expat.ParserCreate()
+    parser.StartElementHandler = handler.start
+    parser.EndElementHandler = handler.end
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        parser.Parse(chunk, False)
+    parser.Parse(b"", True)
+    return handler
+
+
+def build_graph(handler: _OsmHandler) -> FootGraph:
+    """Turn parsed ways into a CSR graph over the nodes they use."""
+    node_ids = np.frombuffer(handler.node_ids, dtype=np.int64)
+    order = np.argsort(node_ids, kind="stable")
+    sorted_ids = node_ids[order]
+    node_lat = np.frombuffer(handler.node_lat, dtype=np.float64)[order]
+    node_lon = np.frombuffer(handler.node_lon, dtype=np.float64)[order]
+
+    refs = np.frombuffer(handler.way_refs, dtype=np.int64)
+    starts = np.frombuffer(handler.way_starts, dtype=np.int64)
+    # Consecutive refs form an edge unless the second one starts a new way
+    same_way = np.ones(max(len(refs) - 1, 0), dtype=bool)
+    same_way[starts[1:] - 1] = False
+    u_ids, v_ids = refs[:-1][same_way], refs[1:][same_way]
+
+    # Drop edges whose nodes are missing from the extract
+    u_pos = np.minimum(np.searchsorted(sorted_ids, u_ids), max(len(sorted_ids) - 1, 0))
+    v_pos = np.minimum(np.searchsorted(sorted_ids, v_ids), max(len(sorted_ids) - 1, 0))
+    known = (sorted_ids[u_pos] == u_ids) & (sorted_ids[v_pos] == v_ids) & (u_ids != v_ids) if len(sorted_ids) else \
+        np.zeros(len(u_ids), dtype=bool)
+    u_pos, v_pos = u_pos[known], v_pos[known]
+
+    used, compact = np.unique(np.concatenate([u_pos, v_pos]), return_inverse=True)
+    u, v = compact[:len(u_pos)], compact[len(u_pos):]
+    lat, lon = node_lat[used], node_lon[used]
+    coords = np.column_stack([lat, lon])
+
+    lengths = segment_lengths_between(coords, u, v)
+    src = np.concatenate([u, v])
+    dst = np.concatenate([v, u])
+    weights = np.concatenate([lengths, lengths])
+    by_src = np.argsort(src, kind="stable")
+    indptr = np.zeros(len(used) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=len(used)), out=indptr[1:])
+    return FootGraph(lat, lon, indptr, dst[by_src].astype(np.int32), weights[by_src].astype(np.float32))
+
+
+def segment_lengths_between(coords: np.ndarray, u: np.ndarray, v: np.ndarray) -> np.ndarray:
+    """Haversine length of the edges (u[i], v[i])."""
+    if len(u) == 0:
+        return np.empty(0, dtype=np.float64)
+    pairs = np.empty((2 * len(u), 2), dtype=np.float64)
+    pairs[0::2] = coords[u]
+    pairs[1::2] = coords[v]
+    return segment_lengths(pairs)[0::2]
+
+
+def source_fingerprint(path: Path) -> str:
+    stat = path.stat()
+    key = f"{GRAPH_FORMAT_VERSION}:{path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
+
+
+def save_graph(graph: FootGraph, directory: Path, fingerprint: str) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in _ARRAYS:
+        np.save(directory / f"{name}.npy", getattr(graph, name))
+    # Written last, a partial cache is never considered valid
+    (directory / "meta.json").write_text(json.dumps({"fingerprint": fingerprint}))
+
+
+def load_cached_graph(directory: Path, fingerprint: str) -> Optional[FootGraph]:
+    meta = directory / "meta.json"
+    try:
+        if json.loads(meta.read_text()).get("fingerprint") != fingerprint:
+            return None
+        arrays = {name: np.load(directory / f"{name}.npy", mmap_mode="r") for name in _ARRAYS}
+    except (OSError, ValueError):
+        return None
+    return FootGraph(**arrays)
+
+
+def load_graph(osm_path: Union[str, Path], cache_dir: Union[str, Path]) -> FootGraph:
+    """Load the graph for an OSM extract, from the on-disk cache when it is current."""
+    osm_path, cache_dir = Path(osm_path), Path(cache_dir)
+    fingerprint = source_fingerprint(osm_path)
+    graph = load_cached_graph(cache_dir, fingerprint)
+    if graph is None:
+        with open(osm_path, "rb") as stream:
+            graph = build_graph(parse_osm(stream))
+        save_graph(graph, cache_dir, fingerprint)
+    return graph
+
+
+class RoutingGraph:
+    """
+    Lazily loaded graph for one extract, shared by all requests.
+
+    Args:
+        osm_path: The .osm XML extract.
+        cache_dir: Folder for the preprocessed arrays.
+    """
+
+    def __init__(self, osm_path: Union[str, Path], cache_dir: Union[str, Path]):
+        self.osm_path = Path(osm_path)
+        self.cache_dir = Path(cache_dir)
+        self._graph: Optional[FootGraph] = None
+        self._lock = threading.Lock()
+        self.load_seconds: Optional[float] = None
+
+    @property
+    def available(self) -> bool:
+        return self._graph is not None or self.osm_path.is_file()
+
+    def get(self) -> FootGraph:
+        """The graph, parsed or read from the cache on first use."""
+        with self._lock:
+            if self._graph is None:
+                started = time.perf_counter()
+                self._graph = load_graph(self.osm_path, self.cache_dir)
+                self.load_seconds = time.perf_counter() - started
+            return self._graph
+
+    def route(self, start: Tuple[float, float], end: Tuple[float, float],
+              max_snap_m: float = math.inf) -> Tuple[np.ndarray, float]:
+        """
+        Walking route between two [lat, lon] points.
+
+        Returns:
+            The (n, 2) path coordinates, from the node nearest to start to the
+            node nearest to end, and the path length in metres.
+
+        Raises:
+            NoRouteError: If an end is further than max_snap_m from the graph
+                or the two ends are not connected.
+        """
+        graph = self.get()
+        source, source_gap = graph.nearest(*start)
+        target, target_gap = graph.nearest(*end)
+        if max(source_gap, target_gap) > max_snap_m:
+            raise NoRouteError(f"No walkable way within {max_snap_m:g} m of the requested points")
+        path, distance = graph.shortest_path(source, target)
+        return graph.coordinates(path), distance
+
+    def stats(self) -> dict:
+        graph = self._graph
+        return {
+            "osm_path": str(self.osm_path),
+            "available": self.available,
+            "loaded": graph is not None,
+            "load_seconds": self.load_seconds,
+            "nodes": graph.node_count if graph is not None else None,
+            "edges": graph.edge_count if graph is not None else None,
+        }
@@ -1,39 +1,159 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, File, UploadFile
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, status, File, UploadFile, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, EmailStr
-import sqlite3
+from pydantic import BaseModel, EmailStr, Field, ValidationError, field_validator
 import os
 import json
+import asyncio
 import logging
+import time
 from pathlib import Path
-from typing import List, Optional
-from passlib.context import CryptContext
+from typing import Any, Dict, List, Optional
 import jwt
 import uuid
 from datetime import datetime, timedelta
 import uvicorn
+import numpy as np
+from gpx_writer import iter_gpx, iter_gpx_bytes, gpx_filename
+from timeline import synthesize_timeline
+from gpx_reader import parse_gpx_stream
+from gpx_import import (
+    MAX_IMPORT_FILES, MAX_IMPORT_TOTAL_BYTES, ImportLimitError, batched, expand_uploads, parse_import_batch
+)
+from db import ConnectionPool
+from executors import run_db, run_cpu, shutdown_executors
+import passwords
+from auth_cache import PrincipalCache
+from coord_codec import decode_stored, encode_for_storage, load_coordinates, pack_coordinates
+from fts import RANK_EXPRESSION, match_query
+from pagination import InvalidCursorError, encode_cursor, decode_cursor, parse_fields
+from simplify import LOD_TOLERANCES_M, build_lods
+from thumbnails import render_thumbnail
+from route_metrics import compute_metrics, metrics_digest, metrics_payload, metrics_to_row
+from geo import as_coord_array, normalize_distance_unit, split_length_for_unit
+from dem import DemTiles
+from geo_cache import GeoCache
+from spatial import chunk_bounds, radius_box, segments_in_box, segments_near
+from similarity import band_buckets, estimate_jaccard, frechet_distance, signature
+from routing import NoRouteError, RoutingGraph
+from geocoder import Geocoder, GeocoderError, RateLimitedError
+from jobs import JobContext, JobFailed, JobQueue, JobResult, QueueFullError
+from profiling import SORT_KEYS, Profiler, ProfilingMiddleware
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE, POINT_BUCKETS, Family, Registry, RequestMetrics,
+    RequestMetricsMiddleware,
+)
+from zip_stream import iter_zip, unique_name
+from etags import etag_matches, make_etag
+from wire_formats import (
+    FLOAT32_MEDIA_TYPE, JSON_MEDIA_TYPE, POLYLINE_MEDIA_TYPE, CoordinateFormatError,
+    decode_float32, decode_polyline, encode_float32, encode_polyline, negotiate, validate_coordinates,
+)
 
 # Get the directory where this script is located
 ROOT_DIR = Path(__file__).parent
 
 # SQLite database path
-DB_PATH = ROOT_DIR / 'fakerun.db'
+DB_PATH = Path(os.getenv("FAKERUN_DB_PATH", ROOT_DIR / 'fakerun.db'))
+
+# SQLite connection pool settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+DB_MMAP_SIZE = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_CACHE_SIZE = int(os.getenv("DB_CACHE_SIZE", "-16000"))  # negative values are KiB
 
 # Add these constants after the existing imports
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Authenticated principal cache (see auth_cache.py)
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "1024"))
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "60"))
+
+# Local SRTM .hgt tiles for elevation lookups (see dem.py)
+DEM_DIR = Path(os.getenv("DEM_DIR", ROOT_DIR / 'dem'))
+DEM_MAX_OPEN_TILES = int(os.getenv("DEM_MAX_OPEN_TILES", "16"))
+MAX_ELEVATION_POINTS = int(os.getenv("MAX_ELEVATION_POINTS", "200000"))
+
+# Persistent per-location result cache (see geo_cache.py)
+GEO_CACHE_MAX_ENTRIES = int(os.getenv("GEO_CACHE_MAX_ENTRIES", "500000"))
+GEO_CACHE_CELL_DEGREES = float(os.getenv("GEO_CACHE_CELL_DEGREES", "1e-4"))
+GEO_CACHE_TOUCH_INTERVAL = float(os.getenv("GEO_CACHE_TOUCH_INTERVAL", "3600"))
+
+# Offline foot routing on a local OSM XML extract (see routing.py)
+ROUTING_OSM_PATH = Path(os.getenv("ROUTING_OSM_PATH", ROOT_DIR / 'osm' / 'extract.osm'))
+ROUTING_CACHE_DIR = Path(os.getenv("ROUTING_CACHE_DIR", ROOT_DIR / 'osm' / 'graph'))
+ROUTING_MAX_SNAP_M = float(os.getenv("ROUTING_MAX_SNAP_M", "1000"))
+
+# Near-duplicate detection (see similarity.py)
+SIMILAR_MIN_JACCARD = float(os.getenv("SIMILAR_MIN_JACCARD", "0.5"))
+SIMILAR_MAX_CANDIDATES = int(os.getenv("SIMILAR_MAX_CANDIDATES", "20"))
+DUPLICATE_FRECHET_M = float(os.getenv("DUPLICATE_FRECHET_M", "50"))
+
+# Background jobs (see jobs.py)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "2"))
+JOB_MAX_PENDING_PER_USER = int(os.getenv("JOB_MAX_PENDING_PER_USER", "20"))
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", str(24 * 3600)))
+JOB_RESULTS_DIR = Path(os.getenv("JOB_RESULTS_DIR", DB_PATH.parent / 'job_results'))
+
+# Request profiling (see profiling.py), off unless a token or a sample rate is set
+PROFILE_ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_SAMPLE_PATHS = [path for path in os.getenv("PROFILE_SAMPLE_PATHS", "/api/").split(",") if path]
+PROFILE_MIN_DURATION_MS = float(os.getenv("PROFILE_MIN_DURATION_MS", "0"))
+PROFILE_MAX_STORED = int(os.getenv("PROFILE_MAX_STORED", "500"))
+
+# Nominatim proxy (see geocoder.py), the public instance allows 1 request/s
+GEOCODE_UPSTREAM_URL = os.getenv("GEOCODE_UPSTREAM_URL", "https://nominatim.openstreetmap.org")
+GEOCODE_CACHE_TTL = float(os.getenv("GEOCODE_CACHE_TTL", str(7 * 24 * 3600)))
+GEOCODE_RATE = float(os.getenv("GEOCODE_RATE", "1"))
+GEOCODE_BURST = float(os.getenv("GEOCODE_BURST", "1"))
+GEOCODE_MAX_WAIT = float(os.getenv("GEOCODE_MAX_WAIT", "10"))
+GEOCODE_USER_AGENT = os.getenv("GEOCODE_USER_AGENT", "fakerun-backend/1.0")
+
+# Password hashing (see passwords.py, runs in the CPU process pool)
+pwd_context = passwords.pwd_context
 security = HTTPBearer()
+principal_cache = PrincipalCache(maxsize=AUTH_CACHE_SIZE, ttl=AUTH_CACHE_TTL)
+
+dem_tiles = DemTiles(DEM_DIR, max_open=DEM_MAX_OPEN_TILES)
+
+routing_graph = RoutingGraph(ROUTING_OSM_PATH, ROUTING_CACHE_DIR)
+
+db_pool = ConnectionPool(DB_PATH, size=DB_POOL_SIZE, mmap_size=DB_MMAP_SIZE, cache_size=DB_CACHE_SIZE)
 
 def get_db_connection():
-    """Get database connection"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # This enables column access by name
-    return conn
+    """Check out a pooled database connection, use as `with get_db_connection() as conn:`"""
+    return db_pool.connection()
+
+geo_cache = GeoCache(get_db_connection, max_entries=GEO_CACHE_MAX_ENTRIES, cell=GEO_CACHE_CELL_DEGREES,
+                     touch_interval=GEO_CACHE_TOUCH_INTERVAL)
+
+job_queue = JobQueue(get_db_connection, workers=JOB_WORKERS, max_attempts=JOB_MAX_ATTEMPTS,
+                     retry_backoff=JOB_RETRY_BACKOFF, max_pending_per_user=JOB_MAX_PENDING_PER_USER,
+                     retention=JOB_RETENTION, results_dir=JOB_RESULTS_DIR)
+
+geocoder = Geocoder(GEOCODE_UPSTREAM_URL, geo_cache, ttl=GEOCODE_CACHE_TTL, rate=GEOCODE_RATE,
+                    burst=GEOCODE_BURST, max_wait=GEOCODE_MAX_WAIT, user_agent=GEOCODE_USER_AGENT)
+
+profiler = Profiler(get_db_connection, admin_token=PROFILE_ADMIN_TOKEN, sample_rate=PROFILE_SAMPLE_RATE,
+                    sample_paths=PROFILE_SAMPLE_PATHS, exclude_paths=["/api/profiles"],
+                    min_duration_ms=PROFILE_MIN_DURATION_MS, max_stored=PROFILE_MAX_STORED)
+
+# Prometheus metrics (see metrics.py), served by GET /metrics
+metrics_registry = Registry()
+request_metrics = RequestMetrics(metrics_registry)
+coordinate_points = metrics_registry.histogram(
+    "fakerun_coordinates_points", "Points per coordinates payload read from requests (in) or written to responses (out)",
+    ("direction",), POINT_BUCKETS)
+gpx_seconds_per_point = metrics_registry.histogram(
+    "fakerun_gpx_generation_seconds_per_point", "GPX generation time divided by the number of track points",
+    buckets=(1e-7, 2.5e-7, 5e-7, 1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 1e-4, 1e-3))
 
 # Create the main app
 app = FastAPI()
@@ -56,8 +176,6 @@ class StatusCheck(BaseModel):
     message: str
 
 from typing import Optional
-import gpxpy
-import gpxpy.gpx
 
 class RunDetails(BaseModel):
     distance: float
@@ -79,6 +197,13 @@ class RunDetails(BaseModel):
     km_heart_rates: Optional[List[int]] = []
     km_elevation_changes: Optional[List[float]] = []
 
+    @field_validator("distance_unit")
+    @classmethod
+    def check_distance_unit(cls, value: Optional[str]) -> Optional[str]:
+        # Kept as sent (the frontend reads it back), splits use the normalized unit
+        normalize_distance_unit(value)
+        return value
+
 class UserCreate(BaseModel):
     email: EmailStr
     username: str
@@ -104,6 +229,15 @@ class RouteData(BaseModel):
     coordinates: List[List[float]]
     runDetails: RunDetails
 
+class ElevationRequest(BaseModel):
+    # [lat, lon] pairs or an encoded polyline, validated with NumPy in the endpoint
+    locations: Any
+
+class JobRequest(BaseModel):
+    kind: str
+    params: Dict[str, Any] = {}
+    priority: int = Field(0, ge=-10, le=10)
+
 class SavedRoute(BaseModel):
     id: str
     name: str
@@ -112,12 +246,51 @@ class SavedRoute(BaseModel):
     created_at: datetime
     user_id: str
 
-# Authentication helper functions
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+def parse_coordinates(value):
+    """Decode a JSON coordinates value: a list of [lat, lon] pairs or an encoded polyline string"""
+    if isinstance(value, str):
+        return decode_polyline(value)
+    if not isinstance(value, list):
+        raise CoordinateFormatError("Coordinates must be a list of [lat, lon] pairs or an encoded polyline")
+    return value
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def read_route_data(request: Request) -> RouteData:
+    """
+    Parse a RouteData body in any of the supported wire formats (see wire_formats.py).
+
+    - application/json: `coordinates` is either the usual list of [lat, lon]
+      pairs or a Google encoded polyline string
+    - application/vnd.fakerun.coords+f32: the body is raw little-endian float32
+      lat, lon pairs and the run details are JSON in the X-Run-Details header
+
+    Coordinates are validated as one NumPy array instead of per element by Pydantic.
+    """
+    content_type = request.headers.get("content-type", JSON_MEDIA_TYPE).split(";")[0].strip().lower()
+    body = await request.body()
+    try:
+        if content_type == FLOAT32_MEDIA_TYPE:
+            coordinates = decode_float32(body)
+            run_details = json.loads(request.headers.get("x-run-details") or "null")
+        else:
+            payload = json.loads(body)
+            if not isinstance(payload, dict):
+                raise CoordinateFormatError("Request body must be a JSON object")
+            coordinates = parse_coordinates(payload.get("coordinates"))
+            run_details = payload.get("runDetails")
+        coordinates = validate_coordinates(coordinates)
+        coordinate_points.labels("in").observe(len(coordinates))
+        if not isinstance(run_details, dict):
+            raise CoordinateFormatError("runDetails must be a JSON object")
+        return RouteData.model_construct(coordinates=coordinates.tolist(), runDetails=RunDetails(**run_details))
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=jsonable_encoder(e.errors(include_url=False)))
+    except ValueError as e:
+        # Also covers json.JSONDecodeError and CoordinateFormatError
+        raise HTTPException(status_code=422, detail=str(e))
+
+# Authentication helper functions
+verify_password = passwords.verify_password
+get_password_hash = passwords.get_password_hash
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -130,20 +303,49 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 def get_user_by_email(email: str):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
-    user = cursor.fetchone()
-    conn.close()
-    return user
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM users WHERE email = ?", (email,))
+        return cursor.fetchone()
 
 def get_user_by_id(user_id: str):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-    user = cursor.fetchone()
-    conn.close()
-    return user
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
+        return cursor.fetchone()
+
+def get_user_by_username(username: str):
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
+        return cursor.fetchone()
+
+def insert_user(user_id: str, email: str, username: str, hashed_password: str, created_at: str):
+    with get_db_connection() as conn:
+        conn.execute(
+            "INSERT INTO users (id, email, username, hashed_password, created_at, is_active) VALUES (?, ?, ?, ?, ?, ?)",
+            (user_id, email, username, hashed_password, created_at, True)
+        )
+        conn.commit()
+
+def set_user_active(user_id: str, is_active: bool) -> bool:
+    """Activate or deactivate a user and drop any cached principal for them"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("UPDATE users SET is_active = ? WHERE id = ?", (is_active, user_id))
+        conn.commit()
+        updated = cursor.rowcount > 0
+    principal_cache.invalidate(user_id)
+    return updated
+
+def row_to_user(row) -> User:
+    return User(
+        id=row['id'],
+        email=row['email'],
+        username=row['username'],
+        created_at=datetime.fromisoformat(row['created_at']),
+        is_active=bool(row['is_active'])
+    )
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     credentials_exception = HTTPException(
@@ -159,27 +361,26 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     except jwt.PyJWTError:
         raise credentials_exception
     
-    user = get_user_by_id(user_id)
+    user = principal_cache.get(user_id)
     if user is None:
-        raise credentials_exception
+        row = await run_db(get_user_by_id, user_id)
+        if row is None:
+            raise credentials_exception
+        user = row_to_user(row)
+        principal_cache.put(user_id, user)
     
-    return User(
-        id=user['id'],
-        email=user['email'],
-        username=user['username'],
-        created_at=datetime.fromisoformat(user['created_at']),
-        is_active=bool(user['is_active'])
-    )
+    if not user.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    
+    return user
 
 # Basic endpoints
 @api_router.get("/")
 async def root():
     return {"message": "FakeRun API is running!"}
 
-@api_router.get("/status")
-async def get_status():
-    try:
-        conn = get_db_connection()
+def fetch_status_checks():
+    with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM status_checks ORDER BY timestamp DESC LIMIT 10")
         status_checks = []
@@ -190,76 +391,90 @@ async def get_status():
                 "status": row["status"],
                 "message": row["message"]
             })
-        conn.close()
-        return status_checks
+    return status_checks
+
+@api_router.get("/status")
+async def get_status():
+    try:
+        return await run_db(fetch_status_checks)
     except Exception as e:
         logger.error(f"Error fetching status checks: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching status checks: {str(e)}")
 
-# GPX parsing function
-def parse_gpx_file(gpx_file_content: str) -> dict:
-    """
-    Parses GPX file content and extracts latitude and longitude from each track point,
-    as well as basic metadata (route name).
+@api_router.get("/status/db")
+async def get_db_pool_status():
+    """Connection pool usage and checkout latency"""
+    return db_pool.stats()
 
-    Args:
-        gpx_file_content: GPX file content as a string.
+@api_router.get("/status/auth-cache")
+async def get_auth_cache_status():
+    """Principal cache size and hit/miss counters"""
+    return principal_cache.stats()
 
-    Returns:
-        A dictionary containing "coordinates" (list of [lat, lon] pairs)
-        and "name" (string, optional route name).
-        Returns {"coordinates": [], "name": None} if parsing fails or no points are found.
-    """
-    coordinates = []
-    route_name = None
-    try:
-        gpx = gpxpy.parse(gpx_file_content)
+@api_router.get("/status/geo-cache")
+async def get_geo_cache_status():
+    """Persistent elevation/geocoding cache size and hit/miss counters"""
+    return geo_cache.stats()
 
-        # Try to get route name from metadata
-        if gpx.metadata and gpx.metadata.name:
-            route_name = gpx.metadata.name
-        elif gpx.tracks:
-            # If not in metadata, try the first track's name
-            for track in gpx.tracks:
-                if track.name:
-                    route_name = track.name
-                    break
+@api_router.get("/status/dem")
+async def get_dem_status():
+    """Elevation tile directory and open-tile LRU counters"""
+    return dem_tiles.stats()
 
-        for track in gpx.tracks:
-            for segment in track.segments:
-                for point in segment.points:
-                    coordinates.append([point.latitude, point.longitude])
-    except Exception as e:
-        logger.error(f"Error parsing GPX file: {e}") # Use logger for errors
-        return {"coordinates": [], "name": None}
+@api_router.get("/status/routing")
+async def get_routing_status():
+    """Routing extract and graph size, once loaded"""
+    return routing_graph.stats()
+
+@api_router.get("/status/jobs")
+async def get_jobs_status():
+    """Job worker counters and jobs per status"""
+    stats = job_queue.stats()
+    stats["jobs"] = await run_db(job_queue.counts)
+    return stats
+
+@api_router.get("/status/profiler")
+async def get_profiler_status():
+    """Request profiling settings and counters"""
+    return profiler.stats()
 
-    return {"coordinates": coordinates, "name": route_name}
+@api_router.get("/status/geocoder")
+async def get_geocoder_status():
+    """Upstream call, coalescing and rate-limit counters of the geocoding proxy"""
+    return geocoder.stats()
 
 # GPX generation endpoint
+def observe_gpx_generation(points: int, seconds: float) -> None:
+    if points:
+        gpx_seconds_per_point.observe(seconds / points)
+
 def generate_gpx_content(route_coordinates: List[List[float]], run_details: RunDetails) -> str:
-    gpx_content = f'''<?xml version="1.0" encoding="UTF-8"?>
-<gpx version="1.1" creator="FakeRun" xmlns="http://www.topografix.com/GPX/1/1">
-  <metadata>
-    <name>{run_details.route_name}</name>
-    <desc>Generated route with distance: {run_details.distance}km, duration: {run_details.duration}min</desc>
-  </metadata>
-  <trk>
-    <name>{run_details.route_name}</name>
-    <trkseg>
-'''
-    
-    for coord in route_coordinates:
-        lat, lng = coord[0], coord[1]
-        gpx_content += f'      <trkpt lat="{lat}" lon="{lng}"></trkpt>\n'
-    
-    gpx_content += '''    </trkseg>
-  </trk>
-</gpx>'''
-    
-    return gpx_content
+    """Build the whole GPX document in memory (see gpx_writer.iter_gpx for streaming)"""
+    start = time.perf_counter()
+    timeline = synthesize_timeline(route_coordinates, run_details)
+    content = "".join(iter_gpx(route_coordinates, run_details, timeline))
+    observe_gpx_generation(len(route_coordinates), time.perf_counter() - start)
+    return content
+
+def timed_gpx_bytes(route_coordinates, run_details: RunDetails, timeline, elapsed: float = 0.0):
+    """
+    iter_gpx_bytes, observing the generation time once the document is done.
+
+    Only the time spent producing chunks counts, not the time the consumer
+    takes between them; `elapsed` is time already spent, e.g. on the timeline.
+    """
+    chunks = iter_gpx_bytes(route_coordinates, run_details, timeline)
+    while True:
+        start = time.perf_counter()
+        chunk = next(chunks, None)
+        elapsed += time.perf_counter() - start
+        if chunk is None:
+            break
+        yield chunk
+    observe_gpx_generation(len(route_coordinates), elapsed)
 
 @api_router.post("/generate-gpx")
-async def generate_gpx_endpoint(route_data: RouteData):
+async def generate_gpx_endpoint(route_data: RouteData = Depends(read_route_data)):
     try:
         gpx_content = generate_gpx_content(route_data.coordinates, route_data.runDetails)
         return {"gpx_content": gpx_content}
@@ -267,13 +482,143 @@ async def generate_gpx_endpoint(route_data: RouteData):
         logger.error(f"Error generating GPX: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error generating GPX: {str(e)}")
 
+@api_router.post("/generate-gpx/download")
+async def download_gpx_endpoint(route_data: RouteData = Depends(read_route_data)):
+    """Stream the generated GPX document as an application/gpx+xml attachment"""
+    try:
+        start = time.perf_counter()
+        timeline = synthesize_timeline(route_data.coordinates, route_data.runDetails)
+    except Exception as e:
+        logger.error(f"Error generating GPX: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error generating GPX: {str(e)}")
+
+    filename = gpx_filename(route_data.runDetails.route_name)
+    return StreamingResponse(
+        timed_gpx_bytes(route_data.coordinates, route_data.runDetails, timeline, time.perf_counter() - start),
+        media_type="application/gpx+xml",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+def lookup_elevation_cached(locations: np.ndarray) -> np.ndarray:
+    """
+    Elevation per location through the geo cache; cache misses are sampled
+    from the DEM at the centre of their grid cell.
+    """
+    cells, inverse = np.unique(geo_cache.quantize(locations), axis=0, return_inverse=True)
+    keys = [tuple(cell) for cell in cells.tolist()]
+    found = geo_cache.get_many("elevation", keys)
+    
+    missing = [key for key in keys if key not in found]
+    if missing:
+        sampled = dem_tiles.lookup(geo_cache.centres(missing))
+        # Points without tile coverage are not cached, tiles may be added later
+        fresh = {key: value for key, value in zip(missing, sampled.tolist()) if not np.isnan(value)}
+        geo_cache.set_many("elevation", fresh)
+        found.update(fresh)
+    
+    per_cell = np.array([found.get(key, np.nan) for key in keys], dtype=np.float64)
+    return per_cell[inverse.reshape(-1)]
+
+@api_router.post("/elevation")
+async def lookup_elevation(elevation_request: ElevationRequest):
+    """
+    Elevation in metres for a batch of locations, from the local DEM tiles.
+
+    `locations` is a list of [lat, lon] pairs or an encoded polyline; points
+    without tile coverage come back as null. Results are cached per 1e-4°
+    grid cell (see geo_cache.py).
+    """
+    try:
+        locations = validate_coordinates(parse_coordinates(elevation_request.locations))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if len(locations) > MAX_ELEVATION_POINTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_ELEVATION_POINTS} locations per request")
+    
+    try:
+        elevations = await run_db(lookup_elevation_cached, locations[:, :2])
+    except Exception as e:
+        logger.error(f"Error looking up elevation: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error looking up elevation: {str(e)}")
+    
+    missing = np.isnan(elevations)
+    return {
+        "elevations": np.where(missing, None, np.round(elevations, 1)).tolist(),
+        "missing": int(missing.sum()),
+    }
+
+def parse_lat_lon(value: str, name: str) -> List[float]:
+    """Parse a "lat,lon" query parameter"""
+    try:
+        lat, lon = (float(part) for part in value.split(","))
+        validate_coordinates([[lat, lon]])
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"{name} must be 'lat,lon'")
+    return [lat, lon]
+
+@api_router.get("/route")
+async def get_foot_route(
+    request: Request,
+    start: str = Query(..., alias="from"),
+    end: str = Query(..., alias="to"),
+):
+    """
+    Walking route between two points on the local OSM extract.
+
+    `from` and `to` are "lat,lon"; coordinates are [lat, lon] pairs, or an
+    encoded polyline when requested via Accept.
+    """
+    origin = parse_lat_lon(start, "from")
+    destination = parse_lat_lon(end, "to")
+    if not routing_graph.available:
+        raise HTTPException(status_code=503, detail="Routing is not configured on this server")
+
+    try:
+        # Graph loading and A* use no connection, keep them off the DB threads
+        path, distance = await run_in_threadpool(routing_graph.route, origin, destination, ROUTING_MAX_SNAP_M)
+    except NoRouteError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error finding route: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error finding route: {str(e)}")
+
+    media_type = negotiate(request.headers.get("accept"), allow_binary=False)
+    coordinates = encode_polyline(path) if media_type == POLYLINE_MEDIA_TYPE else path.tolist()
+    return JSONResponse({"coordinates": coordinates, "distance": round(distance, 1)}, media_type=media_type)
+
+async def call_geocoder(lookup):
+    """Await a geocoder lookup, mapping upstream failures to HTTP errors"""
+    try:
+        return await lookup
+    except RateLimitedError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except GeocoderError as e:
+        logger.error(f"Error geocoding: {str(e)}")
+        raise HTTPException(status_code=502, detail=str(e))
+
+@api_router.get("/geocode")
+async def geocode(q: str = Query(..., min_length=1, max_length=500), limit: int = Query(5, ge=1, le=50)):
+    """Nominatim search results for a free-text query, cached and rate limited"""
+    if not q.strip():
+        raise HTTPException(status_code=422, detail="q must not be blank")
+    return await call_geocoder(geocoder.search(q, limit))
+
+@api_router.get("/reverse-geocode")
+async def reverse_geocode(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    zoom: int = Query(14, ge=0, le=18),
+):
+    """Nominatim reverse lookup (with address details) for a point, cached per grid cell"""
+    return await call_geocoder(geocoder.reverse(lat, lon, zoom))
+
 # Authentication endpoints
 @api_router.post("/auth/register", response_model=Token)
 async def register_user(user_data: UserCreate):
     """Register a new user"""
     try:
         # Check if user already exists
-        existing_user = get_user_by_email(user_data.email)
+        existing_user = await run_db(get_user_by_email, user_data.email)
         if existing_user:
             raise HTTPException(
                 status_code=400,
@@ -281,11 +626,7 @@ async def register_user(user_data: UserCreate):
             )
         
         # Check if username already exists
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id FROM users WHERE username = ?", (user_data.username,))
-        if cursor.fetchone():
-            conn.close()
+        if await run_db(get_user_by_username, user_data.username):
             raise HTTPException(
                 status_code=400,
                 detail="Username already taken"
@@ -293,16 +634,10 @@ async def register_user(user_data: UserCreate):
         
         # Create new user
         user_id = str(uuid.uuid4())
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await run_cpu(get_password_hash, user_data.password)
         created_at = datetime.utcnow().isoformat()
         
-        cursor.execute(
-            "INSERT INTO users (id, email, username, hashed_password, created_at, is_active) VALUES (?, ?, ?, ?, ?, ?)",
-            (user_id, user_data.email, user_data.username, hashed_password, created_at, True)
-        )
-        
-        conn.commit()
-        conn.close()
+        await run_db(insert_user, user_id, user_data.email, user_data.username, hashed_password, created_at)
         
         # Create access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -335,13 +670,9 @@ async def login_user(user_data: UserLogin):
     """Login user"""
     try:
         # Get user from database
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE email = ?", (user_data.email,))
-        user_record = cursor.fetchone()
-        conn.close()
+        user_record = await run_db(get_user_by_email, user_data.email)
         
-        if not user_record or not verify_password(user_data.password, user_record['hashed_password']):
+        if not user_record or not await run_cpu(verify_password, user_data.password, user_record['hashed_password']):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password",
@@ -354,13 +685,7 @@ async def login_user(user_data: UserLogin):
             data={"sub": user_record['id']}, expires_delta=access_token_expires
         )
         
-        user = User(
-            id=user_record['id'],
-            email=user_record['email'],
-            username=user_record['username'],
-            created_at=datetime.fromisoformat(user_record['created_at']),
-            is_active=bool(user_record['is_active'])
-        )
+        user = row_to_user(user_record)
         
         return Token(
             access_token=access_token,
@@ -379,6 +704,16 @@ async def get_current_user_info(current_user: User = Depends(get_current_user)):
     """Get current user information"""
     return current_user
 
+@api_router.post("/auth/deactivate")
+async def deactivate_current_user(current_user: User = Depends(get_current_user)):
+    """Deactivate the current user's account"""
+    try:
+        await run_db(set_user_active, current_user.id, False)
+        return {"message": "Account deactivated"}
+    except Exception as e:
+        logger.error(f"Error deactivating user: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error deactivating user: {str(e)}")
+
 @api_router.post("/upload-gpx")
 async def upload_gpx_file(file: UploadFile = File(...), current_user: User = Depends(get_current_user)):
     """
@@ -388,15 +723,11 @@ async def upload_gpx_file(file: UploadFile = File(...), current_user: User = Dep
         raise HTTPException(status_code=400, detail="Invalid file type. Only GPX files are allowed.")
 
     try:
-        contents = await file.read()
-        gpx_content_str = contents.decode("utf-8")
-    except Exception as e:
-        logger.error(f"Error reading or decoding GPX file: {e}")
-        raise HTTPException(status_code=400, detail=f"Error reading or decoding GPX file: {e}")
+        # Parse the spooled upload incrementally in a worker thread
+        parsed_data = await run_in_threadpool(parse_gpx_stream, file.file)
     finally:
         await file.close()
 
-    parsed_data = parse_gpx_file(gpx_content_str)
     coordinates = parsed_data.get("coordinates")
     route_name = parsed_data.get("name")
 
@@ -409,119 +740,1167 @@ async def upload_gpx_file(file: UploadFile = File(...), current_user: User = Dep
 
     return response_data
 
-# Route management endpoints
-@api_router.post("/routes")
-async def save_route(route_data: RouteData, overwrite: bool = False, current_user: User = Depends(get_current_user)):
-    """Save a route for the current user"""
+# Route storage helpers (blocking, run via run_db)
+def row_to_saved_route(row, coordinates=None) -> SavedRoute:
+    """Build a SavedRoute, `coordinates` overrides the stored geometry (e.g. an LOD level)"""
+    return SavedRoute(
+        id=row['id'],
+        name=row['name'],
+        coordinates=encode_route_coordinates(row['coordinates'] if coordinates is None else coordinates),
+        run_details=RunDetails(**json.loads(row['run_details'])),
+        created_at=datetime.fromisoformat(row['created_at']),
+        user_id=row['user_id']
+    )
+
+def write_route_lods(conn, route_id: str, coordinates) -> None:
+    """(Re)compute and store the simplified geometry levels of a route"""
+    try:
+        levels = build_lods(coordinates)
+    except ValueError:
+        # Not plain [lat, lon] pairs; LOD requests fall back to the original
+        return
+    conn.execute("DELETE FROM route_lods WHERE route_id = ?", (route_id,))
+    conn.executemany(
+        "INSERT INTO route_lods (route_id, level, tolerance, point_count, coordinates) VALUES (?, ?, ?, ?, ?)",
+        [
+            (route_id, level, tolerance, len(points), pack_coordinates(points))
+            for level, (tolerance, points) in enumerate(zip(sorted(LOD_TOLERANCES_M), levels), start=1)
+        ]
+    )
+
+def write_route_thumbnail(conn, route_id: str, coordinates) -> Optional[tuple]:
+    """Render and store the SVG thumbnail of a route, returns (svg, etag)"""
+    try:
+        svg, etag = render_thumbnail(coordinates)
+    except ValueError:
+        return None
+    conn.execute(
+        "INSERT OR REPLACE INTO route_thumbnails (route_id, etag, svg, updated_at) VALUES (?, ?, ?, ?)",
+        (route_id, etag, svg, datetime.utcnow().isoformat())
+    )
+    return svg, etag
+
+def write_route_metrics(conn, route_id: str, coordinates, run_details: RunDetails) -> bool:
+    """
+    Compute and store a route's metrics (see route_metrics.py).
+
+    Skipped when the stored row was computed from the same geometry and
+    elevation input; returns whether anything was written.
+    """
+    split_length = split_length_for_unit(run_details.distance_unit)
+    try:
+        digest = metrics_digest(coordinates, split_length, run_details.km_elevation_changes)
+    except ValueError:
+        return False
+    stored = conn.execute("SELECT digest FROM route_metrics WHERE route_id = ?", (route_id,)).fetchone()
+    if stored is not None and stored['digest'] == digest:
+        return False
+    
+    elevation = None
+    if run_details.km_elevation_changes:
+        elevation = synthesize_timeline(coordinates, run_details).elevation
+    values = metrics_to_row(compute_metrics(coordinates, split_length, elevation))
+    values.update(route_id=route_id, digest=digest, updated_at=datetime.utcnow().isoformat())
+    columns = ", ".join(values)
+    placeholders = ", ".join(f":{column}" for column in values)
+    conn.execute(f"INSERT OR REPLACE INTO route_metrics ({columns}) VALUES ({placeholders})", values)
+    return True
+
+def delete_route_index(conn, route_id: str) -> None:
+    conn.execute(
+        "DELETE FROM route_spatial_index WHERE id IN (SELECT id FROM route_spatial_chunks WHERE route_id = ?)",
+        (route_id,)
+    )
+    conn.execute("DELETE FROM route_spatial_chunks WHERE route_id = ?", (route_id,))
+
+def write_route_index(conn, route_id: str, coordinates) -> None:
+    """Replace a route's chunk boxes in the R*Tree (see spatial.py)"""
+    delete_route_index(conn, route_id)
+    try:
+        first, last, boxes = chunk_bounds(as_coord_array(coordinates))
+    except ValueError:
+        return
+    if not len(first):
+        return
+    # Runs inside the write transaction, so no other writer can take these ids
+    start = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM route_spatial_chunks").fetchone()[0]
+    ids = range(start, start + len(first))
+    conn.executemany(
+        "INSERT INTO route_spatial_chunks (id, route_id, first_point, last_point) VALUES (?, ?, ?, ?)",
+        [(chunk_id, route_id, lo, hi) for chunk_id, lo, hi in zip(ids, first.tolist(), last.tolist())]
+    )
+    conn.executemany(
+        "INSERT INTO route_spatial_index (id, min_lat, max_lat, min_lon, max_lon) VALUES (?, ?, ?, ?, ?)",
+        [(chunk_id, *box) for chunk_id, box in zip(ids, boxes.tolist())]
+    )
+
+def delete_route_similarity(conn, route_id: str) -> None:
+    conn.execute("DELETE FROM route_lsh WHERE route_id = ?", (route_id,))
+    conn.execute("DELETE FROM route_signatures WHERE route_id = ?", (route_id,))
+
+def write_route_similarity(conn, route_id: str, coordinates) -> None:
+    """Replace a route's MinHash signature and LSH buckets (see similarity.py)"""
+    delete_route_similarity(conn, route_id)
+    try:
+        sig = signature(coordinates)
+    except ValueError:
+        return
+    conn.execute(
+        "INSERT INTO route_signatures (route_id, signature, updated_at) VALUES (?, ?, ?)",
+        (route_id, sig.tobytes(), datetime.utcnow().isoformat())
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO route_lsh (band, bucket, route_id) VALUES (?, ?, ?)",
+        [(band, bucket, route_id) for band, bucket in enumerate(band_buckets(sig).tolist())]
+    )
+
+def find_similar_routes(conn, user_id: str, coordinates, exclude_id: Optional[str] = None,
+                        min_jaccard: Optional[float] = None) -> List[dict]:
+    """
+    The user's routes resembling the given geometry, closest first.
+
+    Candidates share an LSH bucket, those with an estimated Jaccard similarity
+    of at least min_jaccard (at most SIMILAR_MAX_CANDIDATES of them) are
+    compared with the Fréchet distance. Never compares against the whole library.
+    """
+    if min_jaccard is None:
+        min_jaccard = SIMILAR_MIN_JACCARD
     try:
-        conn = get_db_connection()
+        sig = signature(coordinates)
+    except ValueError:
+        return []
+    buckets = [[band, bucket] for band, bucket in enumerate(band_buckets(sig).tolist())]
+    rows = conn.execute(
+        "SELECT g.route_id, g.signature, s.name, s.coordinates FROM route_signatures AS g "
+        "JOIN saved_routes AS s ON s.id = g.route_id "
+        "WHERE g.route_id IN (SELECT route_id FROM route_lsh WHERE (band, bucket) IN "
+        "(SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?))) "
+        "AND s.user_id = ? AND g.route_id != ?",
+        (json.dumps(buckets), user_id, exclude_id or "")
+    ).fetchall()
+    
+    scored = []
+    for row in rows:
+        jaccard = estimate_jaccard(sig, np.frombuffer(row['signature'], dtype=np.uint64))
+        if jaccard >= min_jaccard:
+            scored.append((jaccard, row))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    
+    similar = []
+    for jaccard, row in scored[:SIMILAR_MAX_CANDIDATES]:
+        distance, reversed_ = frechet_distance(coordinates, decode_stored(row['coordinates']))
+        similar.append({
+            "route_id": row['route_id'],
+            "name": row['name'],
+            "jaccard": round(jaccard, 3),
+            "frechet_m": round(distance, 1),
+            "reversed": reversed_,
+            "duplicate": distance <= DUPLICATE_FRECHET_M,
+        })
+    similar.sort(key=lambda item: item["frechet_m"])
+    return similar
+
+def write_route_artifacts(conn, route_id: str, coordinates, run_details: Optional[RunDetails] = None) -> None:
+    """Refresh everything derived from a route's geometry, call inside the saving transaction"""
+    write_route_lods(conn, route_id, coordinates)
+    write_route_index(conn, route_id, coordinates)
+    write_route_similarity(conn, route_id, coordinates)
+    write_route_thumbnail(conn, route_id, coordinates)
+    if run_details is not None:
+        write_route_metrics(conn, route_id, coordinates, run_details)
+
+def bump_routes_version(conn, user_id: str) -> None:
+    """Invalidate ETags of the user's route list, call inside the writing transaction"""
+    conn.execute(
+        "INSERT INTO route_versions (user_id, version) VALUES (?, 1) "
+        "ON CONFLICT(user_id) DO UPDATE SET version = version + 1",
+        (user_id,)
+    )
+
+def get_routes_version(user_id: str) -> int:
+    with get_db_connection() as conn:
+        row = conn.execute("SELECT version FROM route_versions WHERE user_id = ?", (user_id,)).fetchone()
+    return row['version'] if row else 0
+
+def delete_route_artifacts(conn, route_id: str) -> None:
+    conn.execute("DELETE FROM route_lods WHERE route_id = ?", (route_id,))
+    conn.execute("DELETE FROM route_thumbnails WHERE route_id = ?", (route_id,))
+    conn.execute("DELETE FROM route_metrics WHERE route_id = ?", (route_id,))
+    delete_route_index(conn, route_id)
+    delete_route_similarity(conn, route_id)
+
+def store_route(route_data: RouteData, overwrite: bool, user_id: str, dedupe: bool = False) -> dict:
+    """
+    Insert a route, or update the user's route of the same name with `overwrite`.
+
+    New routes report near-identical existing ones under "duplicates"; with
+    `dedupe` nothing is inserted when there is one and its id is returned.
+    """
+    route_name = route_data.runDetails.route_name
+    
+    with get_db_connection() as conn:
         cursor = conn.cursor()
         
-        route_name = route_data.runDetails.route_name
-        
         if overwrite:
-            # Check if route with same name exists for this user
+            # Check if route with same name exists for this user; with several, the newest is updated
             cursor.execute(
-                "SELECT id FROM saved_routes WHERE name = ? AND user_id = ?",
-                (route_name, current_user.id)
+                "SELECT id FROM saved_routes WHERE name = ? AND user_id = ? ORDER BY created_at DESC, id DESC LIMIT 1",
+                (route_name, user_id)
             )
             existing_route = cursor.fetchone()
             
             if existing_route:
                 # Update existing route
+                now = datetime.utcnow().isoformat()
                 cursor.execute(
-                    "UPDATE saved_routes SET coordinates = ?, run_details = ?, created_at = ? WHERE name = ? AND user_id = ?",
+                    "UPDATE saved_routes SET coordinates = ?, run_details = ?, created_at = ?, updated_at = ? WHERE id = ? AND user_id = ?",
                     (
-                        json.dumps(route_data.coordinates),
+                        encode_for_storage(route_data.coordinates),
                         json.dumps(route_data.runDetails.dict()),
-                        datetime.utcnow().isoformat(),
-                        route_name,
-                        current_user.id
+                        now,
+                        now,
+                        existing_route['id'],
+                        user_id
                     )
                 )
+                write_route_artifacts(conn, existing_route['id'], route_data.coordinates, route_data.runDetails)
+                bump_routes_version(conn, user_id)
                 conn.commit()
-                conn.close()
                 return {"message": "Route updated successfully", "route_id": existing_route['id']}
         
         # Insert new route (either no overwrite requested or no existing route found)
+        duplicates = [route for route in find_similar_routes(conn, user_id, route_data.coordinates)
+                      if route["duplicate"]]
+        if dedupe and duplicates:
+            return {"message": "Route matches an existing route", "route_id": duplicates[0]["route_id"],
+                    "duplicate_of": duplicates[0]["route_id"], "duplicates": duplicates}
+        
         route_id = str(uuid.uuid4())
         created_at = datetime.utcnow().isoformat()
         
         cursor.execute(
-            "INSERT INTO saved_routes (id, name, coordinates, run_details, created_at, user_id) VALUES (?, ?, ?, ?, ?, ?)",
+            "INSERT INTO saved_routes (id, name, coordinates, run_details, created_at, updated_at, user_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
             (
                 route_id,
                 route_name,
-                json.dumps(route_data.coordinates),
+                encode_for_storage(route_data.coordinates),
                 json.dumps(route_data.runDetails.dict()),
                 created_at,
-                current_user.id
+                created_at,
+                user_id
             )
         )
+        write_route_artifacts(conn, route_id, route_data.coordinates, route_data.runDetails)
+        bump_routes_version(conn, user_id)
         
         conn.commit()
-        conn.close()
+    
+    return {"message": "Route saved successfully", "route_id": route_id, "duplicates": duplicates}
+
+def store_imported_routes(parsed_routes: List[dict], user_id: str) -> List[str]:
+    """Insert parsed imports (see gpx_import.parse_import_batch) in a single transaction, returns their ids"""
+    created_at = datetime.utcnow().isoformat()
+    route_ids = [str(uuid.uuid4()) for _ in parsed_routes]
+    run_details = [RunDetails(**route["run_details"]) for route in parsed_routes]
+    rows = [
+        (
+            route_id,
+            route["name"],
+            route["coordinates"],
+            json.dumps(details.dict()),
+            created_at,
+            created_at,
+            user_id
+        )
+        for route_id, route, details in zip(route_ids, parsed_routes, run_details)
+    ]
+    with get_db_connection() as conn:
+        conn.executemany(
+            "INSERT INTO saved_routes (id, name, coordinates, run_details, created_at, updated_at, user_id) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        for route_id, route, details in zip(route_ids, parsed_routes, run_details):
+            write_route_artifacts(conn, route_id, decode_stored(route["coordinates"]), details)
+        if rows:
+            bump_routes_version(conn, user_id)
+        conn.commit()
+    return route_ids
+
+# Columns needed for each field that can be requested with GET /api/routes?fields=
+ROUTE_FIELD_COLUMNS = {
+    "id": {"id"},
+    "name": {"name"},
+    "created_at": {"created_at"},
+    "user_id": {"user_id"},
+    "coordinates": {"coordinates"},
+    "run_details": {"run_details"},
+    "distance": {"run_details"},
+    "thumbnail_url": set(),
+}
+SAVED_ROUTE_FIELDS = ["id", "name", "coordinates", "run_details", "created_at", "user_id"]
+MAX_ROUTES_PAGE_SIZE = 200
+
+def encode_route_coordinates(value, media_type: str = JSON_MEDIA_TYPE):
+    """Stored coordinates in the negotiated wire format, skipping the list of pairs when possible"""
+    if media_type == POLYLINE_MEDIA_TYPE or media_type == FLOAT32_MEDIA_TYPE:
+        coordinates = decode_stored(value)
+        coordinate_points.labels("out").observe(len(coordinates))
+        return encode_polyline(coordinates) if media_type == POLYLINE_MEDIA_TYPE else encode_float32(coordinates)
+    coordinates = load_coordinates(value)
+    coordinate_points.labels("out").observe(len(coordinates))
+    return coordinates
+
+def project_route_row(row, fields, media_type: str = JSON_MEDIA_TYPE, coordinates=None) -> dict:
+    item = {}
+    run_details = None
+    if "run_details" in fields or "distance" in fields:
+        run_details = RunDetails(**json.loads(row['run_details']))
+    for field in fields:
+        if field == "coordinates":
+            item["coordinates"] = encode_route_coordinates(
+                row['coordinates'] if coordinates is None else coordinates, media_type)
+        elif field == "run_details":
+            item["run_details"] = run_details
+        elif field == "distance":
+            item["distance"] = run_details.distance
+        elif field == "thumbnail_url":
+            continue  # filled in by fetch_route_page
+        elif field == "created_at":
+            item["created_at"] = datetime.fromisoformat(row['created_at'])
+        else:
+            item[field] = row[field]
+    return item
+
+def find_routes_in_area(user_id: str, box, near: Optional[tuple] = None) -> List[str]:
+    """
+    Ids of the user's routes with a segment inside box, or within near = (lat, lon, radius_m).
+
+    Candidate chunks come from the R*Tree, only their segments are checked exactly.
+    """
+    if near is not None:
+        box = radius_box(*near)
+    with get_db_connection() as conn:
+        # CROSS JOIN pins the R*Tree as the outer loop, left to itself the planner
+        # walks all of the user's routes and probes the tree once per chunk
+        chunks = conn.execute(
+            "SELECT c.route_id, c.first_point, c.last_point FROM route_spatial_index AS r "
+            "CROSS JOIN route_spatial_chunks AS c ON c.id = r.id "
+            "CROSS JOIN saved_routes AS s ON s.id = c.route_id "
+            "WHERE r.max_lat >= ? AND r.min_lat <= ? AND r.max_lon >= ? AND r.min_lon <= ? AND s.user_id = ?",
+            (box[0], box[1], box[2], box[3], user_id)
+        ).fetchall()
+        candidates = {}
+        for chunk in chunks:
+            candidates.setdefault(chunk['route_id'], []).append((chunk['first_point'], chunk['last_point']))
+        if not candidates:
+            return []
+        rows = conn.execute(
+            "SELECT id, coordinates FROM saved_routes WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(candidates)),)
+        ).fetchall()
+    
+    matches = []
+    for row in rows:
+        coords = decode_stored(row['coordinates'])
+        for first, last in candidates[row['id']]:
+            piece = coords[first:last + 1]
+            if segments_near(piece, *near) if near is not None else segments_in_box(piece, box):
+                matches.append(row['id'])
+                break
+    return matches
+
+def fetch_route_page(user_id: str, limit: Optional[int] = None, cursor: Optional[str] = None,
+                     fields: Optional[set] = None, media_type: str = JSON_MEDIA_TYPE,
+                     route_ids: Optional[List[str]] = None):
+    """
+    Fetch a user's routes newest first using keyset pagination on (created_at, id).
+
+    Returns (items, next_cursor); items are SavedRoute models, or dicts holding
+    only the requested fields when a projection is given or the coordinates
+    are requested in a compact wire format. `route_ids` restricts the page to
+    those routes (see find_routes_in_area).
+    """
+    if fields is None and media_type != JSON_MEDIA_TYPE:
+        fields = SAVED_ROUTE_FIELDS
+    if fields is None:
+        columns = "*"
+    else:
+        needed = {"id", "created_at"}
+        for field in fields:
+            needed |= ROUTE_FIELD_COLUMNS[field]
+        columns = ", ".join(sorted(needed))
+    
+    query = f"SELECT {columns} FROM saved_routes WHERE user_id = ?"
+    params = [user_id]
+    if route_ids is not None:
+        query += " AND id IN (SELECT value FROM json_each(?))"
+        params.append(json.dumps(route_ids))
+    if cursor:
+        created_at, route_id = decode_cursor(cursor, 2)
+        if not isinstance(created_at, str) or not isinstance(route_id, str):
+            raise InvalidCursorError("Malformed cursor")
+        query += " AND (created_at < ? OR (created_at = ? AND id < ?))"
+        params += [created_at, created_at, route_id]
+    query += " ORDER BY created_at DESC, id DESC"
+    if limit is not None:
+        # One extra row tells us whether there is a next page
+        query += " LIMIT ?"
+        params.append(limit + 1)
+    
+    with get_db_connection() as conn:
+        rows = conn.execute(query, params).fetchall()
+    
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1]['created_at'], rows[-1]['id']])
+    
+    if fields is None:
+        items = [row_to_saved_route(row) for row in rows]
+    else:
+        items = [project_route_row(row, fields, media_type) for row in rows]
+        if "thumbnail_url" in fields:
+            etags = fetch_thumbnail_etags([item_row['id'] for item_row in rows])
+            for item, row in zip(items, rows):
+                item["thumbnail_url"] = thumbnail_url(row['id'], etags.get(row['id']))
+    return items, next_cursor
+
+def search_routes(user_id: str, text: str, limit: int, offset: int = 0):
+    """
+    Rank the user's routes against a free-text query, best match first.
+
+    Returns (items, next_offset) where next_offset is None on the last page.
+    """
+    query = match_query(text, user_id)
+    with get_db_connection() as conn:
+        rows = conn.execute(
+            f"SELECT s.id, s.name, s.run_details, s.created_at, {RANK_EXPRESSION} AS rank "
+            "FROM route_search CROSS JOIN saved_routes AS s ON s.rowid = route_search.rowid "
+            "WHERE route_search MATCH ? "
+            "ORDER BY rank, s.created_at DESC LIMIT ? OFFSET ?",
+            (query, limit + 1, offset)
+        ).fetchall()
+    
+    next_offset = offset + limit if len(rows) > limit else None
+    items = []
+    for row in rows[:limit]:
+        run_details = json.loads(row['run_details'])
+        items.append({
+            "id": row['id'],
+            "name": row['name'],
+            "description": run_details.get('description') or '',
+            "distance": run_details.get('distance'),
+            "created_at": row['created_at'],
+            # bm25 is negative, larger magnitudes are better matches
+            "score": round(-row['rank'], 4),
+        })
+    return items, next_offset
+
+def fetch_thumbnail_etags(route_ids: List[str]) -> dict:
+    if not route_ids:
+        return {}
+    placeholders = ", ".join("?" * len(route_ids))
+    with get_db_connection() as conn:
+        rows = conn.execute(
+            f"SELECT route_id, etag FROM route_thumbnails WHERE route_id IN ({placeholders})",
+            route_ids
+        ).fetchall()
+    return {row['route_id']: row['etag'] for row in rows}
+
+def thumbnail_url(route_id: str, etag: Optional[str]) -> str:
+    """Versioned thumbnail URL, the version lets clients cache it forever"""
+    url = f"/api/routes/{route_id}/thumbnail"
+    if not etag:
+        return url
+    version = etag.strip('"')
+    return f"{url}?v={version}"
+
+def fetch_saved_routes(user_id: str) -> List[SavedRoute]:
+    return fetch_route_page(user_id)[0]
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "50"))
+
+def iter_export_rows(user_id: str, batch_size: Optional[int] = None):
+    """
+    Yield a user's saved_routes rows newest first.
+
+    The position is kept as a (created_at, id) keyset, each batch is read with
+    its own short connection checkout, so a slow download never pins a pooled
+    connection or a read transaction.
+    """
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    position = None
+    while True:
+        query = "SELECT id, name, coordinates, run_details, created_at FROM saved_routes WHERE user_id = ?"
+        params = [user_id]
+        if position:
+            query += " AND (created_at < ? OR (created_at = ? AND id < ?))"
+            params += [position[0], position[0], position[1]]
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(batch_size)
+        with get_db_connection() as conn:
+            rows = conn.execute(query, params).fetchall()
+        yield from rows
+        if len(rows) < batch_size:
+            return
+        position = (rows[-1]['created_at'], rows[-1]['id'])
+
+def export_filename() -> str:
+    return f"fakerun-routes-{datetime.utcnow():%Y%m%d}.zip"
+
+def iter_route_export(user_id: str, on_route=None):
+    """
+    Yield a ZIP archive with one GPX file per saved route, built route by route.
+
+    `on_route` is called with the number of routes read so far.
+    """
+    used_names = set()
+    
+    def entries():
+        for count, row in enumerate(iter_export_rows(user_id), start=1):
+            if on_route is not None:
+                on_route(count)
+            try:
+                run_details = RunDetails(**json.loads(row['run_details']))
+                coordinates = load_coordinates(row['coordinates'])
+                start = time.perf_counter()
+                timeline = synthesize_timeline(coordinates, run_details)
+                elapsed = time.perf_counter() - start
+            except Exception as e:
+                # The response is already streaming, skip the route rather than break the archive
+                logger.error(f"Error exporting route {row['id']}: {str(e)}")
+                continue
+            name = unique_name(gpx_filename(row['name']), used_names)
+            date_time = datetime.fromisoformat(row['created_at']).timetuple()[:6]
+            yield name, date_time, timed_gpx_bytes(coordinates, run_details, timeline, elapsed)
+    
+    return iter_zip(entries())
+
+def fetch_route_record(route_id: str, user_id: str, lod: Optional[int] = None) -> Optional[tuple]:
+    """Return (row, stored coordinates of the requested LOD level) or None"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT * FROM saved_routes WHERE id = ? AND user_id = ?",
+            (route_id, user_id)
+        )
+        row = cursor.fetchone()
+        if not row:
+            return None
+        if not lod:
+            return row, row['coordinates']
+        
+        level = conn.execute(
+            "SELECT coordinates FROM route_lods WHERE route_id = ? AND level = ?",
+            (route_id, lod)
+        ).fetchone()
+        if level is None:
+            # Routes saved before LODs existed are simplified on first request
+            write_route_lods(conn, route_id, load_coordinates(row['coordinates']))
+            conn.commit()
+            level = conn.execute(
+                "SELECT coordinates FROM route_lods WHERE route_id = ? AND level = ?",
+                (route_id, lod)
+            ).fetchone()
+    
+    return row, (level['coordinates'] if level is not None else row['coordinates'])
+
+def fetch_route(route_id: str, user_id: str, lod: Optional[int] = None) -> Optional[SavedRoute]:
+    """Fetch a route; with lod >= 1 the coordinates are the simplified level"""
+    record = fetch_route_record(route_id, user_id, lod)
+    if record is None:
+        return None
+    row, coordinates = record
+    return row_to_saved_route(row, coordinates)
+
+def fetch_route_encoded(route_id: str, user_id: str, lod: Optional[int], media_type: str):
+    """
+    Fetch a route for a compact wire format: float32 bytes of the coordinates
+    alone, or a dict with the coordinates as an encoded polyline.
+    """
+    record = fetch_route_record(route_id, user_id, lod)
+    if record is None:
+        return None
+    row, coordinates = record
+    if media_type == FLOAT32_MEDIA_TYPE:
+        return encode_route_coordinates(coordinates, media_type)
+    return project_route_row(row, SAVED_ROUTE_FIELDS, media_type, coordinates)
+
+def fetch_route_etag(route_id: str, user_id: str, lod: int = 0,
+                     media_type: str = JSON_MEDIA_TYPE) -> Optional[str]:
+    """ETag of a route representation, computed without decoding the route"""
+    with get_db_connection() as conn:
+        row = conn.execute(
+            "SELECT id, created_at, updated_at FROM saved_routes WHERE id = ? AND user_id = ?",
+            (route_id, user_id)
+        ).fetchone()
+    if row is None:
+        return None
+    return make_etag("route", row['id'], row['updated_at'] or row['created_at'], lod, media_type)
+
+def fetch_route_thumbnail(route_id: str, user_id: str) -> Optional[tuple]:
+    """Return (svg, etag) for a user's route, rendering it for routes saved before thumbnails existed"""
+    with get_db_connection() as conn:
+        row = conn.execute(
+            "SELECT t.svg, t.etag FROM saved_routes r LEFT JOIN route_thumbnails t ON t.route_id = r.id "
+            "WHERE r.id = ? AND r.user_id = ?",
+            (route_id, user_id)
+        ).fetchone()
+        if row is None:
+            return None
+        if row['svg'] is not None:
+            return row['svg'], row['etag']
         
-        return {"message": "Route saved successfully", "route_id": route_id}
+        route = conn.execute("SELECT coordinates FROM saved_routes WHERE id = ?", (route_id,)).fetchone()
+        thumbnail = write_route_thumbnail(conn, route_id, load_coordinates(route['coordinates']))
+        conn.commit()
+        return thumbnail
+
+def fetch_route_metrics(route_id: str, user_id: str):
+    """Return the route_metrics row of a user's route, computing it for routes saved before metrics existed"""
+    with get_db_connection() as conn:
+        row = conn.execute(
+            "SELECT r.coordinates, r.run_details, m.route_id AS metrics_route_id FROM saved_routes r "
+            "LEFT JOIN route_metrics m ON m.route_id = r.id WHERE r.id = ? AND r.user_id = ?",
+            (route_id, user_id)
+        ).fetchone()
+        if row is None:
+            return None
+        if row['metrics_route_id'] is None:
+            run_details = RunDetails(**json.loads(row['run_details']))
+            if write_route_metrics(conn, route_id, load_coordinates(row['coordinates']), run_details):
+                conn.commit()
+        return conn.execute("SELECT * FROM route_metrics WHERE route_id = ?", (route_id,)).fetchone()
+
+def remove_route(route_id: str, user_id: str) -> bool:
+    """Delete a route, returns False if it does not exist or belongs to someone else"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "DELETE FROM saved_routes WHERE id = ? AND user_id = ?",
+            (route_id, user_id)
+        )
+        deleted = cursor.rowcount > 0
+        if deleted:
+            delete_route_artifacts(conn, route_id)
+            bump_routes_version(conn, user_id)
+        conn.commit()
+        return deleted
+
+def migrate_route_coordinates(batch_size: int = 500) -> int:
+    """Convert legacy JSON text coordinates to the packed BLOB format, one batch per transaction"""
+    migrated = 0
+    last_rowid = 0
+    while True:
+        with get_db_connection() as conn:
+            rows = conn.execute(
+                "SELECT rowid, id, coordinates FROM saved_routes "
+                "WHERE rowid > ? AND typeof(coordinates) = 'text' ORDER BY rowid LIMIT ?",
+                (last_rowid, batch_size)
+            ).fetchall()
+            if not rows:
+                return migrated
+            last_rowid = rows[-1]['rowid']
+            
+            updates = []
+            for row in rows:
+                # Rows that cannot be packed stay as JSON text
+                packed = encode_for_storage(json.loads(row['coordinates']))
+                if isinstance(packed, bytes):
+                    updates.append((packed, row['id'], row['coordinates']))
+            # Only replace rows that were not rewritten in the meantime
+            conn.executemany(
+                "UPDATE saved_routes SET coordinates = ? WHERE id = ? AND coordinates = ?",
+                updates
+            )
+            conn.commit()
+        migrated += len(updates)
+
+def index_unindexed_routes(batch_size: int = 200) -> int:
+    """Add routes saved before the spatial and similarity indexes existed, one batch per transaction"""
+    indexed = 0
+    last_rowid = 0
+    while True:
+        with get_db_connection() as conn:
+            rows = conn.execute(
+                "SELECT rowid, id, coordinates FROM saved_routes "
+                "WHERE rowid > ? AND (id NOT IN (SELECT route_id FROM route_spatial_chunks) "
+                "OR id NOT IN (SELECT route_id FROM route_signatures)) ORDER BY rowid LIMIT ?",
+                (last_rowid, batch_size)
+            ).fetchall()
+            if not rows:
+                return indexed
+            last_rowid = rows[-1]['rowid']
+            for row in rows:
+                coordinates = decode_stored(row['coordinates'])
+                write_route_index(conn, row['id'], coordinates)
+                write_route_similarity(conn, row['id'], coordinates)
+            conn.commit()
+        indexed += len(rows)
+
+# Route management endpoints
+@api_router.post("/routes")
+async def save_route(
+    overwrite: bool = False,
+    dedupe: bool = False,
+    route_data: RouteData = Depends(read_route_data),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Save a route for the current user.
+
+    Near-identical routes already saved are listed under "duplicates";
+    `dedupe=true` returns the existing route instead of saving a copy.
+    """
+    try:
+        return await run_db(store_route, route_data, overwrite, current_user.id, dedupe)
         
     except Exception as e:
         logger.error(f"Error saving route: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error saving route: {str(e)}")
 
-@api_router.get("/routes", response_model=List[SavedRoute])
-async def get_saved_routes(current_user: User = Depends(get_current_user)):
-    """Get all saved routes for the current user"""
+@api_router.post("/routes/import")
+async def import_routes(
+    files: List[UploadFile] = File(...),
+    background: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Import many GPX files at once; ZIP uploads contribute every .gpx they contain.
+
+    Files are parsed in parallel on the CPU process pool and all routes are
+    inserted in one transaction. The response lists a result per file plus
+    parse and insert throughput. With `background=true` the import runs as a
+    job (see jobs.py) and 202 is returned with the job; its result is this
+    same response. ZIPs are then only expanded by the job.
+    """
+    raw_uploads = []
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM saved_routes WHERE user_id = ? ORDER BY created_at DESC",
-            (current_user.id,)
-        )
+        for file in files:
+            raw_uploads.append((file.filename or "upload.gpx", await file.read()))
+    finally:
+        for file in files:
+            await file.close()
+    
+    if background:
+        # Uploads themselves must fit, the job checks the expanded files
+        if len(raw_uploads) > MAX_IMPORT_FILES:
+            raise HTTPException(status_code=400, detail=f"Too many files, at most {MAX_IMPORT_FILES} per import")
+        if sum(len(content) for _, content in raw_uploads) > MAX_IMPORT_TOTAL_BYTES:
+            raise HTTPException(status_code=400,
+                                detail=f"Import is too large, at most {MAX_IMPORT_TOTAL_BYTES} bytes uncompressed")
+        return await submit_job(current_user.id, "import", files=raw_uploads)
+    try:
+        uploads = await run_in_threadpool(expand_uploads, raw_uploads)
+    except ImportLimitError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        return await import_uploads(uploads, current_user.id)
+    except Exception as e:
+        logger.error(f"Error importing routes: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error importing routes: {str(e)}")
+
+async def import_uploads(uploads: List[tuple], user_id: str, progress=None) -> dict:
+    """
+    Parse expanded uploads on the CPU process pool and insert the routes in one
+    transaction; `progress` is an optional async callback taking a fraction.
+    """
+    # Results are reported in upload order
+    results = [None] * len(uploads)
+    parseable = []
+    parseable_positions = []
+    for position, (filename, content) in enumerate(uploads):
+        if isinstance(content, Exception):
+            results[position] = {"filename": filename, "error": str(content)}
+        else:
+            parseable.append((filename, content))
+            parseable_positions.append(position)
+    
+    batch_list = list(batched(parseable))
+    parsed_batches = 0
+    
+    async def parse(batch):
+        nonlocal parsed_batches
+        try:
+            result = await run_cpu(parse_import_batch, batch)
+        except Exception as e:
+            # e.g. a crashed pool worker, fails this batch's files only
+            logger.error(f"Error parsing import batch: {str(e)}")
+            result = [{"filename": filename, "error": f"Could not parse file: {str(e)}"} for filename, _ in batch]
+        parsed_batches += 1
+        if progress is not None:
+            await progress(0.8 * parsed_batches / len(batch_list), "Parsing files")
+        return result
+    
+    parse_start = time.perf_counter()
+    batches = await asyncio.gather(*(parse(batch) for batch in batch_list))
+    parse_seconds = time.perf_counter() - parse_start
+    if progress is not None:
+        await progress(0.8, "Saving routes", force=True)
+    
+    parsed = [result for batch in batches for result in batch]
+    routes = [result for result in parsed if "error" not in result]
+    insert_start = time.perf_counter()
+    route_ids = await run_db(store_imported_routes, routes, user_id)
+    insert_seconds = time.perf_counter() - insert_start
+    
+    route_ids = iter(route_ids)
+    for position, result in zip(parseable_positions, parsed):
+        if "error" not in result:
+            result = {"filename": result["filename"], "route_id": next(route_ids),
+                      "name": result["name"], "points": result["points"]}
+        results[position] = result
+    
+    points = sum(route["points"] for route in routes)
+    parse_bytes = sum(len(content) for _, content in parseable)
+    return {
+        "imported": len(routes),
+        "failed": len(results) - len(routes),
+        "results": results,
+        "stats": {
+            "files": len(uploads),
+            "points": points,
+            "parse_seconds": round(parse_seconds, 4),
+            "insert_seconds": round(insert_seconds, 4),
+            "parse_files_per_second": round(len(parseable) / parse_seconds, 1) if parse_seconds else None,
+            "parse_mb_per_second": round(parse_bytes / 1e6 / parse_seconds, 2) if parse_seconds else None,
+            "insert_routes_per_second": round(len(routes) / insert_seconds, 1) if insert_seconds else None,
+            "insert_points_per_second": round(points / insert_seconds) if insert_seconds else None,
+        }
+    }
+
+# Background job handlers (see jobs.py)
+async def generate_gpx_job(job: JobContext) -> JobResult:
+    try:
+        coordinates = validate_coordinates(parse_coordinates(job.params.get("coordinates"))).tolist()
+        run_details = RunDetails(**(job.params.get("runDetails") or {}))
+    except (ValueError, ValidationError, TypeError) as e:
+        raise JobFailed(f"Invalid route data: {e}")
+    
+    def build():
+        start = time.perf_counter()
+        timeline = synthesize_timeline(coordinates, run_details)
+        return b"".join(timed_gpx_bytes(coordinates, run_details, timeline, time.perf_counter() - start))
+    
+    return JobResult(await run_in_threadpool(build), "application/gpx+xml", gpx_filename(run_details.route_name))
+
+async def export_routes_job(job: JobContext) -> JobResult:
+    total = await run_db(count_user_routes, job.user_id)
+    
+    def build():
+        on_route = lambda count: job.report(count / total, f"Exported {count} of {total} routes") if total else None
+        # Streamed to the job's result file, the archive is never held in memory
+        return job.write_result(iter_route_export(job.user_id, on_route))
+    
+    return JobResult(media_type="application/zip", filename=export_filename(), path=await run_in_threadpool(build))
+
+async def import_routes_job(job: JobContext) -> dict:
+    try:
+        uploads = await run_in_threadpool(expand_uploads, await job.files())
+    except ImportLimitError as e:
+        raise JobFailed(str(e))
+    return await import_uploads(uploads, job.user_id, job.progress)
+
+job_queue.register("generate-gpx", generate_gpx_job)
+job_queue.register("export", export_routes_job)
+job_queue.register("import", import_routes_job)
+
+# Kinds that take JSON parameters, imports are submitted with their files by POST /api/routes/import
+JSON_JOB_KINDS = {"generate-gpx", "export"}
+
+def count_user_routes(user_id: str) -> int:
+    with get_db_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM saved_routes WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+def job_payload(row) -> dict:
+    payload = {key: row[key] for key in row.keys() if key != "result_size"}
+    payload["result_url"] = f"/api/jobs/{row['id']}/result" if row['status'] == "succeeded" else None
+    return payload
+
+async def submit_job(user_id: str, kind: str, params: Optional[dict] = None, priority: int = 0,
+                     files: Optional[List[tuple]] = None) -> JSONResponse:
+    """Queue a job and answer 202 with its current state"""
+    try:
+        job_id = await job_queue.submit(user_id, kind, params, priority, files)
+        row = await run_db(job_queue.get, job_id, user_id)
+    except QueueFullError as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error submitting job: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error submitting job: {str(e)}")
+    return JSONResponse(jsonable_encoder(job_payload(row)), status_code=202,
+                        headers={"Location": f"/api/jobs/{job_id}"})
+
+def parse_area_filter(bbox: Optional[str], near: Optional[str], radius: float) -> Optional[tuple]:
+    """(box, near) arguments for find_routes_in_area, or None without an area filter"""
+    if bbox and near:
+        raise HTTPException(status_code=400, detail="Use either bbox or near, not both")
+    if near:
+        lat, lon = parse_lat_lon(near, "near")
+        return None, (lat, lon, radius)
+    if bbox:
+        try:
+            min_lat, min_lon, max_lat, max_lon = (float(part) for part in bbox.split(","))
+            validate_coordinates([[min_lat, min_lon], [max_lat, max_lon]])
+        except ValueError:
+            raise HTTPException(status_code=422, detail="bbox must be 'min_lat,min_lon,max_lat,max_lon'")
+        if min_lat > max_lat or min_lon > max_lon:
+            raise HTTPException(status_code=422, detail="bbox minimums must not exceed its maximums")
+        return (min_lat, max_lat, min_lon, max_lon), None
+    return None
+
+@api_router.get("/routes")
+async def get_saved_routes(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_ROUTES_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    bbox: Optional[str] = None,
+    near: Optional[str] = None,
+    radius: float = Query(1000, gt=0, le=100000),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get saved routes for the current user, newest first.
+
+    Without `limit` every route is returned. With `limit`, the cursor for the
+    next page is sent in the X-Next-Cursor header. `fields` is a comma separated
+    projection, e.g. `fields=id,name,distance` skips the route geometry.
+
+    Responses carry a strong ETag derived from the user's routes version, an
+    unchanged list answers If-None-Match with 304 before touching the routes.
+
+    With `Accept: application/vnd.fakerun.polyline+json` coordinates are sent
+    as Google encoded polylines.
+
+    `bbox=min_lat,min_lon,max_lat,max_lon` keeps routes with a segment inside
+    the box, `near=lat,lon&radius=metres` routes passing within radius of the
+    point (see spatial.py).
+    """
+    try:
+        projection = parse_fields(fields, ROUTE_FIELD_COLUMNS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    area = parse_area_filter(bbox, near, radius)
+    media_type = negotiate(request.headers.get("accept"), allow_binary=False)
+    
+    try:
+        version = await run_db(get_routes_version, current_user.id)
+        etag = make_etag("routes", current_user.id, version, limit, cursor,
+                         ",".join(sorted(projection)) if projection else "*", media_type, bbox, near, radius)
+        cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=cache_headers)
         
-        routes = []
-        for row in cursor.fetchall():
-            routes.append(SavedRoute(
-                id=row['id'],
-                name=row['name'],
-                coordinates=json.loads(row['coordinates']),
-                run_details=RunDetails(**json.loads(row['run_details'])),
-                created_at=datetime.fromisoformat(row['created_at']),
-                user_id=row['user_id']
-            ))
-        
-        conn.close()
+        route_ids = None
+        if area is not None:
+            route_ids = await run_db(find_routes_in_area, current_user.id, *area)
+        routes, next_cursor = await run_db(fetch_route_page, current_user.id, limit, cursor, projection, media_type,
+                                           route_ids)
+        if next_cursor:
+            cache_headers["X-Next-Cursor"] = next_cursor
+        if media_type != JSON_MEDIA_TYPE:
+            return JSONResponse(jsonable_encoder(routes), media_type=media_type, headers=cache_headers)
+        response.headers.update(cache_headers)
         return routes
         
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching routes: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching routes: {str(e)}")
 
+@api_router.get("/routes/export")
+async def export_routes(background: bool = False, current_user: User = Depends(get_current_user)):
+    """
+    Download every saved route of the current user as a streamed ZIP of GPX files.
+
+    With `background=true` the archive is built by a job instead, 202 is
+    returned and the ZIP is downloaded from /api/jobs/{id}/result.
+    """
+    if background:
+        return await submit_job(current_user.id, "export")
+    filename = export_filename()
+    return StreamingResponse(
+        iter_route_export(current_user.id),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@api_router.get("/routes/search")
+async def search_saved_routes(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=MAX_ROUTES_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Search the current user's route names and descriptions.
+
+    Every word of `q` must match, as a prefix, either field; name matches rank
+    higher. The cursor for the next page is sent in the X-Next-Cursor header.
+    """
+    try:
+        offset = decode_cursor(cursor, 1)[0] if cursor else 0
+        # bool is an int subclass, a [true] cursor must not pass as offset 1
+        if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+            raise InvalidCursorError("Malformed cursor")
+        items, next_offset = await run_db(search_routes, current_user.id, q, limit, offset)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error searching routes: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error searching routes: {str(e)}")
+    
+    if next_offset is not None:
+        response.headers["X-Next-Cursor"] = encode_cursor([next_offset])
+    return items
+
+@api_router.post("/jobs")
+async def create_job(job_request: JobRequest, current_user: User = Depends(get_current_user)):
+    """
+    Queue a background job, answers 202 with the job.
+
+    Kinds: `generate-gpx` (params: coordinates, runDetails) and `export`
+    (every saved route as a ZIP). Higher priorities run first.
+    """
+    if job_request.kind not in JSON_JOB_KINDS:
+        raise HTTPException(status_code=422, detail=f"Unknown job kind, expected one of {sorted(JSON_JOB_KINDS)}")
+    return await submit_job(current_user.id, job_request.kind, job_request.params, job_request.priority)
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str, current_user: User = Depends(get_current_user)):
+    """Status, progress and attempts of a job; `result_url` is set once it succeeded"""
+    try:
+        row = await run_db(job_queue.get, job_id, current_user.id)
+    except Exception as e:
+        logger.error(f"Error fetching job: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error fetching job: {str(e)}")
+    if row is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_payload(row)
+
+@api_router.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, current_user: User = Depends(get_current_user)):
+    """Download what a finished job produced, 409 while it has not succeeded"""
+    try:
+        row = await run_db(job_queue.get_result, job_id, current_user.id)
+    except Exception as e:
+        logger.error(f"Error fetching job result: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error fetching job result: {str(e)}")
+    if row is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if row['status'] != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Job is {row['status']}")
+    headers = {}
+    if row['result_filename']:
+        headers["Content-Disposition"] = f'attachment; filename="{row["result_filename"]}"'
+    if row['result_path']:
+        if not os.path.isfile(row['result_path']):
+            raise HTTPException(status_code=404, detail="Job result is no longer available")
+        return FileResponse(row['result_path'], media_type=row['result_media_type'], headers=headers)
+    return Response(content=bytes(row['result']), media_type=row['result_media_type'], headers=headers)
+
+async def require_profile_admin(request: Request) -> None:
+    """Stored profiles expose code internals, only the PROFILE_ADMIN_TOKEN holder may read them"""
+    if profiler.admin_token is None:
+        raise HTTPException(status_code=404, detail="Profiling is not enabled")
+    if not profiler.is_admin(request.headers.get("x-profile-token")):
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+
+@api_router.get("/profiles")
+async def list_profiles(
+    route: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    _: None = Depends(require_profile_admin)
+):
+    """
+    Stored request profiles, newest first, optionally of one route template
+    (e.g. `/api/routes`).
+
+    A request is profiled when it sends `X-Profile-Token` with the admin
+    token (the response then carries `X-Profile-Id`) or when it is picked
+    by PROFILE_SAMPLE_RATE.
+    """
+    try:
+        return await run_db(profiler.list, route, limit)
+    except Exception as e:
+        logger.error(f"Error listing profiles: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error listing profiles: {str(e)}")
+
+@api_router.get("/profiles/hot")
+async def get_hot_functions(
+    route: Optional[str] = None,
+    sort: str = "tottime",
+    limit: int = Query(30, ge=1, le=500),
+    profiles: int = Query(200, ge=1, le=10_000),
+    _: None = Depends(require_profile_admin)
+):
+    """
+    Functions summed over the most recent stored profiles, optionally of one
+    route template, sorted by `tottime` (own time), `cumtime` or `calls`.
+    """
+    if sort not in SORT_KEYS:
+        raise HTTPException(status_code=422, detail=f"sort must be one of {', '.join(SORT_KEYS)}")
+    try:
+        return await run_db(profiler.hot_functions, route, limit, sort, profiles)
+    except Exception as e:
+        logger.error(f"Error aggregating profiles: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error aggregating profiles: {str(e)}")
+
+@api_router.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str, _: None = Depends(require_profile_admin)):
+    """One profile in pstats format, load it with `pstats.Stats(path)` or snakeviz"""
+    try:
+        content = await run_db(profiler.get, profile_id)
+    except Exception as e:
+        logger.error(f"Error fetching profile: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error fetching profile: {str(e)}")
+    if content is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(content=content, media_type="application/octet-stream",
+                    headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.prof"'})
+
 @api_router.get("/routes/{route_id}", response_model=SavedRoute)
-async def get_route_by_id(route_id: str, current_user: User = Depends(get_current_user)):
-    """Get a specific route by ID"""
+async def get_route_by_id(
+    route_id: str,
+    request: Request,
+    response: Response,
+    lod: int = Query(0, ge=0, le=len(LOD_TOLERANCES_M)),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get a specific route by ID, `lod=N` (1 = finest) returns simplified geometry.
+
+    The Accept header selects the coordinate format: JSON pairs (default), an
+    encoded polyline (application/vnd.fakerun.polyline+json) or just the
+    coordinates as little-endian float32 pairs (application/vnd.fakerun.coords+f32).
+    """
+    media_type = negotiate(request.headers.get("accept"))
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM saved_routes WHERE id = ? AND user_id = ?",
-            (route_id, current_user.id)
-        )
-        
-        row = cursor.fetchone()
-        if not row:
+        etag = await run_db(fetch_route_etag, route_id, current_user.id, lod, media_type)
+        if etag is None:
             raise HTTPException(status_code=404, detail="Route not found")
+        cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=cache_headers)
         
-        route = SavedRoute(
-            id=row['id'],
-            name=row['name'],
-            coordinates=json.loads(row['coordinates']),
-            run_details=RunDetails(**json.loads(row['run_details'])),
-            created_at=datetime.fromisoformat(row['created_at']),
-            user_id=row['user_id']
-        )
+        if media_type == JSON_MEDIA_TYPE:
+            route = await run_db(fetch_route, route_id, current_user.id, lod)
+        else:
+            route = await run_db(fetch_route_encoded, route_id, current_user.id, lod, media_type)
+        if route is None:
+            raise HTTPException(status_code=404, detail="Route not found")
         
-        conn.close()
+        if media_type == FLOAT32_MEDIA_TYPE:
+            return Response(content=route, media_type=media_type, headers=cache_headers)
+        if media_type == POLYLINE_MEDIA_TYPE:
+            return JSONResponse(jsonable_encoder(route), media_type=media_type, headers=cache_headers)
+        response.headers.update(cache_headers)
         return route
         
     except HTTPException:
@@ -530,31 +1909,101 @@ async def get_route_by_id(route_id: str, current_user: User = Depends(get_curren
         logger.error(f"Error fetching route: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error fetching route: {str(e)}")
 
+@api_router.get("/routes/{route_id}/metrics")
+async def get_route_metrics(
+    route_id: str,
+    request: Request,
+    cumulative: bool = False,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Distance, split start indices, bounding box and elevation gain of a route.
+
+    Computed once when the route is saved; `cumulative=true` adds the
+    distance from the start at every point.
+    """
+    try:
+        row = await run_db(fetch_route_metrics, route_id, current_user.id)
+    except Exception as e:
+        logger.error(f"Error fetching route metrics: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error fetching route metrics: {str(e)}")
+    if row is None:
+        raise HTTPException(status_code=404, detail="Route not found")
+    
+    etag = make_etag("metrics", route_id, row['digest'], cumulative)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    payload = metrics_payload(row, include_cumulative=cumulative)
+    payload["route_id"] = route_id
+    return JSONResponse(payload, headers=headers)
+
+def fetch_similar_routes(route_id: str, user_id: str, min_jaccard: Optional[float] = None) -> Optional[List[dict]]:
+    with get_db_connection() as conn:
+        row = conn.execute(
+            "SELECT coordinates FROM saved_routes WHERE id = ? AND user_id = ?",
+            (route_id, user_id)
+        ).fetchone()
+        if row is None:
+            return None
+        return find_similar_routes(conn, user_id, decode_stored(row['coordinates']), route_id, min_jaccard)
+
+@api_router.get("/routes/{route_id}/similar")
+async def get_similar_routes(
+    route_id: str,
+    min_jaccard: Optional[float] = Query(None, ge=0, le=1),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    The user's other routes with a similar geometry, closest first.
+
+    `duplicate` marks routes within DUPLICATE_FRECHET_M metres Fréchet distance,
+    in either direction.
+    """
+    try:
+        similar = await run_db(fetch_similar_routes, route_id, current_user.id, min_jaccard)
+    except Exception as e:
+        logger.error(f"Error finding similar routes: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error finding similar routes: {str(e)}")
+    if similar is None:
+        raise HTTPException(status_code=404, detail="Route not found")
+    return {"route_id": route_id, "similar": similar}
+
+@api_router.get("/routes/{route_id}/thumbnail")
+async def get_route_thumbnail(
+    route_id: str,
+    request: Request,
+    v: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """SVG thumbnail of a route, `v` is the version from the route's thumbnail_url"""
+    try:
+        thumbnail = await run_db(fetch_route_thumbnail, route_id, current_user.id)
+    except Exception as e:
+        logger.error(f"Error fetching thumbnail: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error fetching thumbnail: {str(e)}")
+    if thumbnail is None:
+        raise HTTPException(status_code=404, detail="Route not found")
+    
+    svg, etag = thumbnail
+    headers = {"ETag": etag}
+    if v and v == etag.strip('"'):
+        # Versioned URLs never change content
+        headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    else:
+        headers["Cache-Control"] = "private, no-cache"
+    
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=svg, media_type="image/svg+xml", headers=headers)
+
 @api_router.delete("/routes/{route_id}")
 async def delete_route(route_id: str, current_user: User = Depends(get_current_user)):
     """Delete a specific route"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Check if route exists and belongs to user
-        cursor.execute(
-            "SELECT id FROM saved_routes WHERE id = ? AND user_id = ?",
-            (route_id, current_user.id)
-        )
-        
-        if not cursor.fetchone():
+        if not await run_db(remove_route, route_id, current_user.id):
             raise HTTPException(status_code=404, detail="Route not found")
         
-        # Delete the route
-        cursor.execute(
-            "DELETE FROM saved_routes WHERE id = ? AND user_id = ?",
-            (route_id, current_user.id)
-        )
-        
-        conn.commit()
-        conn.close()
-        
         return {"message": "Route deleted successfully"}
         
     except HTTPException:
@@ -567,51 +2016,324 @@ async def delete_route(route_id: str, current_user: User = Depends(get_current_u
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup"""
-    init_database()
+    await run_db(init_database)
+    await job_queue.start()
     logger.info("Application started with SQLite database")
+    # Keep a reference so the task is not garbage collected while it runs
+    app.state.coordinate_migration = asyncio.create_task(migrate_coordinates_in_background())
+
+async def migrate_coordinates_in_background():
+    try:
+        migrated = await run_db(migrate_route_coordinates)
+        if migrated:
+            logger.info(f"Migrated {migrated} routes to packed coordinate storage")
+    except Exception as e:
+        logger.error(f"Error migrating route coordinates: {str(e)}")
+    try:
+        indexed = await run_db(index_unindexed_routes)
+        if indexed:
+            logger.info(f"Added {indexed} routes to the spatial and similarity indexes")
+    except Exception as e:
+        logger.error(f"Error indexing routes: {str(e)}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop worker pools and close pooled database connections"""
+    await job_queue.stop()
+    await geocoder.aclose()
+    shutdown_executors()
+    db_pool.close_all()
 
 def init_database():
     """Initialize the SQLite database with required tables"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Create status_checks table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS status_checks (
-            id TEXT PRIMARY KEY,
-            timestamp TEXT NOT NULL,
-            status TEXT NOT NULL,
-            message TEXT NOT NULL
-        )
-    ''')
-    
-    # Create users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id TEXT PRIMARY KEY,
-            email TEXT UNIQUE NOT NULL,
-            username TEXT UNIQUE NOT NULL,
-            hashed_password TEXT NOT NULL,
-            created_at TEXT NOT NULL,
-            is_active BOOLEAN DEFAULT TRUE
-        )
-    ''')
-    
-    # Create saved_routes table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS saved_routes (
-            id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            coordinates TEXT NOT NULL,
-            run_details TEXT NOT NULL,
-            created_at TEXT NOT NULL,
-            user_id TEXT NOT NULL,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Create status_checks table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS status_checks (
+                id TEXT PRIMARY KEY,
+                timestamp TEXT NOT NULL,
+                status TEXT NOT NULL,
+                message TEXT NOT NULL
+            )
+        ''')
+        
+        # Create users table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id TEXT PRIMARY KEY,
+                email TEXT UNIQUE NOT NULL,
+                username TEXT UNIQUE NOT NULL,
+                hashed_password TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                is_active BOOLEAN DEFAULT TRUE
+            )
+        ''')
+        
+        # Create saved_routes table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS saved_routes (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                coordinates TEXT NOT NULL,
+                run_details TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                updated_at TEXT,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+        
+        # Databases created before updated_at existed
+        columns = {row['name'] for row in cursor.execute("PRAGMA table_info(saved_routes)")}
+        if "updated_at" not in columns:
+            cursor.execute("ALTER TABLE saved_routes ADD COLUMN updated_at TEXT")
+        
+        # Per-user counter bumped on every route write, used for list ETags
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS route_versions (
+                user_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+        ''')
+        
+        # Simplified geometry per route, level 1 is the finest (see simplify.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS route_lods (
+                route_id TEXT NOT NULL,
+                level INTEGER NOT NULL,
+                tolerance REAL NOT NULL,
+                point_count INTEGER NOT NULL,
+                coordinates BLOB NOT NULL,
+                PRIMARY KEY (route_id, level),
+                FOREIGN KEY (route_id) REFERENCES saved_routes (id)
+            )
+        ''')
+        
+        # Rendered SVG thumbnail per route (see thumbnails.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS route_thumbnails (
+                route_id TEXT PRIMARY KEY,
+                etag TEXT NOT NULL,
+                svg TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                FOREIGN KEY (route_id) REFERENCES saved_routes (id)
+            )
+        ''')
+        
+        # Metrics computed from each route's geometry (see route_metrics.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS route_metrics (
+                route_id TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                distance REAL NOT NULL,
+                point_count INTEGER NOT NULL,
+                min_lat REAL,
+                min_lon REAL,
+                max_lat REAL,
+                max_lon REAL,
+                split_length REAL NOT NULL,
+                split_indices BLOB NOT NULL,
+                cumulative_distance BLOB NOT NULL,
+                elevation_gain REAL,
+                elevation_loss REAL,
+                split_elevation_changes BLOB,
+                updated_at TEXT NOT NULL,
+                FOREIGN KEY (route_id) REFERENCES saved_routes (id)
+            )
+        ''')
+        
+        # R*Tree over route chunk bounding boxes (see spatial.py)
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS route_spatial_index
+            USING rtree(id, min_lat, max_lat, min_lon, max_lon)
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS route_spatial_chunks (
+                id INTEGER PRIMARY KEY,
+                route_id TEXT NOT NULL,
+                first_point INTEGER NOT NULL,
+                last_point INTEGER NOT NULL,
+                FOREIGN KEY (route_id) REFERENCES saved_routes (id)
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_route_spatial_chunks_route ON route_spatial_chunks (route_id)")
+        
+        # Background jobs and their input files (see jobs.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                progress REAL NOT NULL DEFAULT 0,
+                message TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                error TEXT,
+                run_after REAL NOT NULL DEFAULT 0,
+                result BLOB,
+                result_path TEXT,
+                result_media_type TEXT,
+                result_filename TEXT,
+                created_at TEXT NOT NULL,
+                started_at TEXT,
+                finished_at TEXT,
+                FOREIGN KEY (user_id) REFERENCES users (id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, priority DESC, created_at, id)
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_user_status ON jobs (user_id, status)")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS job_files (
+                job_id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                filename TEXT NOT NULL,
+                content BLOB NOT NULL,
+                PRIMARY KEY (job_id, position),
+                FOREIGN KEY (job_id) REFERENCES jobs (id)
+            )
+        ''')
+        
+        # Sampled and requested request profiles (see profiling.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS request_profiles (
+                id TEXT PRIMARY KEY,
+                method TEXT NOT NULL,
+                route TEXT NOT NULL,
+                path TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                duration_ms REAL NOT NULL,
+                trigger TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                stats BLOB NOT NULL
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_request_profiles_created ON request_profiles (created_at)")
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_request_profiles_route_created ON request_profiles (route, created_at)
+        ''')
+        
+        # Full-text index over route names and descriptions (see fts.py)
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS route_search USING fts5(
+                route_id UNINDEXED,
+                user_id,
+                name,
+                description,
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS saved_routes_search_insert AFTER INSERT ON saved_routes BEGIN
+                INSERT INTO route_search (rowid, route_id, user_id, name, description)
+                VALUES (new.rowid, new.id, new.user_id, new.name, json_extract(new.run_details, '$.description'));
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS saved_routes_search_delete AFTER DELETE ON saved_routes BEGIN
+                DELETE FROM route_search WHERE rowid = old.rowid;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS saved_routes_search_update
+            AFTER UPDATE OF id, user_id, name, run_details ON saved_routes BEGIN
+                DELETE FROM route_search WHERE rowid = old.rowid;
+                INSERT INTO route_search (rowid, route_id, user_id, name, description)
+                VALUES (new.rowid, new.id, new.user_id, new.name, json_extract(new.run_details, '$.description'));
+            END
+        ''')
+        # Routes saved before the index existed
+        cursor.execute('''
+            INSERT INTO route_search (rowid, route_id, user_id, name, description)
+            SELECT rowid, id, user_id, name, json_extract(run_details, '$.description') FROM saved_routes
+            WHERE rowid NOT IN (SELECT rowid FROM route_search)
+        ''')
+        
+        # MinHash signature and LSH buckets per route (see similarity.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS route_signatures (
+                route_id TEXT PRIMARY KEY,
+                signature BLOB NOT NULL,
+                updated_at TEXT NOT NULL,
+                FOREIGN KEY (route_id) REFERENCES saved_routes (id)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS route_lsh (
+                band INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                route_id TEXT NOT NULL,
+                PRIMARY KEY (band, bucket, route_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_route_lsh_route ON route_lsh (route_id)")
+        
+        # Cached elevation/geocoding results per grid cell (see geo_cache.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS geo_cache (
+                kind TEXT NOT NULL,
+                cell_lat INTEGER NOT NULL,
+                cell_lon INTEGER NOT NULL,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (kind, cell_lat, cell_lon)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_geo_cache_last_used ON geo_cache (last_used)")
+        
+        # Cached results keyed by text, e.g. geocoding searches (see geo_cache.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS geo_cache_keys (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (kind, key)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Supports per-user listing and keyset pagination on (created_at, id)
+        cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_saved_routes_user_created
+            ON saved_routes (user_id, created_at, id)
+        ''')
+        
+        conn.commit()
+
+def collect_component_metrics():
+    """Counters kept by the caches, the connection pool and the job queue, read at scrape time"""
+    auth = principal_cache.stats()
+    yield Family("fakerun_auth_cache_lookups_total", "counter", "Principal cache lookups by result",
+                 [({"result": "hit"}, auth["hits"]), ({"result": "miss"}, auth["misses"])])
+    yield Family("fakerun_auth_cache_entries", "gauge", "Principals currently cached", [({}, auth["size"])])
+    geo = geo_cache.stats()
+    yield Family("fakerun_geo_cache_lookups_total", "counter", "Geo cache lookups by kind and result", [
+        ({"kind": kind, "result": result}, counters[key])
+        for kind, counters in sorted(geo["kinds"].items()) for result, key in (("hit", "hits"), ("miss", "misses"))
+    ])
+    pool = db_pool.stats()
+    yield Family("fakerun_db_connections", "gauge", "Pooled database connections by state",
+                 [({"state": "open"}, pool["open"]), ({"state": "in_use"}, pool["in_use"])])
+    yield Family("fakerun_db_checkouts_total", "counter", "Database connection checkouts", [({}, pool["checkouts"])])
+    jobs = job_queue.stats()
+    yield Family("fakerun_jobs_running", "gauge", "Background jobs being run", [({}, jobs["running"])])
+    yield Family("fakerun_jobs_finished_total", "counter", "Background job attempts by outcome", [
+        ({"outcome": outcome}, jobs[outcome]) for outcome in ("completed", "failed", "retried")
+    ])
+
+metrics_registry.add_collector(collect_component_metrics)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus text exposition of the request, database, payload, GPX and cache metrics"""
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -622,7 +2344,14 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+app.add_middleware(RequestMetricsMiddleware, metrics=request_metrics)
+
+# Outermost, so storing a profile does not count towards the request metrics
+app.add_middleware(ProfilingMiddleware, profiler=profiler,
+                   store=lambda *args: run_db(profiler.store, *args))
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
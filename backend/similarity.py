@@ -0,0 +1,127 @@
+"""Near-duplicate detection for saved routes.
+
+A route is described by the set of grid cells (``CELL_DEGREES``, about
+55 m) it passes through, sampled every ``SAMPLE_SPACING_M`` metres so no
+cell is skipped between far apart points. The set is summarized by a
+``NUM_HASHES`` value MinHash signature: the share of equal positions in two
+signatures estimates the Jaccard similarity of the cell sets.
+
+For lookups the signature is cut into ``BANDS`` bands of ``ROWS`` values and
+each band is hashed into a bucket (locality-sensitive hashing). Routes that
+share at least one bucket are candidates; with 32 bands of 4 rows a pair
+with Jaccard 0.5 becomes a candidate 87% of the time, one with 0.7 99% of
+the time, and unrelated routes almost never. Candidates are confirmed with
+the discrete Fréchet distance, which unlike cell overlap also takes the
+order in which the points are visited into account.
+"""
+from typing import Tuple
+
+import numpy as np
+
+from geo import as_coord_array, cumulative_distance
+from spatial import METRES_PER_DEGREE
+
+CELL_DEGREES = 5e-4
+SAMPLE_SPACING_M = 20.0
+MAX_SAMPLES = 20_000
+NUM_HASHES = 128
+BANDS = 32
+ROWS = NUM_HASHES // BANDS
+FRECHET_POINTS = 256
+
+# Fixed seeds so signatures stay comparable across restarts
+_SEEDS = np.random.default_rng(20240601).integers(1, 2 ** 63, size=NUM_HASHES, dtype=np.uint64)
+_ROW_SALTS = np.random.default_rng(20240602).integers(1, 2 ** 63, size=ROWS, dtype=np.uint64)
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+
+def _mix(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer, a cheap well-distributed uint64 hash."""
+    x = (x ^ (x >> np.uint64(30))) * _MIX_1
+    x = (x ^ (x >> np.uint64(27))) * _MIX_2
+    return x ^ (x >> np.uint64(31))
+
+
+def resample(coords: np.ndarray, count: int) -> np.ndarray:
+    """``count`` points evenly spaced by distance along the route."""
+    distance = cumulative_distance(coords)
+    if len(coords) < 2 or distance[-1] == 0:
+        return np.repeat(coords[:1], count, axis=0)
+    at = np.linspace(0.0, distance[-1], count)
+    return np.column_stack([np.interp(at, distance, coords[:, 0]), np.interp(at, distance, coords[:, 1])])
+
+
+def shingles(route_coordinates) -> np.ndarray:
+    """Sorted unique uint64 keys of the grid cells the route passes through."""
+    coords = as_coord_array(route_coordinates)
+    if len(coords) == 0:
+        raise ValueError("Route has no points")
+    length = cumulative_distance(coords)[-1]
+    count = int(min(MAX_SAMPLES, max(len(coords), length // SAMPLE_SPACING_M + 1)))
+    cells = np.floor(resample(coords, count) / CELL_DEGREES).astype(np.int64)
+    keys = (cells[:, 0].astype(np.uint64) << np.uint64(32)) ^ (cells[:, 1].astype(np.uint64) & np.uint64(0xFFFFFFFF))
+    return np.unique(keys)
+
+
+def minhash(keys: np.ndarray) -> np.ndarray:
+    """NUM_HASHES value MinHash signature of a set of uint64 keys."""
+    with np.errstate(over="ignore"):
+        return _mix(keys[None, :] ^ _SEEDS[:, None]).min(axis=1)
+
+
+def signature(route_coordinates) -> np.ndarray:
+    return minhash(shingles(route_coordinates))
+
+
+def band_buckets(sig: np.ndarray) -> np.ndarray:
+    """One signed 64-bit bucket per band, ready to store in SQLite."""
+    bands = sig.reshape(BANDS, ROWS)
+    acc = np.zeros(BANDS, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for row in range(ROWS):
+            acc = _mix(acc ^ bands[:, row] ^ _ROW_SALTS[row])
+    return acc.view(np.int64)
+
+
+def estimate_jaccard(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+
+def discrete_frechet(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Discrete Fréchet distance between two (n, 2) point sequences in a planar
+    metric, computed one anti-diagonal of the coupling table at a time.
+    """
+    n, m = len(a), len(b)
+    d = np.hypot(a[:, None, 0] - b[None, :, 0], a[:, None, 1] - b[None, :, 1])
+    # Padded with an infinite first row and column; the 0 corner seeds cell (1, 1)
+    ca = np.full((n + 1, m + 1), np.inf)
+    ca[0, 0] = 0.0
+    for k in range(2, n + m + 1):
+        i = np.arange(max(1, k - m), min(n, k - 1) + 1)
+        j = k - i
+        best = np.minimum(np.minimum(ca[i - 1, j], ca[i, j - 1]), ca[i - 1, j - 1])
+        ca[i, j] = np.maximum(d[i - 1, j - 1], best)
+    return float(ca[n, m])
+
+
+def frechet_distance(route_a, route_b, points: int = FRECHET_POINTS) -> Tuple[float, bool]:
+    """
+    Fréchet distance in metres between two routes, each resampled to
+    ``points`` points, also trying route_b run in the opposite direction.
+
+    Returns:
+        (distance, reversed): the smaller distance and whether it was the
+        reversed direction.
+    """
+    a = resample(as_coord_array(route_a), points)
+    b = resample(as_coord_array(route_b), points)
+    # Local equirectangular projection around the first route's start
+    origin = a[0]
+    scale = np.array([METRES_PER_DEGREE, METRES_PER_DEGREE * np.cos(np.radians(origin[0]))])
+    a = (a - origin) * scale
+    b = (b - origin) * scale
+    forward = discrete_frechet(a, b)
+    backward = discrete_frechet(a, b[::-1])
+    return (backward, True) if backward < forward else (forward, False)
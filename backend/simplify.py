@@ -0,0 +1,83 @@
+"""Level-of-detail route geometry.
+
+Routes are simplified with Douglas-Peucker on a local equirectangular
+projection, so tolerances are in metres. The recursion is replaced by an
+explicit stack and each step measures all points of its span in one NumPy
+operation.
+"""
+from typing import List, Sequence
+
+import numpy as np
+
+from geo import EARTH_RADIUS_M, as_coord_array
+
+# Tolerance in metres for LOD levels 1..N; level 0 is the original geometry
+LOD_TOLERANCES_M = (2.0, 8.0, 30.0, 120.0)
+
+
+def project_local(coords: np.ndarray) -> np.ndarray:
+    """Project [lat, lon] to metres around the route's mean latitude."""
+    lat = np.radians(coords[:, 0])
+    lon = np.radians(coords[:, 1])
+    x = EARTH_RADIUS_M * lon * np.cos(lat.mean())
+    y = EARTH_RADIUS_M * lat
+    return np.column_stack([x, y])
+
+
+def douglas_peucker_mask(xy: np.ndarray, tolerance: float) -> np.ndarray:
+    """Boolean mask of the points Douglas-Peucker keeps for ``tolerance``."""
+    n = len(xy)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+
+    stack = [(0, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        origin = xy[start]
+        seg = xy[end] - origin
+        pts = xy[start + 1:end] - origin
+        seg_len2 = float(seg @ seg)
+        if seg_len2 == 0.0:
+            dist2 = np.einsum("ij,ij->i", pts, pts)
+        else:
+            # Distance to the segment (not the infinite line) handles loops
+            t = np.clip(pts @ seg / seg_len2, 0.0, 1.0)
+            diff = pts - t[:, None] * seg
+            dist2 = np.einsum("ij,ij->i", diff, diff)
+        i = int(np.argmax(dist2))
+        if dist2[i] > tolerance * tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.append((start, split))
+            stack.append((split, end))
+    return keep
+
+
+def simplify(route_coordinates, tolerance_m: float) -> np.ndarray:
+    """Return the simplified (m, 2) [lat, lon] array for a tolerance in metres."""
+    coords = as_coord_array(route_coordinates)
+    if len(coords) < 3:
+        return coords.copy()
+    return coords[douglas_peucker_mask(project_local(coords), tolerance_m)]
+
+
+def build_lods(route_coordinates, tolerances: Sequence[float] = LOD_TOLERANCES_M) -> List[np.ndarray]:
+    """
+    Simplify a route at every tolerance, coarsest levels last.
+
+    Each level is computed from the previous one, which keeps the levels
+    nested and makes the coarse passes cheap.
+    """
+    current = as_coord_array(route_coordinates)
+    xy = project_local(current) if len(current) else np.empty((0, 2))
+    levels = []
+    for tolerance in sorted(tolerances):
+        if len(current) >= 3:
+            mask = douglas_peucker_mask(xy, tolerance)
+            current, xy = current[mask], xy[mask]
+        levels.append(current)
+    return levels
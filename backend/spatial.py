@@ -0,0 +1,89 @@
+"""Spatial filtering of saved routes.
+
+Each route is cut into chunks of ``CHUNK_POINTS`` points, consecutive chunks
+sharing their boundary point so every segment belongs to exactly one chunk.
+The chunk bounding boxes live in an SQLite R*Tree, so an area query only
+visits the chunks whose box intersects it (logarithmic in the number of
+chunks). The segments of those chunks are then tested exactly:
+
+* ``segments_in_box`` clips every segment against the box (Liang-Barsky);
+* ``segments_near`` measures the point-to-segment distance in a local
+  equirectangular projection, accurate to well under 1% for radii of a few
+  tens of kilometres.
+"""
+import math
+from typing import Tuple
+
+import numpy as np
+
+from geo import EARTH_RADIUS_M
+
+CHUNK_POINTS = 64
+METRES_PER_DEGREE = EARTH_RADIUS_M * math.pi / 180
+
+# (min_lat, max_lat, min_lon, max_lon), the R*Tree column order
+Box = Tuple[float, float, float, float]
+
+
+def chunk_bounds(coords: np.ndarray, chunk: int = CHUNK_POINTS):
+    """
+    Split a route into chunks.
+
+    Returns:
+        (first, last, boxes): inclusive point ranges of each chunk and their
+        (k, 4) bounding boxes as min_lat, max_lat, min_lon, max_lon.
+    """
+    n = len(coords)
+    if n == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty((0, 4))
+    first = np.arange(0, max(n - 1, 1), chunk)
+    last = np.minimum(first + chunk, n - 1)
+    # reduceat covers first[i]..first[i+1]-1, the shared end point is added back
+    low = np.minimum(np.minimum.reduceat(coords[:, :2], first), coords[last, :2])
+    high = np.maximum(np.maximum.reduceat(coords[:, :2], first), coords[last, :2])
+    boxes = np.column_stack([low[:, 0], high[:, 0], low[:, 1], high[:, 1]])
+    return first, last, boxes
+
+
+def radius_box(lat: float, lon: float, radius_m: float) -> Box:
+    """Bounding box of a circle, clamped to valid coordinates."""
+    dlat = radius_m / METRES_PER_DEGREE
+    cos_lat = math.cos(math.radians(lat))
+    dlon = 180.0 if cos_lat < 1e-9 else min(180.0, dlat / cos_lat)
+    return max(-90.0, lat - dlat), min(90.0, lat + dlat), max(-180.0, lon - dlon), min(180.0, lon + dlon)
+
+
+def segments_in_box(coords: np.ndarray, box: Box) -> bool:
+    """Whether any point or segment of the polyline lies in the box."""
+    min_lat, max_lat, min_lon, max_lon = box
+    if len(coords) < 2:
+        return bool(len(coords)) and min_lat <= coords[0, 0] <= max_lat and min_lon <= coords[0, 1] <= max_lon
+    y0, x0 = coords[:-1, 0], coords[:-1, 1]
+    dy, dx = np.diff(coords[:, 0]), np.diff(coords[:, 1])
+    t0 = np.zeros(len(dx))
+    t1 = np.ones(len(dx))
+    inside = np.ones(len(dx), dtype=bool)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for p, q in ((-dx, x0 - min_lon), (dx, max_lon - x0), (-dy, y0 - min_lat), (dy, max_lat - y0)):
+            inside &= ~((p == 0) & (q < 0))
+            ratio = q / p
+            t0 = np.where(p < 0, np.maximum(t0, ratio), t0)
+            t1 = np.where(p > 0, np.minimum(t1, ratio), t1)
+    return bool(np.any(inside & (t0 <= t1)))
+
+
+def segments_near(coords: np.ndarray, lat: float, lon: float, radius_m: float) -> bool:
+    """Whether the polyline passes within radius_m metres of (lat, lon)."""
+    if len(coords) == 0:
+        return False
+    x = (coords[:, 1] - lon) * math.cos(math.radians(lat)) * METRES_PER_DEGREE
+    y = (coords[:, 0] - lat) * METRES_PER_DEGREE
+    if len(coords) == 1:
+        return bool(x[0] ** 2 + y[0] ** 2 <= radius_m ** 2)
+    x0, y0 = x[:-1], y[:-1]
+    dx, dy = np.diff(x), np.diff(y)
+    length2 = dx * dx + dy * dy
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = np.where(length2 > 0, np.clip(-(x0 * dx + y0 * dy) / length2, 0.0, 1.0), 0.0)
+    cx, cy = x0 + t * dx, y0 + t * dy
+    return bool(np.any(cx * cx + cy * cy <= radius_m ** 2))
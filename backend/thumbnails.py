@@ -0,0 +1,74 @@
+"""Server-rendered SVG route thumbnails.
+
+Mirrors the look of the frontend ``RouteThumbnail`` canvas (blue route,
+green start, red finish) but keeps the route's aspect ratio and drops every
+point that would not move the line by at least half a pixel, so a
+thumbnail is a few KB whatever the size of the route.
+"""
+import hashlib
+from typing import Tuple
+
+import numpy as np
+
+from geo import as_coord_array
+from simplify import douglas_peucker_mask, project_local
+
+THUMBNAIL_WIDTH = 216
+THUMBNAIL_HEIGHT = 162
+PADDING = 10
+PIXEL_TOLERANCE = 0.5
+
+ROUTE_COLOR = "#3b82f6"
+START_COLOR = "#22c55e"
+END_COLOR = "#ef4444"
+
+EMPTY_SVG = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="{w}" height="{h}" viewBox="0 0 {w} {h}">'
+    '<rect width="{w}" height="{h}" rx="4" fill="#f3f4f6"/></svg>'
+)
+
+
+def to_pixels(route_coordinates, width: int, height: int, padding: int = PADDING) -> np.ndarray:
+    """Fit the route into the drawing area, preserving aspect ratio (y grows downwards)."""
+    xy = project_local(as_coord_array(route_coordinates))
+    mins = xy.min(axis=0)
+    span = np.maximum(xy.max(axis=0) - mins, 1e-9)
+    draw = np.array([width - 2 * padding, height - 2 * padding], dtype=np.float64)
+    scale = float(np.min(draw / span))
+    offset = padding + (draw - span * scale) / 2
+    px = (xy - mins) * scale + offset
+    px[:, 1] = height - px[:, 1]
+    return px
+
+
+def render_svg(route_coordinates, width: int = THUMBNAIL_WIDTH, height: int = THUMBNAIL_HEIGHT) -> str:
+    """Render a route as a standalone SVG document."""
+    if len(route_coordinates) == 0:
+        return EMPTY_SVG.format(w=width, h=height)
+
+    px = to_pixels(route_coordinates, width, height)
+    px = px[douglas_peucker_mask(px, PIXEL_TOLERANCE)]
+    points = " ".join(f"{x:.1f},{y:.1f}" for x, y in px.tolist())
+    start, end = px[0], px[-1]
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="0 0 {width} {height}">',
+        f'<polyline points="{points}" fill="none" stroke="{ROUTE_COLOR}" stroke-width="3" '
+        f'stroke-linecap="round" stroke-linejoin="round"/>',
+        f'<circle cx="{start[0]:.1f}" cy="{start[1]:.1f}" r="4" fill="{START_COLOR}"/>',
+    ]
+    if len(px) > 1:
+        parts.append(f'<circle cx="{end[0]:.1f}" cy="{end[1]:.1f}" r="4" fill="{END_COLOR}"/>')
+    parts.append("</svg>")
+    return "".join(parts)
+
+
+def render_thumbnail(route_coordinates) -> Tuple[str, str]:
+    """Return (svg, etag) where the etag is a strong content hash."""
+    svg = render_svg(route_coordinates)
+    return svg, content_etag(svg.encode("utf-8"))
+
+
+def content_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
@@ -0,0 +1,130 @@
+"""
+Per-trackpoint timeline synthesis for generated runs.
+
+Given a route and its RunDetails, compute a timestamp, heart rate and
+elevation for every point. Cumulative distance is computed once, every
+point is mapped to its km (or mile) split, and the per-split values from
+``km_paces``, ``km_heart_rates`` and ``km_elevation_changes`` are applied
+with array operations, so cost stays linear and in NumPy.
+"""
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from geo import as_coord_array, cumulative_distance, split_index, split_length_for_unit
+
+DEFAULT_PACE_SECONDS = 360.0  # 6:00 per split
+DEFAULT_START_TIME = "08:00"
+
+
+class Timeline(NamedTuple):
+    distance: np.ndarray              # metres from start, float64
+    times: np.ndarray                 # datetime64[ms]
+    elevation: np.ndarray             # metres, float64
+    heart_rate: Optional[np.ndarray]  # bpm, int64, or None when HR is disabled
+
+
+def parse_pace(value) -> Optional[float]:
+    """
+    Parse a pace into seconds per split.
+
+    Accepts "M:SS" strings (as shown in the UI) and decimal minutes, either
+    as numbers or numeric strings (as kept in the frontend state).
+    """
+    if value is None:
+        return None
+    try:
+        if isinstance(value, str) and ":" in value:
+            minutes, seconds = value.split(":", 1)
+            total = int(minutes) * 60 + float(seconds)
+        else:
+            total = float(value) * 60
+    except (TypeError, ValueError):
+        return None
+    return total if total > 0 else None
+
+
+def parse_start(date: Optional[str], start_time: Optional[str]) -> np.datetime64:
+    """Combine RunDetails.date (YYYY-MM-DD) and start_time (HH:MM) into a timestamp."""
+    day = date or datetime.utcnow().date().isoformat()
+    try:
+        start = datetime.fromisoformat(f"{day[:10]}T{start_time or DEFAULT_START_TIME}")
+    except ValueError:
+        start = datetime.fromisoformat(f"{day[:10]}T{DEFAULT_START_TIME}")
+    return np.datetime64(start, "ms")
+
+
+def _split_paces(run_details, total_distance: float, split_length: float) -> np.ndarray:
+    """Seconds per split for every configured split, falling back to the overall pace."""
+    base = parse_pace(run_details.pace)
+    if base is None and run_details.duration and total_distance > 0:
+        # RunDetails.duration is expressed in minutes
+        base = run_details.duration * 60 / (total_distance / split_length)
+    if base is None:
+        base = DEFAULT_PACE_SECONDS
+
+    km_paces: List = run_details.km_paces or []
+    if not km_paces:
+        return np.array([base])
+    paces = np.array([parse_pace(p) or np.nan for p in km_paces], dtype=np.float64)
+    paces[np.isnan(paces)] = base
+    return paces
+
+
+def _elevation(run_details, idx: np.ndarray, cum: np.ndarray, split_length: float,
+               base_elevation: float) -> np.ndarray:
+    changes = np.asarray(run_details.km_elevation_changes or [], dtype=np.float64)
+    if changes.size == 0:
+        return np.full(len(cum), base_elevation, dtype=np.float64)
+    idx = np.minimum(idx, changes.size - 1)
+    # Elevation reached at the start of each split, then interpolate within it
+    start_of_split = np.concatenate(([0.0], np.cumsum(changes)[:-1]))
+    frac = np.clip((cum - idx * split_length) / split_length, 0.0, 1.0)
+    return base_elevation + start_of_split[idx] + frac * changes[idx]
+
+
+def _heart_rate(run_details, idx: np.ndarray) -> Optional[np.ndarray]:
+    km_heart_rates = run_details.km_heart_rates or []
+    if km_heart_rates:
+        rates = np.asarray(km_heart_rates, dtype=np.int64)
+        return rates[np.minimum(idx, rates.size - 1)]
+    if run_details.heart_rate_enabled and run_details.avg_heart_rate:
+        return np.full(len(idx), int(run_details.avg_heart_rate), dtype=np.int64)
+    return None
+
+
+def synthesize_timeline(route_coordinates, run_details, base_elevation: float = 0.0) -> Timeline:
+    """
+    Compute time, elevation and heart rate for every point of a route.
+
+    Args:
+        route_coordinates: [lat, lon] pairs (list or (n, 2) array).
+        run_details: RunDetails (pace, km_paces, km_heart_rates,
+            km_elevation_changes, date, start_time, distance_unit).
+        base_elevation: Elevation in metres assigned to the first point.
+
+    Returns:
+        A Timeline of arrays aligned with the input points.
+    """
+    coords = as_coord_array(route_coordinates)
+    split_length = split_length_for_unit(run_details.distance_unit)
+    cum = cumulative_distance(coords)
+    total = float(cum[-1]) if len(cum) else 0.0
+
+    paces = _split_paces(run_details, total, split_length)
+    point_split = split_index(cum, split_length)
+
+    # Each segment is run at the pace of the split its first point lies in
+    offsets = np.zeros(len(cum), dtype=np.float64)
+    if len(cum) > 1:
+        seg_pace = paces[np.minimum(point_split[:-1], paces.size - 1)]
+        np.cumsum(np.diff(cum) * seg_pace / split_length, out=offsets[1:])
+    times = parse_start(run_details.date, run_details.start_time) + (offsets * 1000).astype("timedelta64[ms]")
+
+    return Timeline(
+        distance=cum,
+        times=times,
+        elevation=_elevation(run_details, point_split, cum, split_length, base_elevation),
+        heart_rate=_heart_rate(run_details, point_split),
+    )
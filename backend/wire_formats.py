@@ -0,0 +1,128 @@
+"""Compact wire formats for route coordinates.
+
+Besides the default JSON ``[[lat, lon], ...]`` the API speaks:
+
+* Google encoded polyline (precision 1e-5), either as the ``coordinates``
+  value of a JSON body or, for responses, when the client sends
+  ``Accept: application/vnd.fakerun.polyline+json``.
+* Raw little-endian float32 ``lat, lon`` pairs
+  (``application/vnd.fakerun.coords+f32``), 8 bytes per point.
+
+Encoding, decoding and validation are done on whole NumPy arrays.
+"""
+from typing import Optional
+
+import numpy as np
+
+JSON_MEDIA_TYPE = "application/json"
+POLYLINE_MEDIA_TYPE = "application/vnd.fakerun.polyline+json"
+FLOAT32_MEDIA_TYPE = "application/vnd.fakerun.coords+f32"
+
+POLYLINE_PRECISION = 5
+
+# 32-bit zigzag values need at most 7 five-bit chunks
+_MAX_CHUNKS = 7
+_SHIFTS = 5 * np.arange(_MAX_CHUNKS, dtype=np.int64)
+
+
+class CoordinateFormatError(ValueError):
+    """Raised when a coordinate payload is malformed or out of range."""
+
+
+def validate_coordinates(coords: np.ndarray) -> np.ndarray:
+    """
+    Check an array of points in one pass: shape (n, >=2), finite, lat/lon in range.
+
+    Returns the array as float64.
+    """
+    try:
+        coords = np.asarray(coords, dtype=np.float64)
+    except (TypeError, ValueError) as e:
+        raise CoordinateFormatError("Coordinates must be a list of [lat, lon] number pairs") from e
+    if coords.size == 0:
+        return coords.reshape(0, 2)
+    if coords.ndim != 2 or coords.shape[1] < 2:
+        raise CoordinateFormatError("Coordinates must be a list of [lat, lon] number pairs")
+    if not np.isfinite(coords).all():
+        raise CoordinateFormatError("Coordinates must be finite numbers")
+    if np.abs(coords[:, 0]).max() > 90 or np.abs(coords[:, 1]).max() > 180:
+        raise CoordinateFormatError("Latitude must be within ±90 and longitude within ±180")
+    return coords
+
+
+def encode_polyline(route_coordinates, precision: int = POLYLINE_PRECISION) -> str:
+    """Encode [lat, lon] pairs as a Google encoded polyline string."""
+    coords = np.asarray(route_coordinates, dtype=np.float64)
+    if coords.size == 0:
+        return ""
+    quantized = np.rint(coords[:, :2] * 10 ** precision).astype(np.int64)
+    deltas = np.diff(quantized, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = (deltas << 1) ^ (deltas >> 63)  # zigzag
+
+    chunks = (values[:, None] >> _SHIFTS) & 0x1F
+    # Number of 5-bit chunks each value needs (at least one)
+    bit_length = np.floor(np.log2(np.maximum(values, 1))).astype(np.int64) + 1
+    counts = np.maximum(1, (bit_length + 4) // 5)
+    used = np.arange(_MAX_CHUNKS) < counts[:, None]
+    continued = np.arange(_MAX_CHUNKS) < (counts - 1)[:, None]
+    chars = chunks + np.where(continued, 0x20, 0) + 63
+    return chars[used].astype(np.uint8).tobytes().decode("ascii")
+
+
+def decode_polyline(polyline: str, precision: int = POLYLINE_PRECISION) -> np.ndarray:
+    """Decode a Google encoded polyline into an (n, 2) float64 array."""
+    if not polyline:
+        return np.empty((0, 2), dtype=np.float64)
+    try:
+        raw = np.frombuffer(polyline.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    except UnicodeEncodeError as e:
+        raise CoordinateFormatError("Encoded polyline must be ASCII") from e
+    if raw.min() < 0 or raw.max() > 63:
+        raise CoordinateFormatError("Invalid character in encoded polyline")
+
+    is_last = (raw & 0x20) == 0
+    if not is_last[-1]:
+        raise CoordinateFormatError("Truncated encoded polyline")
+    ends = np.flatnonzero(is_last)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    lengths = ends - starts + 1
+    if lengths.max() > _MAX_CHUNKS or len(ends) % 2:
+        raise CoordinateFormatError("Malformed encoded polyline")
+
+    position = np.arange(len(raw)) - np.repeat(starts, lengths)
+    values = np.add.reduceat((raw & 0x1F) << (5 * position), starts)
+    deltas = (values >> 1) ^ -(values & 1)  # un-zigzag
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / 10 ** precision
+
+
+def encode_float32(route_coordinates) -> bytes:
+    """Pack [lat, lon] pairs as little-endian float32."""
+    coords = np.asarray(route_coordinates, dtype=np.float64)
+    if coords.size == 0:
+        return b""
+    return np.ascontiguousarray(coords[:, :2], dtype="<f4").tobytes()
+
+
+def decode_float32(body: bytes) -> np.ndarray:
+    """Unpack a little-endian float32 body into an (n, 2) float64 array."""
+    if len(body) % 8:
+        raise CoordinateFormatError("Binary coordinates must be a whole number of float32 pairs")
+    return np.frombuffer(body, dtype="<f4").astype(np.float64).reshape(-1, 2)
+
+
+def negotiate(accept: Optional[str], allow_binary: bool = True) -> str:
+    """
+    Pick the response media type from an Accept header, JSON by default.
+
+    Only exact media types are honoured; quality values are ignored and
+    wildcards fall back to JSON.
+    """
+    if not accept:
+        return JSON_MEDIA_TYPE
+    offered = [part.split(";")[0].strip().lower() for part in accept.split(",")]
+    for media_type in offered:
+        if media_type == POLYLINE_MEDIA_TYPE:
+            return POLYLINE_MEDIA_TYPE
+        if media_type == FLOAT32_MEDIA_TYPE and allow_binary:
+            return FLOAT32_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
@@ -0,0 +1,67 @@
+"""Streaming ZIP archives.
+
+``zipfile`` can write to a non-seekable file object: every member then gets
+a data descriptor after its compressed data instead of sizes patched into
+the local header. :func:`iter_zip` writes into an in-memory sink and hands
+out whatever the compressor produced after every member chunk, so only a
+chunk or so of the archive is ever held in memory.
+"""
+import zipfile
+from typing import Iterable, Iterator, Tuple
+
+# (archive name, (year, month, day, hour, minute, second), body chunks)
+ZipEntry = Tuple[str, Tuple[int, int, int, int, int, int], Iterable[bytes]]
+
+
+class _ChunkSink:
+    """Write-only file object collecting what zipfile writes until drained."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_zip(entries: Iterable[ZipEntry], compression: int = zipfile.ZIP_DEFLATED,
+             compresslevel: int = 6) -> Iterator[bytes]:
+    """Yield a ZIP archive of ``entries`` piece by piece, members are consumed lazily."""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=compression, compresslevel=compresslevel) as archive:
+        for name, date_time, chunks in entries:
+            info = zipfile.ZipInfo(name, date_time=date_time)
+            info.compress_type = compression
+            info.external_attr = 0o644 << 16
+            with archive.open(info, "w") as member:
+                for chunk in chunks:
+                    member.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+
+def unique_name(name: str, used: set) -> str:
+    """Return ``name`` or ``stem (n).ext`` so archive members do not collide."""
+    candidate = name
+    stem, dot, ext = name.rpartition(".")
+    if not dot:
+        stem, ext = name, ""
+    n = 2
+    while candidate in used:
+        candidate = f"{stem} ({n}){dot}{ext}"
+        n += 1
+    used.add(candidate)
+    return candidate
@@ -0,0 +1,65 @@
+"""
+Compare saved_routes storage as JSON text vs. packed BLOBs (coord_codec):
+database file size and time to decode every row. Run from the repository
+root:
+
+    python benchmarks/bench_coord_storage.py [routes] [points_per_route]
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from coord_codec import decode_stored, pack_coordinates  # noqa: E402
+
+
+def make_route(rng, n):
+    steps = rng.normal(scale=2e-5, size=(n, 2))
+    return (np.array([44.8, 20.46]) + np.cumsum(steps, axis=0)).tolist()
+
+
+def build(path, routes, encode):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE saved_routes (id INTEGER PRIMARY KEY, coordinates TEXT NOT NULL)")
+    conn.executemany("INSERT INTO saved_routes (coordinates) VALUES (?)", ((encode(r),) for r in routes))
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    return os.path.getsize(path)
+
+
+def list_all(path, decode):
+    conn = sqlite3.connect(path)
+    start = time.perf_counter()
+    points = sum(len(decode(row[0])) for row in conn.execute("SELECT coordinates FROM saved_routes"))
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return points, elapsed
+
+
+def main(n_routes=200, n_points=5000):
+    rng = np.random.default_rng(1)
+    routes = [make_route(rng, n_points) for _ in range(n_routes)]
+    with tempfile.TemporaryDirectory() as tmp:
+        variants = [
+            ("json", json.dumps, json.loads),
+            ("packed", pack_coordinates, decode_stored),
+        ]
+        print(f"{n_routes} routes x {n_points} points")
+        print(f"{'format':>8} {'file MB':>8} {'B/point':>8} {'list s':>8}")
+        for name, encode, decode in variants:
+            path = os.path.join(tmp, f"{name}.db")
+            size = build(path, routes, encode)
+            points, elapsed = list_all(path, decode)
+            print(f"{name:>8} {size / 1e6:>8.2f} {size / points:>8.1f} {elapsed:>8.3f}")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:3]))
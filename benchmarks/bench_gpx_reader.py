@@ -0,0 +1,79 @@
+"""
+Benchmark GPX upload parsing: gpxpy (full object tree) vs. the incremental
+expat reader in gpx_reader. Each parser runs in a fresh process so peak RSS
+is comparable. Run from the repository root:
+
+    python benchmarks/bench_gpx_reader.py [size_mb ...]
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Roughly the size of one Garmin-style trkpt with elevation and time
+POINT = '<trkpt lat="{lat:.7f}" lon="{lon:.7f}"><ele>{ele:.1f}</ele><time>2026-05-29T07:30:00Z</time></trkpt>\n'
+
+
+def write_gpx(path, size_mb):
+    target = size_mb * 1024 * 1024
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<gpx version="1.1" creator="bench" xmlns="http://www.topografix.com/GPX/1/1">\n'
+                '<metadata><name>Bench</name></metadata><trk><trkseg>\n')
+        i = 0
+        while f.tell() < target:
+            f.write("".join(POINT.format(lat=45 + (i + k) * 1e-6, lon=19 + (i + k) * 1e-6, ele=100.0)
+                            for k in range(1000)))
+            i += 1000
+        f.write("</trkseg></trk></gpx>\n")
+    return i
+
+
+def run_gpxpy(path):
+    import gpxpy
+    with open(path, "rb") as f:
+        gpx = gpxpy.parse(f.read().decode("utf-8"))
+    coords = [[p.latitude, p.longitude] for t in gpx.tracks for s in t.segments for p in s.points]
+    return len(coords)
+
+
+def run_stream(path):
+    from gpx_reader import read_gpx_track
+    with open(path, "rb") as f:
+        coords, _ = read_gpx_track(f)
+    return len(coords)
+
+
+def child(method, path):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    points = {"gpxpy": run_gpxpy, "stream": run_stream}[method](path)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline
+    print(f"{points} {elapsed:.3f} {peak / 1024:.1f}")
+
+
+def main(sizes):
+    print(f"{'file MB':>8} {'points':>9} {'parser':>7} {'seconds':>8} {'peak MB':>8}")
+    for size_mb in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.gpx")
+            write_gpx(path, size_mb)
+            for method in ("gpxpy", "stream"):
+                out = subprocess.run([sys.executable, __file__, "--child", method, path],
+                                     capture_output=True, text=True, check=True).stdout.split()
+                points, elapsed, peak = out
+                print(f"{size_mb:>8} {points:>9} {method:>7} {elapsed:>8} {peak:>8}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main([int(a) for a in sys.argv[1:]] or [10, 100])
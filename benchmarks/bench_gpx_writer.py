@@ -0,0 +1,56 @@
+"""
+Benchmark GPX generation: repeated string concatenation vs. the chunked
+generator in gpx_writer. Run from the repository root:
+
+    python benchmarks/bench_gpx_writer.py
+"""
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from gpx_writer import iter_gpx, render_header, GPX_FOOTER  # noqa: E402
+
+
+class Details:
+    route_name = "Benchmark Ultra"
+    distance = 160.0
+    duration = 1440
+
+
+def concat_gpx(coords, run_details):
+    """The previous implementation: build the document with +="""
+    gpx_content = render_header(run_details)
+    for coord in coords:
+        gpx_content += f'      <trkpt lat="{coord[0]}" lon="{coord[1]}"></trkpt>\n'
+    gpx_content += GPX_FOOTER
+    return gpx_content
+
+
+def stream_gpx(coords, run_details):
+    """Consume the generator chunk by chunk without keeping the document"""
+    size = 0
+    for chunk in iter_gpx(coords, run_details):
+        size += len(chunk)
+    return size
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def main():
+    details = Details()
+    print(f"{'points':>8} {'concat s':>10} {'stream s':>10} {'stream ns/pt':>13}")
+    for n in (25_000, 50_000, 100_000, 200_000, 400_000):
+        coords = [[45.0 + i * 1e-5, 19.0 + i * 1e-5] for i in range(n)]
+        t_concat = timed(concat_gpx, coords, details)
+        t_stream = timed(stream_gpx, coords, details)
+        print(f"{n:>8} {t_concat:>10.3f} {t_stream:>10.3f} {t_stream / n * 1e9:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
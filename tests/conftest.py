@@ -0,0 +1,60 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# The backend is run from its own directory (``uvicorn server:app``), so its
+# modules import each other as top-level modules.
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Never touch the checked-in fakerun.db from the test suite
+os.environ.setdefault("FAKERUN_DB_PATH", os.path.join(tempfile.mkdtemp(), "test_fakerun.db"))
+
+# Shared helpers for the API tests, imported after the path and database setup above
+import unittest  # noqa: E402
+import uuid  # noqa: E402
+from datetime import datetime  # noqa: E402
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import server  # noqa: E402
+
+# Run details a saved route needs, override route_name etc. per test
+SAMPLE_RUN_DETAILS = dict(distance=5, duration=25, pace="5:00", calories=300, route_name="Test route")
+SAMPLE_COORDS = [[44.8, 20.46], [44.81, 20.47], [44.82, 20.46]]
+
+
+def sample_run_details(**overrides) -> dict:
+    return dict(SAMPLE_RUN_DETAILS, **overrides)
+
+
+def create_user(password_hash: str = "x", email: str = None) -> str:
+    """Insert an active user straight into the database, returns its id."""
+    user_id = str(uuid.uuid4())
+    server.insert_user(user_id, email or f"{user_id[:8]}@example.com", f"user-{user_id[:8]}", password_hash,
+                       datetime.utcnow().isoformat())
+    return user_id
+
+
+def auth_headers(user_id: str) -> dict:
+    return {"Authorization": f"Bearer {server.create_access_token({'sub': user_id})}"}
+
+
+class ApiTestCase(unittest.TestCase):
+    """Runs the app in a TestClient (startup included) with a fresh signed-in user in ``self.headers``."""
+
+    def setUp(self):
+        self.client = TestClient(server.app)
+        self.client.__enter__()
+        self.addCleanup(self.client.__exit__, None, None, None)
+        self.user_id = create_user()
+        self.headers = auth_headers(self.user_id)
+
+    def new_user_headers(self) -> dict:
+        return auth_headers(create_user())
+
+    def save_route(self, coordinates=SAMPLE_COORDS, headers=None, params=None, **details):
+        """POST /api/routes with sample run details, returns the response."""
+        return self.client.post("/api/routes", params=params, headers=headers or self.headers,
+                                json={"coordinates": coordinates, "runDetails": sample_run_details(**details)})
@@ -0,0 +1,80 @@
+import asyncio
+import unittest
+from unittest import mock
+
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+import server
+from auth_cache import PrincipalCache
+from tests.conftest import create_user
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestPrincipalCache(unittest.TestCase):
+
+    def test_ttl(self):
+        clock = FakeClock()
+        cache = PrincipalCache(maxsize=4, ttl=10, clock=clock)
+        cache.put("u1", "alice")
+        self.assertEqual(cache.get("u1"), "alice")
+        clock.now = 10
+        self.assertIsNone(cache.get("u1"))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_lru_eviction(self):
+        cache = PrincipalCache(maxsize=2, ttl=60)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")  # "b" is now least recently used
+        cache.put("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_invalidate(self):
+        cache = PrincipalCache()
+        cache.put("a", 1)
+        cache.invalidate("a")
+        self.assertIsNone(cache.get("a"))
+
+
+class TestGetCurrentUser(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        server.init_database()
+
+    def setUp(self):
+        server.principal_cache.clear()
+        self.user_id = create_user("not-a-real-hash")
+        token = server.create_access_token({"sub": self.user_id})
+        self.credentials = HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+    def current_user(self):
+        return asyncio.run(server.get_current_user(self.credentials))
+
+    def test_hot_path_skips_database(self):
+        with mock.patch.object(server, "get_user_by_id", wraps=server.get_user_by_id) as lookup:
+            first = self.current_user()
+            second = self.current_user()
+        self.assertEqual(first, second)
+        self.assertEqual(lookup.call_count, 1)
+
+    def test_deactivation_invalidates(self):
+        self.current_user()
+        server.set_user_active(self.user_id, False)
+        with self.assertRaises(HTTPException) as ctx:
+            self.current_user()
+        self.assertEqual(ctx.exception.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,73 @@
+import asyncio
+import time
+import unittest
+
+import httpx
+
+import passwords
+import server
+from executors import shutdown_executors
+from tests.conftest import auth_headers, create_user
+
+LOGINS = 50
+
+
+def p99(samples):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+
+
+class TestEventLoopIsNotBlocked(unittest.TestCase):
+    """bcrypt and SQLite work must not stall unrelated requests"""
+
+    @classmethod
+    def setUpClass(cls):
+        server.init_database()
+        # Cheaper rounds keep the test short; each verify still takes tens of ms
+        hashed = passwords.pwd_context.using(bcrypt__rounds=10).hash("secret")
+        cls.user_id = create_user(hashed)
+        cls.email = server.get_user_by_id(cls.user_id)["email"]
+        cls.headers = auth_headers(cls.user_id)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutdown_executors()
+
+    async def _scenario(self):
+        transport = httpx.ASGITransport(app=server.app)
+        headers = self.headers
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+
+            async def timed_routes():
+                start = time.perf_counter()
+                response = await client.get("/api/routes", headers=headers)
+                self.assertEqual(response.status_code, 200)
+                return time.perf_counter() - start
+
+            # Warm up the worker pools, then measure an idle baseline
+            await client.post("/api/auth/login", json={"email": self.email, "password": "secret"})
+            baseline = [await timed_routes() for _ in range(30)]
+
+            logins = [
+                asyncio.create_task(client.post("/api/auth/login",
+                                                json={"email": self.email, "password": "secret"}))
+                for _ in range(LOGINS)
+            ]
+            loaded = []
+            while not all(task.done() for task in logins) or len(loaded) < 30:
+                loaded.append(await timed_routes())
+                await asyncio.sleep(0.005)
+            responses = await asyncio.gather(*logins)
+        return baseline, loaded, responses
+
+    def test_routes_latency_flat_during_logins(self):
+        baseline, loaded, responses = asyncio.run(self._scenario())
+        self.assertTrue(all(r.status_code == 200 for r in responses))
+        # If verification ran on the loop, requests would queue behind
+        # LOGINS bcrypt calls and take seconds
+        self.assertLess(p99(loaded), max(10 * p99(baseline), 0.05),
+                        f"p99 idle {p99(baseline) * 1000:.1f} ms, under load {p99(loaded) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    unittest.main()
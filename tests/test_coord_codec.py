@@ -0,0 +1,84 @@
+import json
+import unittest
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+import server
+from coord_codec import (FLAG_DELTA, FORMAT_VERSION, HEADER, load_coordinates, pack_coordinates,
+                         unpack_coordinates, encode_for_storage)
+
+
+def loop_route(n):
+    t = np.linspace(0, 2 * np.pi, n)
+    return np.column_stack([44.8 + 0.01 * np.sin(t), 20.46 + 0.01 * np.cos(t)]).tolist()
+
+
+class TestCoordCodec(unittest.TestCase):
+
+    def test_roundtrip_precision(self):
+        coords = loop_route(1000)
+        decoded = unpack_coordinates(pack_coordinates(coords))
+        self.assertEqual(decoded.shape, (1000, 2))
+        self.assertLessEqual(np.abs(decoded - np.array(coords)).max(), 0.5e-7 + 1e-12)
+
+    def test_much_smaller_than_json(self):
+        coords = loop_route(5000)
+        self.assertLess(len(pack_coordinates(coords)) * 5, len(json.dumps(coords)))
+
+    def test_header(self):
+        version, flags, n = HEADER.unpack_from(pack_coordinates([[1.0, 2.0], [1.5, 2.5]]))
+        self.assertEqual((version, n), (FORMAT_VERSION, 2))
+        self.assertTrue(flags & FLAG_DELTA)
+
+    def test_antimeridian_and_empty(self):
+        coords = [[10.0, -179.9999999], [10.0, 179.9999999], [-89.9, 0.0]]
+        np.testing.assert_allclose(unpack_coordinates(pack_coordinates(coords)), coords, atol=1e-7)
+        self.assertEqual(unpack_coordinates(pack_coordinates([])).shape, (0, 2))
+
+    def test_out_of_range(self):
+        """Values beyond int32 quantization are rejected instead of wrapping"""
+        with self.assertRaises(ValueError):
+            pack_coordinates([[300.0, 20.0]])
+        with self.assertRaises(ValueError):
+            pack_coordinates([[44.0, 20.0], [44.0, -300.0]])
+
+    def test_fallback_and_legacy(self):
+        self.assertIsInstance(encode_for_storage([[1.0, 2.0, 3.0]]), str)
+        self.assertEqual(load_coordinates("[[1.0, 2.0]]"), [[1.0, 2.0]])
+
+    def test_unknown_version(self):
+        blob = bytearray(pack_coordinates([[1.0, 2.0]]))
+        blob[0] = 99
+        with self.assertRaises(ValueError):
+            unpack_coordinates(bytes(blob))
+
+
+class TestCoordinateMigration(unittest.TestCase):
+
+    def test_migrates_legacy_rows(self):
+        server.init_database()
+        coords = loop_route(50)
+        ids = [str(uuid.uuid4()) for _ in range(3)]
+        with server.get_db_connection() as conn:
+            for route_id, value in zip(ids, [json.dumps(coords), json.dumps(coords), json.dumps([[1, 2, 3]])]):
+                conn.execute(
+                    "INSERT INTO saved_routes (id, name, coordinates, run_details, created_at, user_id) "
+                    "VALUES (?, 'legacy', ?, '{}', ?, 'migration-user')",
+                    (route_id, value, datetime.utcnow().isoformat())
+                )
+            conn.commit()
+
+        self.assertGreaterEqual(server.migrate_route_coordinates(batch_size=1), 2)
+
+        with server.get_db_connection() as conn:
+            rows = {r["id"]: r["coordinates"] for r in conn.execute(
+                "SELECT id, coordinates FROM saved_routes WHERE user_id = 'migration-user'")}
+        self.assertIsInstance(rows[ids[0]], bytes)
+        self.assertIsInstance(rows[ids[2]], str)
+        np.testing.assert_allclose(load_coordinates(rows[ids[1]]), coords, atol=1e-7)
+
+
+if __name__ == "__main__":
+    unittest.main()
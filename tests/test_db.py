@@ -0,0 +1,69 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from db import ConnectionPool, PoolTimeoutError
+
+
+class TestConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(os.path.join(self.tmp.name, "pool.db"), size=2, timeout=0.2,
+                                   mmap_size=1 << 20, cache_size=-2000)
+
+    def tearDown(self):
+        self.pool.close_all()
+        self.tmp.cleanup()
+
+    def test_pragmas(self):
+        with self.pool.connection() as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+            self.assertEqual(conn.execute("PRAGMA cache_size").fetchone()[0], -2000)
+
+    def test_connections_are_reused(self):
+        with self.pool.connection() as first:
+            pass
+        with self.pool.connection() as second:
+            self.assertIs(first, second)
+        self.assertEqual(self.pool.stats()["open"], 1)
+        self.assertEqual(self.pool.stats()["checkouts"], 2)
+
+    def test_bounded_size(self):
+        a = self.pool.acquire()
+        b = self.pool.acquire()
+        with self.assertRaises(PoolTimeoutError):
+            self.pool.acquire()
+        self.pool.release(a)
+        self.pool.release(b)
+        self.assertEqual(self.pool.stats()["in_use"], 0)
+
+    def test_uncommitted_work_is_rolled_back(self):
+        with self.pool.connection() as conn:
+            conn.execute("CREATE TABLE t (x INTEGER)")
+            conn.commit()
+        with self.assertRaises(ValueError):
+            with self.pool.connection() as conn:
+                conn.execute("INSERT INTO t VALUES (1)")
+                raise ValueError("boom")
+        with self.pool.connection() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM t").fetchone()[0], 0)
+
+    def test_waiter_gets_released_connection(self):
+        self.pool.timeout = 2
+        held = [self.pool.acquire(), self.pool.acquire()]
+        got = []
+        waiter = threading.Thread(target=lambda: got.append(self.pool.acquire()))
+        waiter.start()
+        self.pool.release(held.pop())
+        waiter.join(2)
+        self.assertEqual(len(got), 1)
+        self.assertGreater(self.pool.stats()["max_checkout_ms"], 0)
+        self.pool.release(got[0])
+        self.pool.release(held.pop())
+
+
+if __name__ == "__main__":
+    unittest.main()
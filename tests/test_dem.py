@@ -0,0 +1,104 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import server
+from dem import VOID, DemTiles, tile_name
+
+SIZE = 11  # 0.1 degree between samples
+
+
+def write_tile(directory, lat_floor, lon_floor, data):
+    data.astype(">i2").tofile(Path(directory) / tile_name(lat_floor, lon_floor))
+
+
+def ramp():
+    """Elevation = 100 * row + col, row 0 being the northern edge."""
+    rows, cols = np.mgrid[0:SIZE, 0:SIZE]
+    return 100 * rows + cols
+
+
+class TestDemTiles(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        write_tile(self.tmp.name, 44, 20, ramp())
+        self.tiles = DemTiles(self.tmp.name, max_open=2)
+
+    def tearDown(self):
+        self.tiles.clear()
+        self.tmp.cleanup()
+
+    def test_tile_name(self):
+        self.assertEqual(tile_name(44, 20), "N44E020.hgt")
+        self.assertEqual(tile_name(-1, -75), "S01W075.hgt")
+
+    def test_corners_and_bilinear(self):
+        elevations = self.tiles.lookup([
+            [44.0, 20.0],     # south-west corner, last row
+            [44.9, 20.9],     # row 1, col 9
+            [44.95, 20.05],   # between rows 0-1 and cols 0-1
+            [44.5, 20.25],    # row 5, between cols 2 and 3
+        ])
+        np.testing.assert_allclose(elevations, [1000, 109, 50.5, 502.5])
+
+    def test_missing_tile_and_void(self):
+        data = ramp()
+        data[0, 0] = VOID
+        write_tile(self.tmp.name, 10, 10, data)
+        elevations = self.tiles.lookup([[10.99, 10.01], [10.5, 10.5], [0.5, 0.5]])
+        self.assertTrue(np.isnan(elevations[0]))
+        self.assertEqual(elevations[1], 505)
+        self.assertTrue(np.isnan(elevations[2]))
+
+    def test_lru(self):
+        write_tile(self.tmp.name, 1, 1, ramp())
+        write_tile(self.tmp.name, 2, 2, ramp())
+        for point in [[44.5, 20.5], [44.6, 20.6], [1.5, 1.5], [2.5, 2.5], [44.5, 20.5]]:
+            self.tiles.lookup([point])
+        stats = self.tiles.stats()
+        # The third distinct tile evicts N44E020, which then has to be mapped again
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"]), (1, 4, 2))
+
+    def test_tile_added_later(self):
+        self.assertTrue(np.isnan(self.tiles.lookup([[10.5, 10.5]])[0]))
+        write_tile(self.tmp.name, 10, 10, ramp())
+        self.assertEqual(self.tiles.lookup([[10.5, 10.5]])[0], 505)
+
+    def test_rejects_non_square_file(self):
+        (Path(self.tmp.name) / tile_name(5, 5)).write_bytes(b"\x00" * 6)
+        with self.assertRaises(ValueError):
+            self.tiles.lookup([[5.5, 5.5]])
+
+
+class TestElevationEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        write_tile(self.tmp.name, 44, 20, ramp())
+        self.patch = mock.patch.object(server, "dem_tiles", DemTiles(self.tmp.name))
+        self.patch.start()
+        self.client = TestClient(server.app)
+
+    def tearDown(self):
+        self.patch.stop()
+        self.tmp.cleanup()
+
+    def test_lookup(self):
+        response = self.client.post("/api/elevation", json={"locations": [[44.5, 20.25], [0.5, 0.5]]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"elevations": [502.5, None], "missing": 1})
+
+    def test_polyline_and_validation(self):
+        polyline = server.encode_polyline([[44.5, 20.25]])
+        self.assertEqual(self.client.post("/api/elevation", json={"locations": polyline}).json()["elevations"],
+                         [502.5])
+        self.assertEqual(self.client.post("/api/elevation", json={"locations": [[99, 0]]}).status_code, 422)
+
+
+if __name__ == "__main__":
+    unittest.main()
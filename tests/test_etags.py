@@ -0,0 +1,74 @@
+import unittest
+from unittest import mock
+
+import server
+from etags import etag_matches, make_etag
+from tests.conftest import SAMPLE_COORDS as COORDS, ApiTestCase
+
+
+class TestEtagHelpers(unittest.TestCase):
+
+    def test_make_etag(self):
+        self.assertEqual(make_etag("a", 1), make_etag("a", 1))
+        self.assertNotEqual(make_etag("a", 1), make_etag("a", 2))
+        self.assertTrue(make_etag("a").startswith('"'))
+
+    def test_etag_matches(self):
+        self.assertTrue(etag_matches('"x", "y"', '"y"'))
+        self.assertTrue(etag_matches("*", '"y"'))
+        self.assertFalse(etag_matches(None, '"y"'))
+        self.assertFalse(etag_matches('W/"y"', '"y"'))
+
+
+class TestConditionalRouteReads(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.route_id = self.save_route(route_name="ETag route").json()["route_id"]
+
+    def get(self, url, etag=None, **params):
+        headers = dict(self.headers)
+        if etag:
+            headers["If-None-Match"] = etag
+        return self.client.get(url, params=params, headers=headers)
+
+    def test_list_not_modified_skips_decoding(self):
+        etag = self.get("/api/routes").headers["etag"]
+        with mock.patch.object(server, "fetch_route_page", wraps=server.fetch_route_page) as fetch:
+            response = self.get("/api/routes", etag)
+        self.assertEqual(response.status_code, 304)
+        fetch.assert_not_called()
+
+    def test_list_etag_depends_on_query(self):
+        full = self.get("/api/routes").headers["etag"]
+        projected = self.get("/api/routes", fields="id,name").headers["etag"]
+        self.assertNotEqual(full, projected)
+        self.assertEqual(self.get("/api/routes", full, fields="id,name").status_code, 200)
+
+    def test_writes_change_list_etag(self):
+        etag = self.get("/api/routes").headers["etag"]
+        self.save_route(route_name="2")
+        after_save = self.get("/api/routes", etag)
+        self.assertEqual(after_save.status_code, 200)
+        self.assertEqual(len(after_save.json()), 2)
+
+        etag = after_save.headers["etag"]
+        self.client.delete(f"/api/routes/{self.route_id}", headers=self.headers)
+        self.assertEqual(self.get("/api/routes", etag).status_code, 200)
+
+    def test_route_etag(self):
+        url = f"/api/routes/{self.route_id}"
+        first = self.get(url)
+        etag = first.headers["etag"]
+        self.assertEqual(self.get(url, etag).status_code, 304)
+        self.assertNotEqual(self.get(url, lod=1).headers["etag"], etag)
+
+        self.save_route(COORDS[:2], params={"overwrite": True}, route_name="ETag route")
+        updated = self.get(url, etag)
+        self.assertEqual(updated.status_code, 200)
+        self.assertEqual(len(updated.json()["coordinates"]), 2)
+        self.assertEqual(self.get("/api/routes/missing", etag).status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import io
+import unittest
+import zipfile
+from unittest import mock
+
+import server
+from gpx_reader import read_gpx_bytes
+from tests.conftest import SAMPLE_COORDS, ApiTestCase
+from zip_stream import iter_zip, unique_name
+
+
+class TestZipStream(unittest.TestCase):
+
+    def test_streams_members_lazily(self):
+        consumed = []
+
+        def chunks(tag):
+            for i in range(200):
+                consumed.append(tag)
+                yield f"{tag} {i} ".encode() * 500
+
+        entries = ((f"{tag}.txt", (2024, 1, 1, 0, 0, 0), chunks(tag)) for tag in ("a", "b"))
+        stream = iter_zip(entries)
+        first = next(stream)
+        self.assertTrue(first.startswith(b"PK"))
+        self.assertNotIn("b", consumed)
+        body = first + b"".join(stream)
+
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            self.assertEqual(archive.namelist(), ["a.txt", "b.txt"])
+            self.assertIsNone(archive.testzip())
+            self.assertTrue(archive.read("b.txt").startswith(b"b 0 "))
+
+    def test_unique_name(self):
+        used = set()
+        names = [unique_name(n, used) for n in ["run.gpx", "run.gpx", "run.gpx", "loop"]]
+        self.assertEqual(names, ["run.gpx", "run (2).gpx", "run (3).gpx", "loop"])
+
+
+class TestRouteExport(ApiTestCase):
+
+    def test_export_zip(self):
+        for name in ["Morning loop", "Morning loop", "River run"]:
+            self.save_route(route_name=name)
+        with mock.patch.object(server, "EXPORT_BATCH_SIZE", 2):
+            response = self.client.get("/api/routes/export", headers=self.headers)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/zip")
+        self.assertIn("attachment", response.headers["content-disposition"])
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            names = sorted(archive.namelist())
+            self.assertEqual(names, ["Morning_loop (2).gpx", "Morning_loop.gpx", "River_run.gpx"])
+            coords, name = read_gpx_bytes(archive.read("River_run.gpx"))
+        self.assertEqual(name, "River run")
+        self.assertEqual(coords.tolist(), SAMPLE_COORDS)
+
+    def test_export_empty_library(self):
+        response = self.client.get("/api/routes/export", headers=self.headers)
+        with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+            self.assertEqual(archive.namelist(), [])
+
+    def test_export_requires_auth(self):
+        self.assertIn(self.client.get("/api/routes/export").status_code, (401, 403))
+
+
+if __name__ == "__main__":
+    unittest.main()
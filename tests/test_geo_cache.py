@@ -0,0 +1,108 @@
+import tempfile
+import unittest
+import uuid
+from pathlib import Path
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import server
+from db import ConnectionPool
+from geo_cache import GeoCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestGeoCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = ConnectionPool(Path(self.tmp.name) / "cache.db", size=2)
+        with self.pool.connection() as conn:
+            conn.execute(
+                "CREATE TABLE geo_cache (kind TEXT NOT NULL, cell_lat INTEGER NOT NULL, cell_lon INTEGER NOT NULL, "
+                "value TEXT NOT NULL, updated_at REAL NOT NULL, last_used REAL NOT NULL, "
+                "PRIMARY KEY (kind, cell_lat, cell_lon)) WITHOUT ROWID"
+            )
+            conn.commit()
+        self.clock = FakeClock()
+        self.cache = GeoCache(self.pool.connection, max_entries=10, clock=self.clock, touch_interval=60)
+
+    def tearDown(self):
+        self.pool.close_all()
+        self.tmp.cleanup()
+
+    def test_quantize(self):
+        cells = self.cache.quantize([[44.81234, 20.46006], [44.81236, 20.45996]])
+        self.assertEqual(cells.tolist(), [[448123, 204601], [448124, 204600]])
+        np.testing.assert_allclose(self.cache.centres(cells[:1]), [[44.8123, 20.4601]])
+
+    def test_batch_get_set(self):
+        self.cache.set_many("elevation", {(1, 2): 117.5, (3, 4): {"name": "Belgrade"}})
+        found = self.cache.get_many("elevation", [(1, 2), (3, 4), (5, 6), (1, 2)])
+        self.assertEqual(found, {(1, 2): 117.5, (3, 4): {"name": "Belgrade"}})
+        self.assertEqual(self.cache.get_many("geocode", [(1, 2)]), {})
+
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 2))
+        self.assertEqual(stats["kinds"]["geocode"], {"hits": 0, "misses": 1})
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_max_age(self):
+        self.cache.set_many("geocode", {(1, 1): "old"})
+        self.clock.now += 100
+        self.assertEqual(self.cache.get_many("geocode", [(1, 1)], max_age=50), {})
+        self.assertEqual(self.cache.get_many("geocode", [(1, 1)], max_age=500), {(1, 1): "old"})
+
+    def test_lru_eviction(self):
+        self.cache.set_many("elevation", {(i, 0): i for i in range(10)})
+        self.clock.now += 100
+        # Reading cell 0 makes it recently used
+        self.cache.get_many("elevation", [(0, 0)])
+        self.clock.now += 1
+        self.cache.set_many("elevation", {(10, 0): 10})
+
+        remaining = self.cache.get_many("elevation", [(i, 0) for i in range(11)])
+        self.assertEqual(len(remaining), 9)
+        self.assertIn((0, 0), remaining)
+        self.assertIn((10, 0), remaining)
+        self.assertEqual(self.cache.stats()["evictions"], 2)
+
+    def test_hits_touch_last_used_sparingly(self):
+        self.cache.set_many("elevation", {(1, 2): 117.5})
+
+        def last_used():
+            with self.pool.connection() as conn:
+                return conn.execute("SELECT last_used FROM geo_cache").fetchone()[0]
+
+        self.clock.now += 30
+        self.cache.get_many("elevation", [(1, 2)])
+        self.assertEqual(last_used(), 1000.0)
+        self.clock.now += 60
+        self.cache.get_many("elevation", [(1, 2)])
+        self.assertEqual(last_used(), 1090.0)
+
+
+class TestElevationCaching(unittest.TestCase):
+
+    def test_endpoint_hits_cache(self):
+        with TestClient(server.app) as client:
+            # A location no other test uses
+            lat = 10 + uuid.uuid4().int % 1000 / 1000
+            kinds_before = server.geo_cache.stats()["kinds"].get("elevation", {"hits": 0, "misses": 0})
+            server.geo_cache.set_many("elevation", {tuple(server.geo_cache.quantize([[lat, 10.5]])[0]): 321.0})
+            response = client.post("/api/elevation", json={"locations": [[lat, 10.5]]})
+            self.assertEqual(response.json()["elevations"], [321.0])
+            kinds_after = server.geo_cache.stats()["kinds"]["elevation"]
+            self.assertEqual(kinds_after["hits"], kinds_before["hits"] + 1)
+            self.assertEqual(client.get("/api/status/geo-cache").status_code, 200)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,210 @@
+import asyncio
+import json
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from fastapi.testclient import TestClient
+
+import server
+from db import ConnectionPool
+from geo_cache import GeoCache
+from geocoder import Geocoder, GeocoderError, RateLimitedError, TokenBucket
+
+
+class StubNominatim(BaseHTTPRequestHandler):
+    """Answers /search and /reverse, failing for q=fail, after a short delay."""
+
+    requests = []
+    delay = 0.0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        type(self).requests.append((url.path, params))
+        time.sleep(type(self).delay)
+        if params.get("q") == "fail":
+            self.send_response(500)
+            self.end_headers()
+            return
+        if url.path == "/search":
+            body = [{"display_name": params["q"].title(), "lat": "44.8", "lon": "20.46"}]
+        else:
+            body = {"display_name": f"{params['lat']},{params['lon']}", "address": {"city": "Belgrade"}}
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def create_cache(directory):
+    pool = ConnectionPool(Path(directory) / "cache.db", size=2)
+    with pool.connection() as conn:
+        conn.execute(
+            "CREATE TABLE geo_cache (kind TEXT NOT NULL, cell_lat INTEGER NOT NULL, cell_lon INTEGER NOT NULL, "
+            "value TEXT NOT NULL, updated_at REAL NOT NULL, last_used REAL NOT NULL, "
+            "PRIMARY KEY (kind, cell_lat, cell_lon)) WITHOUT ROWID"
+        )
+        conn.execute(
+            "CREATE TABLE geo_cache_keys (kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, "
+            "updated_at REAL NOT NULL, PRIMARY KEY (kind, key)) WITHOUT ROWID"
+        )
+        conn.commit()
+    return pool
+
+
+class StubServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        StubNominatim.requests = []
+        StubNominatim.delay = 0.0
+        self.stub = ThreadingHTTPServer(("127.0.0.1", 0), StubNominatim)
+        threading.Thread(target=self.stub.serve_forever, daemon=True).start()
+        self.upstream = f"http://127.0.0.1:{self.stub.server_address[1]}"
+        self.tmp = tempfile.TemporaryDirectory()
+        self.pool = create_cache(self.tmp.name)
+        self.cache = GeoCache(self.pool.connection)
+
+    def tearDown(self):
+        self.stub.shutdown()
+        self.stub.server_close()
+        self.pool.close_all()
+        self.tmp.cleanup()
+
+    def geocoder(self, **kwargs):
+        kwargs.setdefault("rate", 1000.0)
+        kwargs.setdefault("burst", 1000.0)
+        return Geocoder(self.upstream, self.cache, **kwargs)
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_reservations_queue_without_blocking_rejections(self):
+        now = [0.0]
+        bucket = TokenBucket(rate=10.0, capacity=1.0, clock=lambda: now[0])
+        self.assertEqual(bucket.reserve(0.25), 0.0)
+        self.assertAlmostEqual(bucket.reserve(0.25), 0.1)
+        self.assertAlmostEqual(bucket.reserve(0.25), 0.2)
+        # Rejected at once, without taking a token
+        with self.assertRaises(RateLimitedError):
+            bucket.reserve(0.25)
+        now[0] += 0.2
+        self.assertAlmostEqual(bucket.reserve(0.25), 0.1)
+
+    def test_acquire_sleeps_outside_any_lock(self):
+        async def scenario():
+            bucket = TokenBucket(rate=10.0, capacity=1.0)
+            start = time.monotonic()
+            results = await asyncio.gather(*(bucket.acquire(0.15) for _ in range(3)), return_exceptions=True)
+            return results, time.monotonic() - start
+
+        results, elapsed = asyncio.run(scenario())
+        self.assertEqual(results[:2], [None, None])
+        self.assertIsInstance(results[2], RateLimitedError)
+        self.assertLess(elapsed, 0.19)
+
+
+class TestGeocoder(StubServerTestCase):
+
+    def test_search_is_cached_per_normalized_query(self):
+        async def scenario():
+            geocoder = self.geocoder()
+            first = await geocoder.search("Knez  Mihailova")
+            second = await geocoder.search("knez mihailova ")
+            await geocoder.aclose()
+            return first, second
+
+        first, second = asyncio.run(scenario())
+        self.assertEqual(first, second)
+        self.assertEqual(first[0]["display_name"], "Knez Mihailova")
+        self.assertEqual(len(StubNominatim.requests), 1)
+        self.assertEqual(StubNominatim.requests[0][1]["limit"], "5")
+        with self.pool.connection() as conn:
+            # Stored under its text key, not in the spatial grid
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM geo_cache").fetchone()[0], 0)
+            self.assertEqual(conn.execute("SELECT key FROM geo_cache_keys").fetchone()[0], "5:knez mihailova")
+
+    def test_concurrent_reverse_is_coalesced(self):
+        StubNominatim.delay = 0.2
+
+        async def scenario():
+            geocoder = self.geocoder()
+            # Both points fall into the same 1e-4 degree cell
+            results = await asyncio.gather(*(geocoder.reverse(44.81231, 20.46011) for _ in range(5)),
+                                           geocoder.reverse(44.81234, 20.46014))
+            later = await geocoder.reverse(44.8123, 20.4601)
+            stats = geocoder.stats()
+            await geocoder.aclose()
+            return results, later, stats
+
+        results, later, stats = asyncio.run(scenario())
+        self.assertEqual(len(StubNominatim.requests), 1)
+        self.assertEqual(StubNominatim.requests[0][1]["lat"], "44.812300")
+        self.assertTrue(all(result == later for result in results))
+        self.assertEqual(stats["coalesced"], 5)
+
+    def test_upstream_error_is_not_cached(self):
+        async def scenario():
+            geocoder = self.geocoder()
+            for _ in range(2):
+                with self.assertRaises(GeocoderError):
+                    await geocoder.search("fail")
+            await geocoder.aclose()
+
+        asyncio.run(scenario())
+        self.assertEqual(len(StubNominatim.requests), 2)
+
+    def test_rate_limit(self):
+        async def scenario():
+            geocoder = self.geocoder(rate=1.0, burst=1.0, max_wait=0.0)
+            await geocoder.search("first")
+            with self.assertRaises(RateLimitedError):
+                await geocoder.search("second")
+            # Cached lookups do not need a token
+            await geocoder.search("first")
+            await geocoder.aclose()
+
+        asyncio.run(scenario())
+        self.assertEqual(len(StubNominatim.requests), 1)
+
+    def test_expire(self):
+        now = [1000.0]
+        cache = GeoCache(self.pool.connection, clock=lambda: now[0])
+        cache.set_many("geocode:reverse:14", {(1, 1): "old"})
+        cache.set_key("geocode:search", "5:old", [])
+        cache.set_many("elevation", {(1, 1): 100})
+        now[0] += 100
+        self.assertEqual(cache.expire(50, "geocode:"), 2)
+        self.assertIsNone(cache.get_key("geocode:search", "5:old"))
+        self.assertEqual(cache.get_many("elevation", [(1, 1)]), {(1, 1): 100})
+
+
+class TestGeocodeEndpoints(StubServerTestCase):
+
+    def test_endpoints(self):
+        with mock.patch.object(server, "geocoder", self.geocoder()), TestClient(server.app) as client:
+            response = client.get("/api/geocode", params={"q": "belgrade", "limit": 3})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()[0]["display_name"], "Belgrade")
+
+            response = client.get("/api/reverse-geocode", params={"lat": 44.8, "lon": 20.46})
+            self.assertEqual(response.json()["address"], {"city": "Belgrade"})
+
+            self.assertEqual(client.get("/api/geocode", params={"q": "fail"}).status_code, 502)
+            self.assertEqual(client.get("/api/geocode", params={"q": "  "}).status_code, 422)
+            self.assertEqual(client.get("/api/reverse-geocode", params={"lat": 91, "lon": 0}).status_code, 422)
+            self.assertEqual(client.get("/api/status/geocoder").json()["upstream_calls"], 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
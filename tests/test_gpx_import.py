@@ -0,0 +1,114 @@
+import io
+import unittest
+import zipfile
+from unittest import mock
+
+import server
+from coord_codec import unpack_coordinates
+from gpx_import import ImportLimitError, ImportLimits, expand_upload, expand_uploads, parse_import_batch
+from tests.conftest import ApiTestCase
+
+GPX = '''<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">
+  {name}
+  <trk><trkseg>
+    <trkpt lat="44.8000" lon="20.4600"/>
+    <trkpt lat="44.8090" lon="20.4600"/>
+    <trkpt lat="44.8180" lon="20.4600"/>
+  </trkseg></trk>
+</gpx>'''
+
+
+def gpx(name=None):
+    return GPX.format(name=f"<metadata><name>{name}</name></metadata>" if name else "").encode()
+
+
+def zip_of(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+class TestImportParsing(unittest.TestCase):
+
+    def test_expand_zip(self):
+        archive = zip_of({"a.gpx": gpx("A"), "notes.txt": b"x", "dir/b.GPX": gpx(), "__MACOSX/._a.gpx": b""})
+        names = [name for name, _ in expand_upload("runs.zip", archive)]
+        self.assertEqual(names, ["runs.zip/a.gpx", "runs.zip/dir/b.GPX"])
+        self.assertEqual(list(expand_upload("one.gpx", b"<gpx/>")), [("one.gpx", b"<gpx/>")])
+
+    def test_broken_zip(self):
+        [(name, error)] = expand_upload("bad.zip", b"PK\x03\x04garbage")
+        self.assertEqual(name, "bad.zip")
+        self.assertIsInstance(error, ValueError)
+
+    def test_limits_stop_expansion(self):
+        archive = zip_of({f"{i}.gpx": gpx() for i in range(3)})
+        with self.assertRaisesRegex(ImportLimitError, "Too many files"):
+            expand_uploads([("runs.zip", archive)], ImportLimits(max_files=2))
+        with self.assertRaisesRegex(ImportLimitError, "too large"):
+            expand_uploads([("runs.zip", archive)], ImportLimits(max_bytes=len(gpx()) * 2))
+        self.assertEqual(len(expand_uploads([("runs.zip", archive), ("one.gpx", gpx())], ImportLimits(max_files=4))), 4)
+
+    def test_parse_batch(self):
+        good, unnamed, bad = parse_import_batch([("good.gpx", gpx("Danube")), ("dir/unnamed.gpx", gpx()),
+                                                 ("bad.gpx", b"not xml")])
+        self.assertEqual(good["name"], "Danube")
+        self.assertEqual(good["points"], 3)
+        self.assertEqual(unpack_coordinates(good["coordinates"]).tolist()[1], [44.809, 20.46])
+        self.assertAlmostEqual(good["run_details"]["distance"], 2.0, delta=0.01)
+        self.assertEqual(good["run_details"]["calories"], 140)
+        self.assertEqual(unnamed["name"], "unnamed")
+        self.assertIn("error", bad)
+
+
+class TestImportEndpoint(ApiTestCase):
+
+    def test_import_files_and_zip(self):
+        files = [
+            ("files", ("first.gpx", gpx("First"), "application/gpx+xml")),
+            ("files", ("broken.gpx", b"<gpx>", "application/gpx+xml")),
+            ("files", ("more.zip", zip_of({"second.gpx": gpx("Second"), "third.gpx": gpx()}), "application/zip")),
+        ]
+        response = self.client.post("/api/routes/import", files=files, headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.text)
+        body = response.json()
+
+        self.assertEqual((body["imported"], body["failed"]), (3, 1))
+        self.assertEqual([r["filename"] for r in body["results"]],
+                         ["first.gpx", "broken.gpx", "more.zip/second.gpx", "more.zip/third.gpx"])
+        self.assertIn("error", body["results"][1])
+        self.assertEqual(body["stats"]["points"], 9)
+        self.assertIn("parse_files_per_second", body["stats"])
+
+        names = sorted(r["name"] for r in self.client.get("/api/routes", headers=self.headers).json())
+        self.assertEqual(names, ["First", "Second", "third"])
+        route = self.client.get(f"/api/routes/{body['results'][0]['route_id']}", params={"lod": 1},
+                                headers=self.headers).json()
+        self.assertEqual(route["coordinates"][0], [44.8, 20.46])
+
+    def test_bad_points_fail_only_their_file(self):
+        files = [
+            ("files", ("good.gpx", gpx("Good"), "application/gpx+xml")),
+            ("files", ("nan.gpx", gpx().replace(b'lat="44.8', b'lat="nan'), "application/gpx+xml")),
+            ("files", ("far.gpx", gpx().replace(b'lat="44.8', b'lat="300'), "application/gpx+xml")),
+        ]
+        response = self.client.post("/api/routes/import", files=files, headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.text)
+        body = response.json()
+        self.assertEqual((body["imported"], body["failed"]), (1, 2))
+        self.assertEqual([r["name"] for r in self.client.get("/api/routes", headers=self.headers).json()], ["Good"])
+
+    def test_too_many_files(self):
+        archive = zip_of({f"{i}.gpx": gpx() for i in range(3)})
+        limited = lambda raw_uploads: expand_uploads(raw_uploads, ImportLimits(max_files=2))
+        with mock.patch.object(server, "expand_uploads", limited):
+            response = self.client.post("/api/routes/import", files=[("files", ("runs.zip", archive, "application/zip"))],
+                                        headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import io
+import unittest
+
+import gpxpy
+
+from gpx_reader import parse_gpx_file, parse_gpx_stream, read_gpx_track
+
+GPX_11 = '''<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">
+  <metadata><name>Danube Loop</name><author><name>Someone</name></author></metadata>
+  <wpt lat="1.0" lon="1.0"><name>Not a track point</name></wpt>
+  <trk>
+    <name>Track One</name>
+    <trkseg>
+      <trkpt lat="44.8125" lon="20.4612"><ele>117.0</ele></trkpt>
+      <trkpt lat="44.8130" lon="20.4620"></trkpt>
+    </trkseg>
+    <trkseg>
+      <trkpt lat="44.8140" lon="20.4630"/>
+    </trkseg>
+  </trk>
+</gpx>'''
+
+GPX_10_TRACK_NAME = '''<?xml version="1.0"?>
+<gpx version="1.0" xmlns="http://www.topografix.com/GPX/1/0">
+  <trk><name>Only Track Name</name><trkseg><trkpt lat="1.5" lon="-2.5"/></trkseg></trk>
+</gpx>'''
+
+
+class TestGPXReader(unittest.TestCase):
+
+    def test_parse_gpx_file_contract(self):
+        """Coordinates and metadata name come back as before"""
+        result = parse_gpx_file(GPX_11)
+        self.assertEqual(result["name"], "Danube Loop")
+        self.assertEqual(result["coordinates"],
+                         [[44.8125, 20.4612], [44.8130, 20.4620], [44.8140, 20.4630]])
+
+    def test_track_name_fallback(self):
+        self.assertEqual(parse_gpx_file(GPX_10_TRACK_NAME),
+                         {"coordinates": [[1.5, -2.5]], "name": "Only Track Name"})
+
+    def test_small_chunks(self):
+        """Chunk boundaries inside tags and attribute values are handled"""
+        coords, name = read_gpx_track(io.BytesIO(GPX_11.encode()), chunk_size=7)
+        self.assertEqual(coords.shape, (3, 2))
+        self.assertEqual(name, "Danube Loop")
+
+    def test_matches_gpxpy(self):
+        gpx = gpxpy.parse(GPX_11)
+        expected = [[p.latitude, p.longitude] for t in gpx.tracks for s in t.segments for p in s.points]
+        self.assertEqual(parse_gpx_stream(io.BytesIO(GPX_11.encode()))["coordinates"], expected)
+
+    def test_invalid_points_skipped(self):
+        """Non-finite and out-of-range points never reach the coordinates"""
+        content = GPX_10_TRACK_NAME.replace(
+            '<trkpt lat="1.5" lon="-2.5"/>',
+            '<trkpt lat="nan" lon="20.0"/><trkpt lat="1.5" lon="-2.5"/>'
+            '<trkpt lat="300" lon="20.0"/><trkpt lat="45.0" lon="inf"/>'
+        )
+        self.assertEqual(parse_gpx_file(content)["coordinates"], [[1.5, -2.5]])
+
+    def test_malformed(self):
+        self.assertEqual(parse_gpx_file("<gpx><trk>"), {"coordinates": [], "name": None})
+        self.assertEqual(parse_gpx_file("not xml"), {"coordinates": [], "name": None})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import xml.etree.ElementTree as ET
+
+from gpx_writer import iter_gpx, iter_gpx_bytes, gpx_filename
+from server import RunDetails, generate_gpx_content
+from timeline import synthesize_timeline
+
+GPX_NS = "{http://www.topografix.com/GPX/1/1}"
+
+
+def make_run_details(**overrides):
+    data = dict(distance=5.2, duration=30, pace="5:46", calories=300, route_name="Test Run")
+    data.update(overrides)
+    return RunDetails(**data)
+
+
+class TestGPXWriter(unittest.TestCase):
+
+    def test_stream_matches_in_memory_document(self):
+        """Joined chunks equal the JSON endpoint's gpx_content"""
+        coords = [[45.0 + i * 1e-4, 19.0 - i * 1e-4] for i in range(25)]
+        details = make_run_details()
+        timeline = synthesize_timeline(coords, details)
+        streamed = "".join(iter_gpx(coords, details, timeline, chunk_points=7))
+        self.assertEqual(streamed, generate_gpx_content(coords, details))
+
+    def test_chunking(self):
+        """Track points are emitted in bounded chunks"""
+        coords = [[1.0, 2.0]] * 10
+        chunks = list(iter_gpx(coords, make_run_details(), chunk_points=4))
+        # header + 3 point chunks (4, 4, 2) + footer
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual(chunks[-2].count("<trkpt"), 2)
+
+    def test_valid_xml(self):
+        """Output parses as GPX and escapes the route name"""
+        coords = [[37.7749, -122.4194], [37.7849, -122.4094]]
+        body = b"".join(iter_gpx_bytes(coords, make_run_details(route_name="Park & <Loop>")))
+        root = ET.fromstring(body)
+        self.assertEqual(root.tag, f"{GPX_NS}gpx")
+        self.assertEqual(root.find(f"{GPX_NS}trk/{GPX_NS}name").text, "Park & <Loop>")
+        points = root.findall(f".//{GPX_NS}trkpt")
+        self.assertEqual(len(points), 2)
+        self.assertEqual(points[0].get("lat"), "37.7749")
+        self.assertEqual(points[0].get("lon"), "-122.4194")
+
+    def test_filename(self):
+        self.assertEqual(gpx_filename("Morning Run #1"), "Morning_Run__1.gpx")
+        self.assertEqual(gpx_filename(""), "route.gpx")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,226 @@
+import asyncio
+import io
+import os
+import tempfile
+import time
+import unittest
+import zipfile
+from unittest import mock
+
+import server
+from jobs import JobFailed, JobQueue, JobResult, QueueFullError
+from tests.conftest import SAMPLE_COORDS as COORDS, ApiTestCase, create_user, sample_run_details
+
+DETAILS = sample_run_details(route_name="Evening run")
+
+GPX = b'''<?xml version="1.0" encoding="UTF-8"?>
+<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">
+  <trk><name>Imported</name><trkseg>
+    <trkpt lat="44.8000" lon="20.4600"/>
+    <trkpt lat="44.8090" lon="20.4600"/>
+  </trkseg></trk>
+</gpx>'''
+
+
+class TestJobQueue(unittest.TestCase):
+    """The queue on its own, with handlers registered per test."""
+
+    def setUp(self):
+        server.init_database()
+        self.user_id = create_user()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.queue = JobQueue(server.get_db_connection, workers=1, retry_backoff=0.01, poll_interval=0.02,
+                              max_pending_per_user=5, results_dir=self.tmp.name)
+
+    def run_until_done(self, job_ids, timeout=10.0):
+        async def run():
+            await self.queue.start()
+            deadline = time.monotonic() + timeout
+            try:
+                while time.monotonic() < deadline:
+                    rows = [await asyncio.to_thread(self.queue.get, job_id, self.user_id) for job_id in job_ids]
+                    if all(row['status'] in ("succeeded", "failed") for row in rows):
+                        return rows
+                    await asyncio.sleep(0.02)
+                self.fail("Jobs did not finish")
+            finally:
+                await self.queue.stop()
+        return asyncio.run(run())
+
+    def test_priority_order(self):
+        order = []
+
+        async def record(job):
+            order.append(job.params["n"])
+            return {"n": job.params["n"]}
+
+        self.queue.register("record", record)
+        job_ids = [self.queue.insert(self.user_id, "record", {"n": n}, priority)
+                   for n, priority in ((1, 0), (2, 5), (3, -1), (4, 5))]
+        rows = self.run_until_done(job_ids)
+        self.assertEqual(order, [2, 4, 1, 3])
+        self.assertTrue(all(row['progress'] == 1 for row in rows))
+        result = self.queue.get_result(job_ids[0], self.user_id)
+        self.assertEqual((bytes(result['result']), result['result_media_type']), (b'{"n": 1}', "application/json"))
+
+    def test_retries_then_fails(self):
+        attempts = []
+
+        async def flaky(job):
+            attempts.append((job.params["name"], job.attempt))
+            if job.params["name"] == "broken":
+                raise JobFailed("cannot work")
+            if job.params["name"] == "recovers" and job.attempt < 2:
+                raise RuntimeError("transient")
+            if job.params["name"] == "never":
+                raise RuntimeError("still down")
+            return JobResult(b"done", "text/plain", "done.txt")
+
+        self.queue.register("flaky", flaky)
+        job_ids = [self.queue.insert(self.user_id, "flaky", {"name": name})
+                   for name in ("recovers", "broken", "never")]
+        recovers, broken, never = self.run_until_done(job_ids)
+        self.assertEqual((recovers['status'], recovers['attempts'], recovers['result_filename']),
+                         ("succeeded", 2, "done.txt"))
+        self.assertEqual((broken['status'], broken['attempts'], broken['error']), ("failed", 1, "cannot work"))
+        self.assertEqual((never['status'], never['attempts'], never['error']), ("failed", 3, "still down"))
+        self.assertEqual(self.queue.retried, 3)
+
+    def test_interrupted_jobs_are_recovered(self):
+        async def echo(job):
+            return JobResult(b"".join(content for _, content in await job.files()))
+
+        self.queue.register("echo", echo)
+        job_id = self.queue.insert(self.user_id, "echo", {}, files=[("a", b"ab"), ("b", b"cd")])
+        with server.get_db_connection() as conn:
+            conn.execute("UPDATE jobs SET status = 'running', attempts = 1 WHERE id = ?", (job_id,))
+            conn.commit()
+        (row,) = self.run_until_done([job_id])
+        self.assertEqual(row['attempts'], 2)
+        self.assertEqual(bytes(self.queue.get_result(job_id, self.user_id)['result']), b"abcd")
+        self.assertEqual(self.queue.read_files(job_id), [])
+
+    def test_streamed_result_file(self):
+        async def stream(job):
+            path = await asyncio.to_thread(job.write_result, (bytes([i]) * 1000 for i in range(3)))
+            return JobResult(media_type="application/zip", filename="all.zip", path=path)
+
+        self.queue.register("stream", stream)
+        job_id = self.queue.insert(self.user_id, "stream", {})
+        self.run_until_done([job_id])
+        result = self.queue.get_result(job_id, self.user_id)
+        self.assertIsNone(result['result'])
+        with open(result['result_path'], "rb") as file:
+            self.assertEqual(file.read(), b"\x00" * 1000 + b"\x01" * 1000 + b"\x02" * 1000)
+
+        with server.get_db_connection() as conn:
+            conn.execute("UPDATE jobs SET finished_at = '2000-01-01' WHERE id = ?", (job_id,))
+            conn.commit()
+        self.queue.cleanup()
+        self.assertFalse(os.path.exists(result['result_path']))
+
+    def test_worker_survives_storage_errors(self):
+        async def unserializable(job):
+            return {"value": object()}
+
+        async def fails(job):
+            raise JobFailed("nope")
+
+        async def record(job):
+            return {"ok": True}
+
+        for kind, handler in (("unserializable", unserializable), ("fails", fails), ("record", record)):
+            self.queue.register(kind, handler)
+        bad_result = self.queue.insert(self.user_id, "unserializable", {}, priority=2)
+        self.queue.insert(self.user_id, "fails", {}, priority=1)
+        later = self.queue.insert(self.user_id, "record", {})
+
+        original_fail = self.queue._fail
+
+        def fail(job_id, error, retry_in):
+            if error == "nope":
+                raise RuntimeError("database is locked")
+            return original_fail(job_id, error, retry_in)
+
+        with mock.patch.object(self.queue, "_fail", fail):
+            bad, ok = self.run_until_done([bad_result, later])
+        self.assertEqual(bad['status'], "failed")
+        self.assertIn("Could not store result", bad['error'])
+        # The worker carried on after both errors
+        self.assertEqual(ok['status'], "succeeded")
+
+    def test_pending_limit(self):
+        for _ in range(5):
+            self.queue.insert(self.user_id, "record", {})
+        with self.assertRaises(QueueFullError):
+            self.queue.insert(self.user_id, "record", {})
+
+
+class TestJobEndpoints(ApiTestCase):
+
+    def wait(self, response, timeout=30.0):
+        self.assertEqual(response.status_code, 202, response.text)
+        location = response.headers["location"]
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = self.client.get(location, headers=self.headers).json()
+            if job["status"] in ("succeeded", "failed"):
+                return job
+            time.sleep(0.05)
+        self.fail("Job did not finish")
+
+    def test_generate_gpx_job(self):
+        response = self.client.post("/api/jobs", headers=self.headers, json={
+            "kind": "generate-gpx", "priority": 3,
+            "params": {"coordinates": COORDS, "runDetails": DETAILS},
+        })
+        job = self.wait(response)
+        self.assertEqual((job["status"], job["kind"], job["priority"]), ("succeeded", "generate-gpx", 3))
+        result = self.client.get(job["result_url"], headers=self.headers)
+        self.assertEqual(result.status_code, 200)
+        self.assertEqual(result.headers["content-type"], "application/gpx+xml")
+        self.assertIn('filename="Evening_run.gpx"', result.headers["content-disposition"])
+        self.assertEqual(result.content.count(b"<trkpt"), len(COORDS))
+
+        # Other users cannot see the job
+        other = self.new_user_headers()
+        self.assertEqual(self.client.get(f"/api/jobs/{job['id']}", headers=other).status_code, 404)
+        self.assertEqual(self.client.get(job["result_url"], headers=other).status_code, 404)
+
+    def test_invalid_jobs(self):
+        response = self.client.post("/api/jobs", headers=self.headers, json={"kind": "import"})
+        self.assertEqual(response.status_code, 422)
+        response = self.client.post("/api/jobs", headers=self.headers, json={"kind": "export", "priority": 11})
+        self.assertEqual(response.status_code, 422)
+
+        job = self.wait(self.client.post("/api/jobs", headers=self.headers, json={
+            "kind": "generate-gpx", "params": {"coordinates": [[95, 0]], "runDetails": DETAILS},
+        }))
+        self.assertEqual((job["status"], job["attempts"], job["result_url"]), ("failed", 1, None))
+        self.assertIn("Invalid route data", job["error"])
+        self.assertEqual(self.client.get(f"/api/jobs/{job['id']}/result", headers=self.headers).status_code, 409)
+
+    def test_background_import_and_export(self):
+        files = [("files", ("a.gpx", GPX, "application/gpx+xml")), ("files", ("b.gpx", GPX, "application/gpx+xml"))]
+        response = self.client.post("/api/routes/import", params={"background": True}, files=files,
+                                    headers=self.headers)
+        job = self.wait(response)
+        self.assertEqual(job["status"], "succeeded", job)
+        summary = self.client.get(job["result_url"], headers=self.headers).json()
+        self.assertEqual(summary["imported"], 2)
+
+        job = self.wait(self.client.get("/api/routes/export", params={"background": True}, headers=self.headers))
+        self.assertEqual(job["status"], "succeeded", job)
+        result = self.client.get(job["result_url"], headers=self.headers)
+        self.assertEqual(result.headers["content-type"], "application/zip")
+        with zipfile.ZipFile(io.BytesIO(result.content)) as archive:
+            self.assertEqual(len(archive.namelist()), 2)
+
+        status = self.client.get("/api/status/jobs").json()
+        self.assertIn("export", status["kinds"])
+        self.assertGreaterEqual(status["jobs"]["succeeded"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import re
+import unittest
+
+from metrics import Family, Registry
+from tests.conftest import SAMPLE_COORDS as COORDS, ApiTestCase, sample_run_details
+
+
+def sample(text, name, **labels):
+    """Value of one sample in an exposition, None when absent."""
+    wanted = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    pattern = "^" + re.escape(name + (f"{{{wanted}}}" if labels else "")) + r" (\S+)$"
+    match = re.search(pattern, text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+class TestRegistry(unittest.TestCase):
+
+    def test_exposition(self):
+        registry = Registry()
+        requests = registry.counter("app_requests_total", "Requests", ("path",))
+        latency = registry.histogram("app_latency_seconds", "Latency", buckets=(0.1, 1.0))
+        requests.labels('/a"b\\').inc()
+        requests.labels('/a"b\\').inc(2)
+        for value in (0.05, 0.1, 0.5, 3.0):
+            latency.observe(value)
+        registry.add_collector(lambda: [Family("app_up", "gauge", "Up", [({}, 1)])])
+
+        text = registry.render()
+        self.assertIn("# TYPE app_requests_total counter\n", text)
+        self.assertIn('app_requests_total{path="/a\\"b\\\\"} 3.0\n', text)
+        self.assertEqual(sample(text, "app_latency_seconds_bucket", le="0.1"), 2)
+        self.assertEqual(sample(text, "app_latency_seconds_bucket", le="1.0"), 3)
+        self.assertEqual(sample(text, "app_latency_seconds_bucket", le="+Inf"), 4)
+        self.assertEqual(sample(text, "app_latency_seconds_count"), 4)
+        self.assertAlmostEqual(sample(text, "app_latency_seconds_sum"), 3.65)
+        self.assertEqual(sample(text, "app_up"), 1)
+
+        with self.assertRaises(ValueError):
+            registry.counter("app_requests_total", "Again")
+        with self.assertRaises(ValueError):
+            requests.labels("/a", "extra")
+
+
+class TestMetricsEndpoint(ApiTestCase):
+
+    def metrics(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain; version=0.0.4"))
+        return response.text
+
+    def test_request_metrics(self):
+        before = self.metrics()
+        route = "/api/routes/{route_id}"
+        route_id = self.save_route(route_name="Metrics run").json()["route_id"]
+        self.assertEqual(self.client.get(f"/api/routes/{route_id}", headers=self.headers).status_code, 200)
+        self.assertEqual(self.client.get("/api/routes/missing", headers=self.headers).status_code, 404)
+        self.assertEqual(self.client.post("/api/generate-gpx/download",
+                                          json={"coordinates": COORDS, "runDetails": sample_run_details()}).status_code, 200)
+        after = self.metrics()
+
+        def delta(name, **labels):
+            return (sample(after, name, **labels) or 0) - (sample(before, name, **labels) or 0)
+
+        # Labelled by route template, never the raw path
+        self.assertEqual(delta("fakerun_http_request_duration_seconds_count", method="GET", route=route, status="200"), 1)
+        self.assertEqual(delta("fakerun_http_request_duration_seconds_count", method="GET", route=route, status="404"), 1)
+        self.assertNotIn(f'route="/api/routes/{route_id}"', after)
+        self.assertGreaterEqual(delta("fakerun_http_request_db_calls_sum", method="POST", route="/api/routes"), 1)
+        self.assertGreater(delta("fakerun_http_request_db_seconds_sum", method="POST", route="/api/routes"), 0)
+        self.assertGreater(delta("fakerun_http_request_size_bytes_sum", method="POST", route="/api/routes"), 100)
+        self.assertGreater(delta("fakerun_http_response_size_bytes_sum", method="POST",
+                                 route="/api/generate-gpx/download"), 500)
+        self.assertEqual(delta("fakerun_coordinates_points_sum", direction="in"), 2 * len(COORDS))
+        self.assertEqual(delta("fakerun_coordinates_points_sum", direction="out"), len(COORDS))
+        self.assertEqual(delta("fakerun_gpx_generation_seconds_per_point_count"), 1)
+        self.assertGreaterEqual(delta("fakerun_auth_cache_lookups_total", result="hit"), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
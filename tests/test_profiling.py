@@ -0,0 +1,101 @@
+import marshal
+import threading
+import unittest
+
+import server
+from profiling import RequestProfile, current_profile, profiled
+from tests.conftest import ApiTestCase
+TOKEN = "profile-secret"
+
+
+def query():
+    return sum(range(1000))
+
+
+class TestProfiledCalls(unittest.TestCase):
+
+    def test_db_thread_call_while_request_profiler_is_active(self):
+        """Works on every version, 3.12+ allows only one active profiler per interpreter"""
+        profile = RequestProfile()
+        context_token = current_profile.set(profile)
+        results = []
+        profile.main.enable()
+        try:
+            call = profiled(query)
+            thread = threading.Thread(target=lambda: results.append(call()))
+            thread.start()
+            thread.join()
+        finally:
+            profile.main.disable()
+            current_profile.reset(context_token)
+        self.assertEqual(results, [499500])
+        self.assertIn("query", {name for _, _, name in profile.stats().stats})
+
+
+class TestProfiling(ApiTestCase):
+
+    def setUp(self):
+        self.saved = (server.profiler.admin_token, server.profiler.sample_rate, server.profiler.rng)
+        server.profiler.admin_token = TOKEN
+        server.profiler.sample_rate = 0.0
+        super().setUp()
+        self.admin = {"X-Profile-Token": TOKEN}
+        self.save_route(route_name="Profiled run")
+
+    def tearDown(self):
+        server.profiler.admin_token, server.profiler.sample_rate, server.profiler.rng = self.saved
+
+    def test_header_profile_download(self):
+        response = self.client.get("/api/routes", headers=dict(self.headers, **self.admin))
+        self.assertEqual(response.status_code, 200)
+        profile_id = response.headers["x-profile-id"]
+
+        listed = self.client.get("/api/profiles", params={"route": "/api/routes"}, headers=self.admin).json()
+        self.assertEqual(listed[0]["id"], profile_id)
+        self.assertEqual((listed[0]["trigger"], listed[0]["status"], listed[0]["method"]), ("header", 200, "GET"))
+
+        download = self.client.get(f"/api/profiles/{profile_id}", headers=self.admin)
+        self.assertEqual(download.status_code, 200)
+        self.assertIn(f"profile-{profile_id}.prof", download.headers["content-disposition"])
+        functions = {name for _, _, name in marshal.loads(download.content)}
+        # The handler on the event loop and the query in its DB thread
+        self.assertIn("get_saved_routes", functions)
+        self.assertIn("fetch_route_page", functions)
+
+    def test_hot_functions(self):
+        for _ in range(3):
+            self.client.get("/api/routes", headers=dict(self.headers, **self.admin))
+        hot = self.client.get("/api/profiles/hot", params={"route": "/api/routes", "sort": "cumtime", "limit": 500},
+                              headers=self.admin).json()
+        self.assertGreaterEqual(hot["profiles"], 3)
+        times = [item["cumulative_time"] for item in hot["functions"]]
+        self.assertEqual(times, sorted(times, reverse=True))
+        fetch = [item for item in hot["functions"] if item["function"].endswith("(fetch_route_page)")]
+        self.assertEqual(len(fetch), 1)
+        self.assertGreaterEqual(fetch[0]["calls"], 3)
+        self.assertEqual(self.client.get("/api/profiles/hot", params={"sort": "x"}, headers=self.admin).status_code,
+                         422)
+
+    def test_sampling(self):
+        before = server.profiler.stored
+        server.profiler.sample_rate = 0.5
+        server.profiler.rng = iter([0.9, 0.1]).__next__
+        first = self.client.get("/api/routes", headers=self.headers)
+        second = self.client.get("/api/routes", headers=self.headers)
+        # Sampled profiles are stored without telling the client
+        self.assertNotIn("x-profile-id", first.headers)
+        self.assertNotIn("x-profile-id", second.headers)
+        self.assertEqual(server.profiler.stored, before + 1)
+        self.assertEqual(self.client.get("/api/profiles", headers=self.admin).json()[0]["trigger"], "sample")
+
+    def test_access(self):
+        response = self.client.get("/api/routes", headers=dict(self.headers, **{"X-Profile-Token": "wrong"}))
+        self.assertNotIn("x-profile-id", response.headers)
+        self.assertEqual(self.client.get("/api/profiles", headers={"X-Profile-Token": "wrong"}).status_code, 403)
+        self.assertEqual(self.client.get("/api/profiles/missing", headers=self.admin).status_code, 404)
+        server.profiler.admin_token = None
+        self.assertEqual(self.client.get("/api/profiles", headers=self.admin).status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import server
+from geo import cumulative_distance
+from route_metrics import compute_metrics
+from tests.conftest import ApiTestCase
+
+# ~111 m per 0.001 degree of latitude, 25 points cover ~2.67 km
+COORDS = [[44.8 + i * 0.001, 20.46] for i in range(25)]
+DETAILS = dict(distance=2.67, duration=16, pace="6:00", calories=190, route_name="Metrics route",
+               km_elevation_changes=[10.0, -4.0, 6.0])
+
+
+class TestComputeMetrics(unittest.TestCase):
+
+    def test_splits_and_bbox(self):
+        metrics = compute_metrics(COORDS)
+        cum = cumulative_distance(np.array(COORDS))
+        self.assertAlmostEqual(metrics.distance, cum[-1])
+        self.assertEqual(metrics.point_count, 25)
+        self.assertEqual(metrics.bbox, (44.8, 20.46, 44.824, 20.46))
+        # First point of every km
+        expected = [0] + [int(np.argmax(cum >= k * 1000)) for k in (1, 2)]
+        self.assertEqual(metrics.split_indices.tolist(), expected)
+        self.assertIsNone(metrics.elevation_gain)
+
+    def test_elevation(self):
+        elevation = np.array([0, 5, 3, 8, 8, 2] + [2] * 19, dtype=float)
+        metrics = compute_metrics(COORDS, elevation=elevation)
+        self.assertEqual(metrics.elevation_gain, 10)
+        self.assertEqual(metrics.elevation_loss, 8)
+        self.assertEqual(metrics.split_elevation_changes.sum(), elevation[-1] - elevation[0])
+
+    def test_empty(self):
+        metrics = compute_metrics([])
+        self.assertEqual((metrics.distance, metrics.point_count, metrics.bbox), (0.0, 0, None))
+
+
+class TestMetricsEndpoint(ApiTestCase):
+
+    def save(self, coordinates, overwrite=False):
+        return self.save_route(coordinates, params={"overwrite": overwrite}, **DETAILS).json()["route_id"]
+
+    def test_metrics(self):
+        route_id = self.save(COORDS)
+        response = self.client.get(f"/api/routes/{route_id}/metrics", headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertAlmostEqual(body["distance_km"], 2.67, places=2)
+        self.assertEqual(len(body["split_indices"]), 3)
+        # The last split is only ~0.67 km long, so it climbs ~4 of its 6 m
+        self.assertAlmostEqual(body["elevation_gain"], 14, delta=0.1)
+        self.assertAlmostEqual(body["elevation_loss"], 4, delta=0.1)
+        self.assertNotIn("cumulative_distance", body)
+
+        cumulative = self.client.get(f"/api/routes/{route_id}/metrics", params={"cumulative": True},
+                                     headers=self.headers).json()["cumulative_distance"]
+        self.assertEqual(len(cumulative), 25)
+        not_modified = self.client.get(f"/api/routes/{route_id}/metrics",
+                                       headers={**self.headers, "If-None-Match": response.headers["etag"]})
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_recomputed_only_when_coordinates_change(self):
+        route_id = self.save(COORDS)
+        with mock.patch.object(server, "compute_metrics", wraps=server.compute_metrics) as compute:
+            self.save(COORDS, overwrite=True)
+            compute.assert_not_called()
+            self.save(COORDS[:10], overwrite=True)
+            compute.assert_called_once()
+        body = self.client.get(f"/api/routes/{route_id}/metrics", headers=self.headers).json()
+        self.assertEqual(body["point_count"], 10)
+
+    def test_computed_lazily_for_old_routes(self):
+        route_id = self.save(COORDS)
+        with server.get_db_connection() as conn:
+            conn.execute("DELETE FROM route_metrics WHERE route_id = ?", (route_id,))
+            conn.commit()
+        body = self.client.get(f"/api/routes/{route_id}/metrics", headers=self.headers).json()
+        self.assertEqual(body["point_count"], 25)
+
+    def test_mile_splits(self):
+        route_id = self.save_route(COORDS, **dict(DETAILS, distance_unit="miles")).json()["route_id"]
+        body = self.client.get(f"/api/routes/{route_id}/metrics", headers=self.headers).json()
+        self.assertEqual(body["split_length"], 1609.344)
+        self.assertEqual(len(body["split_indices"]), 2)
+
+    def test_unknown_unit_rejected(self):
+        response = self.save_route(COORDS, **dict(DETAILS, distance_unit="furlongs"))
+        self.assertEqual(response.status_code, 422)
+
+    def test_deleted_with_route(self):
+        route_id = self.save(COORDS)
+        self.client.delete(f"/api/routes/{route_id}", headers=self.headers)
+        self.assertEqual(self.client.get(f"/api/routes/{route_id}/metrics", headers=self.headers).status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+
+import server
+from pagination import decode_cursor, encode_cursor, InvalidCursorError
+from tests.conftest import auth_headers, create_user
+
+ROUTES = 7
+
+
+class TestRoutesPagination(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.client = TestClient(server.app)
+        cls.client.__enter__()
+        cls.user_id = create_user()
+        cls.headers = auth_headers(cls.user_id)
+        base = datetime(2026, 1, 1)
+        for i in range(ROUTES):
+            route = server.RouteData(
+                coordinates=[[44.8, 20.4], [44.81, 20.41]],
+                runDetails=server.RunDetails(distance=float(i), duration=10, pace="5:00",
+                                             calories=10, route_name=f"Route {i}"))
+            route_id = server.store_route(route, False, cls.user_id)["route_id"]
+            # Two routes share a timestamp to exercise the id tie-break
+            created = base + timedelta(minutes=min(i, ROUTES - 2))
+            with server.get_db_connection() as conn:
+                conn.execute("UPDATE saved_routes SET created_at = ? WHERE id = ?",
+                             (created.isoformat(), route_id))
+                conn.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.__exit__(None, None, None)
+
+    def test_unpaginated_default(self):
+        routes = self.client.get("/api/routes", headers=self.headers).json()
+        self.assertEqual(len(routes), ROUTES)
+        self.assertIn("coordinates", routes[0])
+        self.assertEqual(routes[-1]["name"], "Route 0")
+
+    def test_walk_pages(self):
+        seen, cursor = [], None
+        while True:
+            params = {"limit": 3, "fields": "id,name,distance"}
+            if cursor:
+                params["cursor"] = cursor
+            response = self.client.get("/api/routes", params=params, headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            for item in response.json():
+                self.assertEqual(set(item), {"id", "name", "distance"})
+            seen.extend(item["id"] for item in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+        self.assertEqual(len(seen), ROUTES)
+        self.assertEqual(len(set(seen)), ROUTES)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get("/api/routes", params={"fields": "bogus"},
+                                         headers=self.headers).status_code, 400)
+        self.assertEqual(self.client.get("/api/routes", params={"limit": 2, "cursor": "!!"},
+                                         headers=self.headers).status_code, 400)
+        # Well-formed, but not a (created_at, id) pair of strings
+        self.assertEqual(self.client.get("/api/routes", params={"limit": 2, "cursor": encode_cursor([[1], [2]])},
+                                         headers=self.headers).status_code, 400)
+
+    def test_cursor_roundtrip(self):
+        self.assertEqual(decode_cursor(encode_cursor(["2026-01-01T00:00:00", "abc"]), 2),
+                         ["2026-01-01T00:00:00", "abc"])
+        with self.assertRaises(InvalidCursorError):
+            decode_cursor(encode_cursor([1]), 2)
+
+    def test_index_is_used(self):
+        with server.get_db_connection() as conn:
+            plan = " ".join(str(tuple(r)) for r in conn.execute(
+                "EXPLAIN QUERY PLAN SELECT id FROM saved_routes WHERE user_id = ? "
+                "ORDER BY created_at DESC, id DESC LIMIT 10", (self.user_id,)))
+        self.assertIn("idx_saved_routes_user_created", plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
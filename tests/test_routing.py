@@ -0,0 +1,158 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+from fastapi.testclient import TestClient
+
+import server
+from routing import NoRouteError, RoutingGraph, build_graph, is_walkable, load_graph, parse_osm
+
+# A 3x3 grid of nodes 0.001° apart, ids 1..9 row by row from the south-west:
+#
+#   7 - 8 - 9      the middle row is a motorway, 5 - 6 is private
+#   |       |
+#   4 = 5 x 6
+#   |       |
+#   1 - 2 - 3      node 10 is an isolated footway loop far away
+GRID_OSM = """<?xml version="1.0" encoding="UTF-8"?>
+<osm version="0.6">
+  {nodes}
+  <node id="10" lat="45.1" lon="20.1"/>
+  <node id="11" lat="45.1" lon="20.101"/>
+  <way id="100"><nd ref="1"/><nd ref="2"/><nd ref="3"/><tag k="highway" v="residential"/></way>
+  <way id="101"><nd ref="7"/><nd ref="8"/><nd ref="9"/><tag k="highway" v="footway"/></way>
+  <way id="102"><nd ref="1"/><nd ref="4"/><nd ref="7"/><tag k="highway" v="path"/></way>
+  <way id="103"><nd ref="3"/><nd ref="6"/><nd ref="9"/><tag k="highway" v="service"/></way>
+  <way id="104"><nd ref="4"/><nd ref="5"/><tag k="highway" v="motorway"/></way>
+  <way id="105"><nd ref="5"/><nd ref="6"/><tag k="highway" v="service"/><tag k="access" v="private"/></way>
+  <way id="106"><nd ref="10"/><nd ref="11"/><tag k="highway" v="footway"/></way>
+  <way id="107"><nd ref="2"/><nd ref="404"/><tag k="highway" v="footway"/></way>
+</osm>
+"""
+
+
+def grid_osm():
+    nodes = "\n  ".join(
+        f'<node id="{row * 3 + col + 1}" lat="{45 + row * 0.001}" lon="{20 + col * 0.001}"/>'
+        for row in range(3) for col in range(3)
+    )
+    return GRID_OSM.format(nodes=nodes)
+
+
+class TestRouting(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.osm_path = Path(self.tmp.name) / "extract.osm"
+        self.osm_path.write_text(grid_osm())
+        self.cache_dir = Path(self.tmp.name) / "graph"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_is_walkable(self):
+        self.assertTrue(is_walkable({"highway": "footway"}))
+        self.assertFalse(is_walkable({"highway": "motorway"}))
+        self.assertTrue(is_walkable({"highway": "motorway", "foot": "yes"}))
+        self.assertFalse(is_walkable({"highway": "service", "access": "private"}))
+        self.assertFalse(is_walkable({"building": "yes"}))
+
+    def test_build_graph(self):
+        with open(self.osm_path, "rb") as stream:
+            graph = build_graph(parse_osm(stream, chunk_size=64))
+        # Node 5 only has excluded ways and 404 is not in the extract
+        self.assertEqual(graph.node_count, 10)
+        self.assertEqual(graph.edge_count, 2 * 9)
+        self.assertEqual(graph.indptr[-1], graph.edge_count)
+
+    def test_shortest_path_and_cache(self):
+        graph = load_graph(self.osm_path, self.cache_dir)
+        self.assertTrue((self.cache_dir / "meta.json").is_file())
+        source, _ = graph.nearest(45.0, 20.0)
+        target, _ = graph.nearest(45.002, 20.002)
+        path, distance = graph.shortest_path(source, target)
+        self.assertEqual(len(path), 5)
+        # Two 0.001° steps north (111 m each) and two east (79 m each at 45°)
+        self.assertAlmostEqual(distance, 379.6, delta=1)
+
+        cached = load_graph(self.osm_path, self.cache_dir)
+        self.assertIsInstance(cached.indices, np.memmap)
+        self.assertEqual(cached.shortest_path(source, target), (path, distance))
+
+    def test_matches_dijkstra(self):
+        graph = load_graph(self.osm_path, self.cache_dir)
+        for source in range(graph.node_count):
+            expected = dijkstra(graph, source)
+            for target in range(graph.node_count):
+                if target in expected:
+                    self.assertAlmostEqual(graph.shortest_path(source, target)[1], expected[target], places=3)
+                else:
+                    with self.assertRaises(NoRouteError):
+                        graph.shortest_path(source, target)
+
+    def test_route_snapping(self):
+        router = RoutingGraph(self.osm_path, self.cache_dir)
+        coordinates, _ = router.route((45.00001, 20.0), (45.0, 20.00201))
+        np.testing.assert_allclose(coordinates, [[45.0, 20.0], [45.0, 20.001], [45.0, 20.002]])
+        with self.assertRaises(NoRouteError):
+            router.route((45.0, 20.0), (46.0, 20.0), max_snap_m=500)
+
+
+def dijkstra(graph, source):
+    """Plain single-direction reference implementation."""
+    import heapq
+    dist = {source: 0.0}
+    heap = [(0.0, source)]
+    while heap:
+        d, node = heapq.heappop(heap)
+        if d > dist[node]:
+            continue
+        for edge in range(graph.indptr[node], graph.indptr[node + 1]):
+            neighbour, weight = int(graph.indices[edge]), float(graph.weights[edge])
+            if d + weight < dist.get(neighbour, float("inf")):
+                dist[neighbour] = d + weight
+                heapq.heappush(heap, (d + weight, neighbour))
+    return dist
+
+
+class TestRouteEndpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        osm_path = Path(self.tmp.name) / "extract.osm"
+        osm_path.write_text(grid_osm())
+        self.patch = mock.patch.object(server, "routing_graph", RoutingGraph(osm_path, Path(self.tmp.name) / "graph"))
+        self.patch.start()
+        self.client = TestClient(server.app)
+
+    def tearDown(self):
+        self.patch.stop()
+        self.tmp.cleanup()
+
+    def test_route(self):
+        with mock.patch.object(server, "run_db", wraps=server.run_db) as run_db:
+            response = self.client.get("/api/route", params={"from": "45.0,20.0", "to": "45.0,20.002"})
+        # No database work, so no DB thread either
+        run_db.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["coordinates"]), 3)
+        self.assertAlmostEqual(response.json()["distance"], 157.4, delta=1)
+
+        polyline = self.client.get("/api/route", params={"from": "45.0,20.0", "to": "45.0,20.002"},
+                                   headers={"Accept": server.POLYLINE_MEDIA_TYPE})
+        self.assertEqual(server.decode_polyline(polyline.json()["coordinates"]).shape, (3, 2))
+        self.assertTrue(self.client.get("/api/status/routing").json()["loaded"])
+
+    def test_errors(self):
+        self.assertEqual(self.client.get("/api/route", params={"from": "45.0", "to": "45.0,20.0"}).status_code, 422)
+        self.assertEqual(self.client.get("/api/route", params={"from": "45.0,20.0", "to": "45.1,20.1"}).status_code,
+                         404)
+        with mock.patch.object(server, "routing_graph", RoutingGraph("/nonexistent.osm", self.tmp.name)):
+            self.assertEqual(self.client.get("/api/route", params={"from": "45.0,20.0", "to": "45.0,20.002"})
+                             .status_code, 503)
+
+
+if __name__ == "__main__":
+    unittest.main()
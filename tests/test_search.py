@@ -0,0 +1,81 @@
+import unittest
+
+from fts import match_query
+from pagination import encode_cursor
+from tests.conftest import ApiTestCase
+
+
+class TestMatchQuery(unittest.TestCase):
+
+    def test_words_become_prefix_terms(self):
+        self.assertEqual(match_query('river "loop', "u-1"),
+                         'user_id: "u-1" AND {name description}: ("river"* "loop"*)')
+        self.assertEqual(match_query("Ada-Ciganlija OR x", 'a"b'),
+                         'user_id: "a""b" AND {name description}: ("Ada"* "Ciganlija"* "OR"* "x"*)')
+        with self.assertRaises(ValueError):
+            match_query(" -*) ", "u-1")
+
+
+class TestRouteSearch(ApiTestCase):
+
+    def save(self, name, description="", headers=None, overwrite=False):
+        response = self.save_route(headers=headers, params={"overwrite": overwrite}, route_name=name,
+                                   description=description)
+        return response.json()["route_id"]
+
+    def search(self, q, **params):
+        response = self.client.get("/api/routes/search", params=dict(params, q=q), headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.text)
+        return response
+
+    def names(self, q):
+        return [item["name"] for item in self.search(q).json()]
+
+    def test_ranking_and_prefix(self):
+        self.save("Sava river run", "Flat and fast")
+        self.save("Morning loop", "Along the river Sava to the bridge")
+        self.save("Avala hill", "Steep climb")
+        self.save("Sava river", headers=self.new_user_headers())
+
+        # A name match outranks a description match
+        self.assertEqual(self.names("sava"), ["Sava river run", "Morning loop"])
+        self.assertEqual(self.names("riv brid"), ["Morning loop"])
+        self.assertEqual(self.names("AVALA"), ["Avala hill"])
+        self.assertEqual(self.names("unknown"), [])
+
+    def test_diacritics_and_updates(self):
+        route_id = self.save("Čubura", "Kalemegdan")
+        self.assertEqual(self.names("cubura"), ["Čubura"])
+        self.save("Čubura", "Vračar", overwrite=True)
+        self.assertEqual(self.names("kalemegdan"), [])
+        self.assertEqual(self.names("vracar"), ["Čubura"])
+
+        self.client.delete(f"/api/routes/{route_id}", headers=self.headers)
+        self.assertEqual(self.names("cubura"), [])
+
+    def test_pagination(self):
+        for i in range(5):
+            self.save(f"Tempo {i}")
+        first = self.search("tempo", limit=2)
+        pages = [first.json()]
+        cursor = first.headers.get("X-Next-Cursor")
+        while cursor:
+            page = self.search("tempo", limit=2, cursor=cursor)
+            pages.append(page.json())
+            cursor = page.headers.get("X-Next-Cursor")
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(len({item["id"] for page in pages for item in page}), 5)
+
+    def test_invalid_queries(self):
+        response = self.client.get("/api/routes/search", params={"q": "***"}, headers=self.headers)
+        self.assertEqual(response.status_code, 422)
+        response = self.client.get("/api/routes/search", params={"q": "x", "cursor": "nope"}, headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+        for offset in (True, False, -1, "3"):
+            response = self.client.get("/api/routes/search", params={"q": "x", "cursor": encode_cursor([offset])},
+                                       headers=self.headers)
+            self.assertEqual(response.status_code, 400, offset)
+
+
+if __name__ == "__main__":
+    unittest.main()
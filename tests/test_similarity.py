@@ -0,0 +1,97 @@
+import unittest
+import uuid
+
+import numpy as np
+
+from similarity import band_buckets, discrete_frechet, estimate_jaccard, frechet_distance, shingles, signature
+from tests.conftest import ApiTestCase
+
+
+def random_walk(seed, start=(44.8, 20.4), points=300):
+    rng = np.random.default_rng(seed)
+    return np.array(start) + np.cumsum(rng.normal(0, 0.0003, (points, 2)), axis=0)
+
+
+def jitter(coords, seed=99, degrees=0.00005):
+    return coords + np.random.default_rng(seed).normal(0, degrees, coords.shape)
+
+
+class TestSimilarity(unittest.TestCase):
+
+    def test_discrete_frechet(self):
+        a = np.array([[0.0, 0.0], [1.0, 0.0], [2.0, 0.0]])
+        self.assertEqual(discrete_frechet(a, a), 0.0)
+        self.assertAlmostEqual(discrete_frechet(a, a + [0.0, 1.0]), 1.0)
+        # Same points, opposite order: the walks start two units apart
+        self.assertAlmostEqual(discrete_frechet(a, a[::-1]), 2.0)
+        self.assertAlmostEqual(discrete_frechet(a, np.array([[0.0, 0.0], [2.0, 0.0]])), 1.0)
+
+    def test_signature_estimates_overlap(self):
+        route = random_walk(1)
+        same = signature(jitter(route))
+        other = signature(random_walk(2))
+        self.assertGreater(estimate_jaccard(signature(route), same), 0.8)
+        self.assertLess(estimate_jaccard(signature(route), other), 0.2)
+        self.assertTrue(np.any(band_buckets(signature(route)) == band_buckets(same)))
+        self.assertFalse(np.any(band_buckets(signature(route)) == band_buckets(other)))
+
+    def test_shingles_fill_gaps_between_points(self):
+        # Two points 1 km apart still cover every cell on the way
+        self.assertGreaterEqual(len(shingles([[45.0, 20.0], [45.009, 20.0]])), 18)
+        with self.assertRaises(ValueError):
+            shingles([])
+
+    def test_frechet_distance_in_metres(self):
+        route = random_walk(3)
+        distance, reversed_ = frechet_distance(route, route[::-1])
+        self.assertAlmostEqual(distance, 0.0, places=3)
+        self.assertTrue(reversed_)
+        shifted = route + [0.001, 0.0]  # 111 m north
+        self.assertAlmostEqual(frechet_distance(route, shifted)[0], 111.2, delta=1)
+
+
+class TestSimilarRoutes(ApiTestCase):
+
+    def save(self, name, coordinates, **params):
+        response = self.save_route(np.asarray(coordinates).tolist(), params=params, route_name=name)
+        self.assertEqual(response.status_code, 200, response.text)
+        return response.json()
+
+    def test_save_flags_and_dedupes(self):
+        route = random_walk(10, start=(50.0, 10.0))
+        original = self.save("Loop", route)
+        self.assertEqual(original["duplicates"], [])
+
+        copy = self.save("Loop (1)", jitter(route))
+        self.assertEqual([d["route_id"] for d in copy["duplicates"]], [original["route_id"]])
+
+        deduped = self.save("Loop again", jitter(route, seed=5), dedupe="true")
+        self.assertIn(deduped["duplicate_of"], {original["route_id"], copy["route_id"]})
+        names = [r["name"] for r in self.client.get("/api/routes", params={"fields": "name"},
+                                                    headers=self.headers).json()]
+        self.assertNotIn("Loop again", names)
+
+        # A different route is not flagged
+        self.assertEqual(self.save("Other", random_walk(11, start=(50.0, 10.0)))["duplicates"], [])
+
+    def test_similar_endpoint(self):
+        route = random_walk(20, start=(51.0, 11.0))
+        first = self.save("A", route)["route_id"]
+        reversed_copy = self.save("A reversed", route[::-1])["route_id"]
+        self.save("B", random_walk(21, start=(51.0, 11.0)))
+
+        response = self.client.get(f"/api/routes/{first}/similar", headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        similar = response.json()["similar"]
+        self.assertEqual([s["route_id"] for s in similar], [reversed_copy])
+        self.assertTrue(similar[0]["reversed"] and similar[0]["duplicate"])
+
+        # Deleted routes leave the index
+        self.client.delete(f"/api/routes/{reversed_copy}", headers=self.headers)
+        self.assertEqual(self.client.get(f"/api/routes/{first}/similar", headers=self.headers).json()["similar"], [])
+        self.assertEqual(self.client.get(f"/api/routes/{uuid.uuid4()}/similar", headers=self.headers).status_code,
+                         404)
+
+
+if __name__ == "__main__":
+    unittest.main()
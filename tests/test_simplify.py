@@ -0,0 +1,73 @@
+import unittest
+
+import numpy as np
+
+import server
+from simplify import LOD_TOLERANCES_M, build_lods, simplify
+from tests.conftest import ApiTestCase
+
+
+def wiggly_route(n):
+    """~5 km straight line with a 30 m detour half way and 1 m noise"""
+    rng = np.random.default_rng(0)
+    lat = np.linspace(44.80, 44.845, n)
+    lon = np.full(n, 20.46) + rng.normal(scale=1e-5, size=n)
+    lon[n // 2] += 30 / 79000  # ~30 m east at this latitude
+    return np.column_stack([lat, lon])
+
+
+class TestSimplify(unittest.TestCase):
+
+    def test_straight_line_collapses(self):
+        line = np.column_stack([np.linspace(45, 45.01, 100), np.full(100, 19.0)])
+        self.assertEqual(len(simplify(line, 1.0)), 2)
+
+    def test_keeps_significant_detour(self):
+        coords = wiggly_route(2000)
+        simplified = simplify(coords, 10.0)
+        self.assertLess(len(simplified), 20)
+        self.assertTrue(any(np.array_equal(p, coords[1000]) for p in simplified))
+        np.testing.assert_array_equal(simplified[0], coords[0])
+        np.testing.assert_array_equal(simplified[-1], coords[-1])
+
+    def test_levels_are_nested(self):
+        levels = build_lods(wiggly_route(2000))
+        self.assertEqual(len(levels), len(LOD_TOLERANCES_M))
+        sizes = [len(level) for level in levels]
+        self.assertEqual(sizes, sorted(sizes, reverse=True))
+
+    def test_short_routes(self):
+        self.assertEqual(len(simplify([[1.0, 2.0], [1.0, 2.1]], 50)), 2)
+        self.assertEqual([len(level) for level in build_lods([])], [0] * len(LOD_TOLERANCES_M))
+
+
+class TestLodEndpoint(ApiTestCase):
+
+    def test_lod_query(self):
+        route_id = self.save_route(wiggly_route(3000).tolist(), route_name="LOD").json()["route_id"]
+
+        full = self.client.get(f"/api/routes/{route_id}", headers=self.headers).json()
+        self.assertEqual(len(full["coordinates"]), 3000)
+        sizes = [len(self.client.get(f"/api/routes/{route_id}", params={"lod": lod},
+                                     headers=self.headers).json()["coordinates"])
+                 for lod in range(1, len(LOD_TOLERANCES_M) + 1)]
+        self.assertLess(sizes[-1], 20)
+        self.assertEqual(sizes, sorted(sizes, reverse=True))
+
+        # Routes saved before LODs existed get them on first request
+        with server.get_db_connection() as conn:
+            conn.execute("DELETE FROM route_lods WHERE route_id = ?", (route_id,))
+            conn.commit()
+        lazy = self.client.get(f"/api/routes/{route_id}", params={"lod": 2}, headers=self.headers).json()
+        self.assertEqual(len(lazy["coordinates"]), sizes[1])
+
+        self.assertEqual(self.client.get(f"/api/routes/{route_id}", params={"lod": 99},
+                                         headers=self.headers).status_code, 422)
+        self.client.delete(f"/api/routes/{route_id}", headers=self.headers)
+        with server.get_db_connection() as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM route_lods WHERE route_id = ?",
+                                          (route_id,)).fetchone()[0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+
+import numpy as np
+
+import server
+from spatial import chunk_bounds, radius_box, segments_in_box, segments_near
+from tests.conftest import ApiTestCase
+
+
+class TestSpatialHelpers(unittest.TestCase):
+
+    def test_chunk_bounds_share_boundary_points(self):
+        coords = np.column_stack([np.arange(10.0), np.arange(10.0) * 2])
+        first, last, boxes = chunk_bounds(coords, chunk=4)
+        self.assertEqual(list(zip(first.tolist(), last.tolist())), [(0, 4), (4, 8), (8, 9)])
+        np.testing.assert_allclose(boxes[1], [4, 8, 8, 16])
+        first, last, boxes = chunk_bounds(coords[:1], chunk=4)
+        self.assertEqual((first.tolist(), last.tolist()), ([0], [0]))
+
+    def test_segment_crossing_box(self):
+        # Both end points are outside, the segment crosses the box
+        line = np.array([[0.0, -1.0], [0.0, 1.0]])
+        self.assertTrue(segments_in_box(line, (-0.1, 0.1, -0.1, 0.1)))
+        self.assertFalse(segments_in_box(line, (0.2, 0.3, -0.1, 0.1)))
+        # Diagonal passing next to the box corner
+        diagonal = np.array([[0.0, 1.0], [1.0, 0.0]])
+        self.assertFalse(segments_in_box(diagonal, (0.0, 0.4, 0.0, 0.4)))
+        self.assertTrue(segments_in_box(diagonal, (0.0, 0.6, 0.0, 0.6)))
+
+    def test_segments_near(self):
+        line = np.array([[45.0, 20.0], [45.0, 20.02]])
+        # 0.001 degree of latitude is ~111 m away from the middle of the segment
+        self.assertTrue(segments_near(line, 45.001, 20.01, 120))
+        self.assertFalse(segments_near(line, 45.001, 20.01, 100))
+        self.assertFalse(segments_near(line, 45.0, 20.03, 500))
+        box = radius_box(45.0, 20.0, 1000)
+        self.assertAlmostEqual(box[1] - 45.0, 0.009, places=3)
+        self.assertAlmostEqual(box[3] - 20.0, 0.0127, places=3)
+
+
+class TestRoutesAreaFilter(ApiTestCase):
+
+    def save(self, name, coordinates, headers=None, overwrite=False):
+        response = self.save_route(coordinates, headers=headers, params={"overwrite": overwrite}, route_name=name)
+        return response.json()["route_id"]
+
+    def names(self, **params):
+        response = self.client.get("/api/routes", params=dict(params, fields="name"), headers=self.headers)
+        self.assertEqual(response.status_code, 200, response.text)
+        return sorted(route["name"] for route in response.json())
+
+    def test_bbox_and_near(self):
+        # A long east-west route with many points, and an L-shaped one whose box covers the query
+        self.save("East", [[45.0, 20.0 + i * 0.001] for i in range(300)])
+        self.save("Corner", [[45.1, 20.1], [45.1, 20.2], [45.2, 20.2]])
+        self.save("Elsewhere", [[10.0, 10.0], [10.01, 10.01]], headers=self.new_user_headers())
+
+        self.assertEqual(self.names(bbox="44.99,20.25,45.01,20.26"), ["East"])
+        # Inside the bounding box of Corner but away from its segments
+        self.assertEqual(self.names(bbox="45.15,20.12,45.16,20.13"), [])
+        self.assertEqual(self.names(bbox="45.09,20.15,45.11,20.16"), ["Corner"])
+        self.assertEqual(self.names(near="45.001,20.1", radius=200), ["East"])
+        self.assertEqual(self.names(near="45.15,20.2", radius=50), ["Corner"])
+        self.assertEqual(self.names(near="10.0,10.0", radius=5000), [])
+
+    def test_index_follows_updates_and_deletes(self):
+        route_id = self.save("Moving", [[30.0, 30.0], [30.01, 30.0]])
+        self.assertEqual(self.names(near="30.005,30.0", radius=10), ["Moving"])
+        self.save("Moving", [[31.0, 31.0], [31.01, 31.0]], overwrite=True)
+        self.assertEqual(self.names(near="30.005,30.0", radius=10), [])
+        self.assertEqual(self.names(near="31.005,31.0", radius=10), ["Moving"])
+
+        self.client.delete(f"/api/routes/{route_id}", headers=self.headers)
+        self.assertEqual(self.names(near="31.005,31.0", radius=10), [])
+        with server.get_db_connection() as conn:
+            chunks = conn.execute("SELECT COUNT(*) FROM route_spatial_chunks WHERE route_id = ?",
+                                  (route_id,)).fetchone()[0]
+        self.assertEqual(chunks, 0)
+
+    def test_overwrite_updates_one_of_several_same_named_routes(self):
+        first = self.save("Twin", [[32.0, 32.0], [32.01, 32.0]])
+        second = self.save("Twin", [[33.0, 33.0], [33.01, 33.0]])
+        self.save("Twin", [[34.0, 34.0], [34.01, 34.0]], overwrite=True)
+        # Only the newest route moved, the other keeps its geometry and index rows
+        self.assertEqual(self.client.get(f"/api/routes/{first}", headers=self.headers).json()["coordinates"][0],
+                         [32.0, 32.0])
+        self.assertEqual(self.client.get(f"/api/routes/{second}", headers=self.headers).json()["coordinates"][0],
+                         [34.0, 34.0])
+        self.assertEqual(self.names(near="32.005,32.0", radius=10), ["Twin"])
+        self.assertEqual(self.names(near="33.005,33.0", radius=10), [])
+        self.assertEqual(self.names(near="34.005,34.0", radius=10), ["Twin"])
+
+    def test_invalid_filters(self):
+        for params in ({"bbox": "1,2,3"}, {"bbox": "3,0,1,1"}, {"near": "x,y"}):
+            response = self.client.get("/api/routes", params=params, headers=self.headers)
+            self.assertEqual(response.status_code, 422, params)
+        response = self.client.get("/api/routes", params={"bbox": "0,0,1,1", "near": "0,0"}, headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_backfill(self):
+        route_id = self.save("Legacy", [[20.0, 20.0], [20.01, 20.0]])
+        with server.get_db_connection() as conn:
+            server.delete_route_index(conn, route_id)
+            conn.commit()
+        self.assertEqual(self.names(near="20.005,20.0", radius=10), [])
+        self.assertGreaterEqual(server.index_unindexed_routes(), 1)
+        self.assertEqual(self.names(near="20.005,20.0", radius=10), ["Legacy"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+import server
+from tests.conftest import ApiTestCase
+from thumbnails import THUMBNAIL_HEIGHT, THUMBNAIL_WIDTH, render_svg, render_thumbnail
+
+SVG_NS = "{http://www.w3.org/2000/svg}"
+
+
+def dense_loop(n):
+    t = np.linspace(0, 2 * np.pi, n)
+    return np.column_stack([44.8 + 0.01 * np.sin(t), 20.46 + 0.02 * np.cos(t)]).tolist()
+
+
+class TestRenderSvg(unittest.TestCase):
+
+    def test_compact_and_inside_viewport(self):
+        svg = render_svg(dense_loop(20000))
+        self.assertLess(len(svg), 8000)
+        root = ET.fromstring(svg)
+        points = root.find(f"{SVG_NS}polyline").get("points").split()
+        xy = np.array([[float(v) for v in p.split(",")] for p in points])
+        self.assertTrue(np.all(xy[:, 0] >= 0) and np.all(xy[:, 0] <= THUMBNAIL_WIDTH))
+        self.assertTrue(np.all(xy[:, 1] >= 0) and np.all(xy[:, 1] <= THUMBNAIL_HEIGHT))
+        self.assertEqual(len(root.findall(f"{SVG_NS}circle")), 2)
+
+    def test_etag_is_content_hash(self):
+        self.assertEqual(render_thumbnail(dense_loop(100))[1], render_thumbnail(dense_loop(100))[1])
+        self.assertNotEqual(render_thumbnail(dense_loop(100))[1], render_thumbnail(dense_loop(101))[1])
+
+    def test_degenerate_routes(self):
+        ET.fromstring(render_svg([]))
+        ET.fromstring(render_svg([[44.8, 20.4]]))
+
+
+class TestThumbnailEndpoint(ApiTestCase):
+
+    def test_served_with_cache_headers(self):
+        route_id = self.save_route(dense_loop(500), route_name="Thumb").json()["route_id"]
+
+        listing = self.client.get("/api/routes", params={"fields": "id,thumbnail_url"}, headers=self.headers).json()
+        url = listing[0]["thumbnail_url"]
+        self.assertIn("?v=", url)
+
+        response = self.client.get(url, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "image/svg+xml")
+        self.assertIn("immutable", response.headers["cache-control"])
+        etag = response.headers["etag"]
+
+        revalidated = self.client.get(f"/api/routes/{route_id}/thumbnail",
+                                      headers={**self.headers, "If-None-Match": etag})
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.headers["cache-control"], "private, no-cache")
+
+        # Overwriting the route changes the thumbnail and its ETag
+        self.save_route(dense_loop(50)[:25], params={"overwrite": True}, route_name="Thumb")
+        changed = self.client.get(f"/api/routes/{route_id}/thumbnail", headers={**self.headers, "If-None-Match": etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers["etag"], etag)
+
+        # Routes without a stored thumbnail get one on demand
+        with server.get_db_connection() as conn:
+            conn.execute("DELETE FROM route_thumbnails WHERE route_id = ?", (route_id,))
+            conn.commit()
+        self.assertEqual(self.client.get(f"/api/routes/{route_id}/thumbnail", headers=self.headers).status_code, 200)
+        self.assertEqual(self.client.get("/api/routes/missing/thumbnail", headers=self.headers).status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
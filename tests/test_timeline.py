@@ -0,0 +1,105 @@
+import unittest
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from pydantic import ValidationError
+
+from geo import cumulative_distance, as_coord_array, split_length_for_unit
+from gpx_writer import iter_gpx
+from server import RunDetails
+from timeline import parse_pace, synthesize_timeline
+
+GPX_NS = "{http://www.topografix.com/GPX/1/1}"
+TPX_NS = "{http://www.garmin.com/xmlschemas/TrackPointExtension/v1}"
+
+# ~111.2 m per 0.001 degree of latitude
+STEP = 0.001
+
+
+def straight_route(n_points):
+    return [[45.0 + i * STEP, 19.0] for i in range(n_points)]
+
+
+def make_run_details(**overrides):
+    data = dict(distance=2.0, duration=10, pace="5:00", calories=100, route_name="Timeline",
+                date="2026-05-29", start_time="07:30")
+    data.update(overrides)
+    return RunDetails(**data)
+
+
+class TestTimeline(unittest.TestCase):
+
+    def test_parse_pace(self):
+        self.assertEqual(parse_pace("5:30"), 330)
+        self.assertEqual(parse_pace("5.5"), 330)
+        self.assertEqual(parse_pace(6), 360)
+        self.assertIsNone(parse_pace("fast"))
+        self.assertIsNone(parse_pace(None))
+
+    def test_cumulative_distance(self):
+        cum = cumulative_distance(as_coord_array(straight_route(11)))
+        self.assertEqual(cum[0], 0)
+        self.assertAlmostEqual(cum[-1], 1111.95, delta=0.5)
+
+    def test_constant_pace_timestamps(self):
+        """At 5:00/km the finish time follows from the route length"""
+        coords = straight_route(20)
+        tl = synthesize_timeline(coords, make_run_details())
+        self.assertEqual(tl.times[0], np.datetime64("2026-05-29T07:30:00"))
+        elapsed = (tl.times[-1] - tl.times[0]) / np.timedelta64(1, "s")
+        self.assertAlmostEqual(elapsed, tl.distance[-1] / 1000 * 300, delta=0.01)
+        self.assertTrue(np.all(np.diff(tl.times.astype(np.int64)) >= 0))
+        self.assertIsNone(tl.heart_rate)
+
+    def test_km_splits(self):
+        """Per-km pace, heart rate and elevation are applied by split"""
+        coords = straight_route(20)  # ~2.1 km
+        details = make_run_details(km_paces=["4:00", "6:00"], km_heart_rates=[140, 160],
+                                   km_elevation_changes=[10.0, -4.0], heart_rate_enabled=True)
+        tl = synthesize_timeline(coords, details, base_elevation=100.0)
+
+        first_km = tl.distance < 1000
+        self.assertTrue(np.all(tl.heart_rate[first_km] == 140))
+        self.assertTrue(np.all(tl.heart_rate[~first_km] == 160))
+
+        # Elevation climbs 10 m over the first km, then drops 4 m and holds
+        self.assertEqual(tl.elevation[0], 100.0)
+        self.assertAlmostEqual(tl.elevation[-1], 106.0)
+        self.assertGreater(tl.elevation[first_km].max(), 108.0)
+
+        # Segments in the second km take 1.5x as long per metre as in the first
+        seconds = np.diff(tl.times.astype("datetime64[ms]").astype(np.int64)) / 1000
+        per_metre = seconds / np.diff(tl.distance)
+        self.assertAlmostEqual(per_metre[0], 0.24, places=3)
+        self.assertAlmostEqual(per_metre[-1], 0.36, places=3)
+
+    def test_distance_units(self):
+        """The frontend's "miles" gives mile splits, unknown units are rejected"""
+        self.assertEqual(split_length_for_unit("miles"), split_length_for_unit("mi"))
+        self.assertEqual(split_length_for_unit(None), 1000.0)
+        coords = straight_route(20)
+        miles = synthesize_timeline(coords, make_run_details(distance_unit="miles", pace="8:00"))
+        mi = synthesize_timeline(coords, make_run_details(distance_unit="mi", pace="8:00"))
+        np.testing.assert_array_equal(miles.times, mi.times)
+        with self.assertRaises(ValidationError):
+            make_run_details(distance_unit="furlongs")
+
+    def test_gpx_contains_time_ele_hr(self):
+        coords = straight_route(5)
+        details = make_run_details(heart_rate_enabled=True, avg_heart_rate=150)
+        body = "".join(iter_gpx(coords, details, synthesize_timeline(coords, details)))
+        points = ET.fromstring(body.encode()).findall(f".//{GPX_NS}trkpt")
+        self.assertEqual(len(points), 5)
+        self.assertEqual(points[0].find(f"{GPX_NS}time").text, "2026-05-29T07:30:00Z")
+        self.assertIsNotNone(points[0].find(f"{GPX_NS}ele"))
+        self.assertEqual(points[-1].find(f".//{TPX_NS}hr").text, "150")
+
+    def test_empty_and_single_point(self):
+        self.assertEqual(len(synthesize_timeline([], make_run_details()).times), 0)
+        tl = synthesize_timeline([[45.0, 19.0]], make_run_details())
+        self.assertEqual(len(tl.times), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
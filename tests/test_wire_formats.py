@@ -0,0 +1,121 @@
+import json
+import unittest
+
+import numpy as np
+
+from tests.conftest import ApiTestCase, sample_run_details
+from wire_formats import (
+    FLOAT32_MEDIA_TYPE, POLYLINE_MEDIA_TYPE, CoordinateFormatError,
+    decode_float32, decode_polyline, encode_float32, encode_polyline, negotiate, validate_coordinates,
+)
+
+# Example from Google's polyline algorithm documentation
+GOOGLE_POINTS = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+GOOGLE_POLYLINE = "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+
+DETAILS = sample_run_details(route_name="Wire route")
+
+
+class TestPolyline(unittest.TestCase):
+
+    def test_reference_encoding(self):
+        self.assertEqual(encode_polyline(GOOGLE_POINTS), GOOGLE_POLYLINE)
+        np.testing.assert_allclose(decode_polyline(GOOGLE_POLYLINE), GOOGLE_POINTS)
+
+    def test_round_trip(self):
+        rng = np.random.default_rng(3)
+        coords = np.cumsum(rng.normal(0, 0.01, (5000, 2)), axis=0) + [44.8, 20.46]
+        coords[100] = [-89.9, 179.9]  # large jumps need all chunks
+        decoded = decode_polyline(encode_polyline(coords))
+        np.testing.assert_allclose(decoded, coords, atol=5e-6)
+
+    def test_empty(self):
+        self.assertEqual(encode_polyline([]), "")
+        self.assertEqual(decode_polyline("").shape, (0, 2))
+
+    def test_malformed(self):
+        for bad in ["_p~iF~ps|U_ulL", "_p~iF~ps|", "abc é", "\x10"]:
+            with self.assertRaises(CoordinateFormatError):
+                decode_polyline(bad)
+
+
+class TestFloat32AndValidation(unittest.TestCase):
+
+    def test_float32_round_trip(self):
+        body = encode_float32(GOOGLE_POINTS)
+        self.assertEqual(len(body), 24)
+        np.testing.assert_allclose(decode_float32(body), GOOGLE_POINTS, atol=1e-5)
+        with self.assertRaises(CoordinateFormatError):
+            decode_float32(body[:-1])
+
+    def test_validate(self):
+        self.assertEqual(validate_coordinates([]).shape, (0, 2))
+        for bad in [[[1, 2], [3]], [[100, 0]], [[0, 200]], [[float("nan"), 0]], [["a", "b"]], [1, 2]]:
+            with self.assertRaises(CoordinateFormatError):
+                validate_coordinates(bad)
+
+    def test_negotiate(self):
+        self.assertEqual(negotiate(None), "application/json")
+        self.assertEqual(negotiate("*/*"), "application/json")
+        self.assertEqual(negotiate(f"{POLYLINE_MEDIA_TYPE}, application/json"), POLYLINE_MEDIA_TYPE)
+        self.assertEqual(negotiate(FLOAT32_MEDIA_TYPE, allow_binary=False), "application/json")
+
+
+class TestRouteWireFormats(ApiTestCase):
+
+    def save(self, **kwargs):
+        response = self.client.post("/api/routes", headers={**self.headers, **kwargs.pop("headers", {})}, **kwargs)
+        self.assertEqual(response.status_code, 200, response.text)
+        return response.json()["route_id"]
+
+    def get_route(self, route_id, accept=None):
+        headers = dict(self.headers)
+        if accept:
+            headers["Accept"] = accept
+        return self.client.get(f"/api/routes/{route_id}", headers=headers)
+
+    def test_save_polyline_and_read_json(self):
+        route_id = self.save(json={"coordinates": GOOGLE_POLYLINE, "runDetails": DETAILS})
+        route = self.get_route(route_id).json()
+        np.testing.assert_allclose(route["coordinates"], GOOGLE_POINTS)
+
+    def test_save_float32_and_read_polyline(self):
+        route_id = self.save(content=encode_float32(GOOGLE_POINTS),
+                             headers={"Content-Type": FLOAT32_MEDIA_TYPE, "X-Run-Details": json.dumps(DETAILS)})
+        response = self.get_route(route_id, POLYLINE_MEDIA_TYPE)
+        self.assertEqual(response.headers["content-type"], POLYLINE_MEDIA_TYPE)
+        self.assertEqual(response.json()["coordinates"], GOOGLE_POLYLINE)
+        self.assertEqual(response.json()["run_details"]["route_name"], "Wire route")
+
+    def test_read_float32(self):
+        route_id = self.save(json={"coordinates": GOOGLE_POINTS, "runDetails": DETAILS})
+        response = self.get_route(route_id, FLOAT32_MEDIA_TYPE)
+        self.assertEqual(response.headers["content-type"], FLOAT32_MEDIA_TYPE)
+        np.testing.assert_allclose(decode_float32(response.content), GOOGLE_POINTS, atol=1e-5)
+        self.assertNotEqual(response.headers["etag"], self.get_route(route_id).headers["etag"])
+
+    def test_list_polyline(self):
+        self.save(json={"coordinates": GOOGLE_POINTS, "runDetails": DETAILS})
+        response = self.client.get("/api/routes", headers={**self.headers, "Accept": POLYLINE_MEDIA_TYPE})
+        self.assertEqual(response.json()[0]["coordinates"], GOOGLE_POLYLINE)
+        self.assertIn("Accept", response.headers["vary"])
+
+    def test_generate_gpx_accepts_polyline(self):
+        response = self.client.post("/api/generate-gpx", json={"coordinates": GOOGLE_POLYLINE, "runDetails": DETAILS})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('lat="38.5"', response.json()["gpx_content"])
+
+    def test_invalid_payloads(self):
+        for payload in [{"coordinates": "_p~iF~ps|", "runDetails": DETAILS},
+                        {"coordinates": [[95, 0]], "runDetails": DETAILS},
+                        {"coordinates": GOOGLE_POINTS, "runDetails": {"distance": 5}}]:
+            response = self.client.post("/api/routes", json=payload, headers=self.headers)
+            self.assertEqual(response.status_code, 422, payload)
+        response = self.client.post("/api/routes", content=b"\x00" * 7,
+                                    headers={**self.headers, "Content-Type": FLOAT32_MEDIA_TYPE,
+                                             "X-Run-Details": json.dumps(DETAILS)})
+        self.assertEqual(response.status_code, 422)
+
+
+if __name__ == "__main__":
+    unittest.main()